@@ -1,9 +1,14 @@
-from flask import Flask, request, jsonify
+from flask import Flask, g, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from model import initialize_model
+from metrics import MetricsWriter, RequestMetrics, render_metrics
+from model import initialize_model, DEFAULT_TOP_K
+from timing import timed
 from xai_formatter import XAIFormatter
+import hmac
+import json
 import logging
 import os
+import time
 
 app = Flask(__name__)
 CORS(app)
@@ -12,15 +17,304 @@ CORS(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Number of batch items scored together per model.diagnose_batch call
+BATCH_CHUNK_SIZE = 256
+
+# Upper bound on the number of ranked diseases a client may request
+MAX_TOP_K = 50
+
+# Diagnostics a client may ask for with ?debug=
+DEBUG_OPTIONS = ("timing",)
+
+# Response-level details a client may ask for with ?expand=, next to the per-disease XAI sections
+RESPONSE_SECTIONS = ("disease_details", "differential_details", "clarification")
+
+# Request counts and latencies per route, exported by /metrics
+request_metrics = RequestMetrics()
+
+
+def _parse_top_k(value) -> int:
+    """Validate a requested top_k, defaulting to DEFAULT_TOP_K when absent"""
+    if value is None:
+        return DEFAULT_TOP_K
+    top_k = int(value)
+    if not 1 <= top_k <= MAX_TOP_K:
+        raise ValueError(f"top_k must be between 1 and {MAX_TOP_K}")
+    return top_k
+
+
+def _parse_days(value):
+    """Validate a reported symptom duration in days"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise ValueError("days must be a non-negative number")
+    return value
+
+
+def _parse_expand(value, allowed: tuple = XAIFormatter.XAI_SECTIONS + RESPONSE_SECTIONS) -> tuple:
+    """
+    Validate a requested list of sections
+    
+    Accepts "all" or comma-separated names from allowed (by default the
+    XAIFormatter.XAI_SECTIONS and RESPONSE_SECTIONS); returns the sections
+    to build (none when absent).
+    """
+    if not value:
+        return ()
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    if "all" in names:
+        return allowed
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValueError(
+            f"unknown section(s) {', '.join(unknown)}; expected 'all' or {', '.join(allowed)}"
+        )
+    return tuple(section for section in allowed if section in names)
+
+
+def _parse_debug(value) -> tuple:
+    """Validate requested diagnostics (comma-separated names from DEBUG_OPTIONS)"""
+    if not value:
+        return ()
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in DEBUG_OPTIONS]
+    if unknown:
+        raise ValueError(f"unknown option(s) {', '.join(unknown)}; expected {', '.join(DEBUG_OPTIONS)}")
+    return tuple(names)
+
+
+def _parse_symptom_edit(value) -> str:
+    """Validate symptoms to add to or remove from a session (string or list of strings)"""
+    if value is None:
+        return ""
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        return ", ".join(value)
+    if isinstance(value, str):
+        return value
+    raise ValueError("expected a comma-separated string or a list of strings")
+
+
+def _parse_expand_top(value):
+    """Validate how many of the top-ranked diseases get expanded (None: all of them)"""
+    if value is None:
+        return None
+    expand_top = int(value)
+    if expand_top < 1:
+        raise ValueError("expand_top must be at least 1")
+    return expand_top
+
 # Initialize model on startup
 try:
-    model = initialize_model()
+    cache_ttl = float(os.environ.get('RESULT_CACHE_TTL', 300))
+    result_store_ttl = float(os.environ.get('RESULT_STORE_TTL', 600))
+    session_ttl = float(os.environ.get('SESSION_TTL', 1800))
+    model = initialize_model(
+        cache_size=int(os.environ.get('RESULT_CACHE_SIZE', 1024)),
+        cache_ttl=cache_ttl if cache_ttl > 0 else None,
+        result_store_size=int(os.environ.get('RESULT_STORE_SIZE', 4096)),
+        result_store_ttl=result_store_ttl if result_store_ttl > 0 else None,
+        session_store_size=int(os.environ.get('SESSION_STORE_SIZE', 1024)),
+        session_ttl=session_ttl if session_ttl > 0 else None,
+        session_max_bytes=int(float(os.environ.get('SESSION_MAX_MB', 256)) * 1024 * 1024),
+        scoring_config_path=os.environ.get('SCORING_CONFIG')
+    )
     logger.info("Medical XAI model initialized successfully")
+    
+    # Poll the knowledge base file and hot-reload it when it changes (0 disables)
+    kb_watch_interval = float(os.environ.get('KB_WATCH_INTERVAL', 0))
+    if kb_watch_interval > 0:
+        model.start_watching(kb_watch_interval)
 except Exception as e:
     logger.error(f"Error initializing model: {e}")
     model = None
 
 
+def _resolve_diagnosis(data: dict):
+    """
+    Find the diagnosis a follow-up request refers to
+    
+    Reuses the ranking stored under data["result_id"] when it is still valid,
+    otherwise scores data["symptoms"].
+    
+    Returns:
+        Tuple of (symptoms, diagnosis, kb_hash of the knowledge base the diagnosis
+        was scored against), or (None, None, None) if neither is usable
+    """
+    stored = model.get_stored_diagnosis(data.get('result_id'))
+    if stored is not None:
+        return stored["symptoms"], stored["diagnosis"], stored["kb_hash"]
+    
+    symptoms = data.get('symptoms', '').strip()
+    if not symptoms:
+        return None, None, None
+    snapshot = model.snapshot
+    return symptoms, model.diagnose(symptoms, snapshot=snapshot), snapshot.kb_hash
+
+
+def _format_differential_pair(differential: dict, details: bool = True) -> dict:
+    """Response fields for one closely scored pair of diseases (scores only unless details)"""
+    pair = {
+        "diseases_compared": differential.get("diseases_compared"),
+        "score_1": differential.get("score_1"),
+        "score_2": differential.get("score_2"),
+        "score_difference": differential.get("score_difference")
+    }
+    if details:
+        pair.update({
+            "explanation": differential.get("clarification_explanation"),
+            "shared_symptoms": differential.get("shared_symptoms"),
+            "distinguishing_for_top": differential.get("distinguishing_for_top"),
+            "distinguishing_for_alternative": differential.get("distinguishing_for_alternative"),
+            "clarification_symptoms": differential.get("clarification_symptoms")
+        })
+    return pair
+
+
+def _build_diagnosis_response(result: dict, days, snapshot,
+                              expand: tuple = (), expand_top=None) -> dict:
+    """
+    Run confidence and differential checks on a model diagnosis (already
+    ranked with duration penalties for days) and format it for the API response
+    
+    snapshot must be the knowledge-base snapshot the diagnosis was scored
+    against, so a concurrent reload cannot mix two knowledge-base versions.
+    
+    Only the XAI sections named in expand are built, and only for the first
+    expand_top diseases (all of them when None); the rest can be fetched
+    later from /diagnose/<result_id>/xai. The RESPONSE_SECTIONS named in
+    expand add the explanatory text around the ranking.
+    """
+    possible_diseases = result.get("possible_diseases", [])
+    xai_sections = tuple(section for section in expand if section in XAIFormatter.XAI_SECTIONS)
+    disease_details = "disease_details" in expand
+    differential_details = "differential_details" in expand
+    clarification = "clarification" in expand
+    
+    # Shapley attributions are only computed for the diseases whose feature importance is shown
+    if "feature_importance" in expand:
+        expanded = possible_diseases if expand_top is None else possible_diseases[:expand_top]
+        model.attribute_symptoms(result, [d.get("disease_id") for d in expanded], snapshot=snapshot)
+    
+    # Run confidence checks
+    with timed("confidence_check"):
+        confidence_check = XAIFormatter.generate_confidence_questions(
+            possible_diseases, 
+            confidence_threshold=snapshot.scoring.confidence_threshold
+        )
+    
+    # Run differential diagnosis check
+    with timed("differential_check"):
+        differential_diagnosis = XAIFormatter.check_differential_diagnosis(
+            possible_diseases,
+            threshold=snapshot.scoring.differential_threshold,
+            differential_table=snapshot.differential_table
+        )
+    
+    # Format response with XAI explanations
+    response = {
+        "input_symptoms": result.get("input_symptoms", []),
+        "total_matches": result.get("total_matched", 0),
+        "days": days,
+        "analysis_type": "standard" if not confidence_check.get("needs_clarification") else "clarification_needed",
+        "diseases": []
+    }
+    
+    for i, disease in enumerate(possible_diseases):
+        disease_obj = {
+            "name": disease.get("disease_name"),
+            "disease_id": disease.get("disease_id"),
+            "confidence": round(disease.get("confidence_score", 0) * 100, 1),
+            "confidence_level": XAIFormatter._get_confidence_level(disease.get("confidence_score", 0)),
+            "matched_symptoms": disease.get("matched_symptoms", [])
+        }
+        
+        # Knowledge-base text and duration validation warning, if requested
+        if disease_details:
+            disease_obj["explanation"] = disease.get("explanation")
+            disease_obj["all_symptoms"] = disease.get("all_symptoms", [])
+            if "duration_validation" in disease:
+                disease_obj["duration_warning"] = disease["duration_validation"].get("warning")
+        
+        # XAI Data, only for the requested sections and ranks
+        if xai_sections and (expand_top is None or i < expand_top):
+            with timed("xai_formatting"):
+                disease_obj["xai"] = XAIFormatter.format_xai_sections(disease, xai_sections)
+        
+        response["diseases"].append(disease_obj)
+    
+    # Add differential diagnosis if applicable
+    if differential_diagnosis.get("is_differential"):
+        response["differential_diagnosis"] = {
+            "is_differential": True,
+            **_format_differential_pair(differential_diagnosis, differential_details)
+        }
+    else:
+        response["differential_diagnosis"] = {"is_differential": False}
+    
+    # Every closely scored pair among the returned diseases, not only ranks 1 and 2
+    if differential_details:
+        response["differential_diagnosis"]["close_pairs"] = [
+            {"ranks": pair["ranks"], **_format_differential_pair(pair)}
+            for pair in differential_diagnosis.get("close_pairs", [])
+        ]
+    
+    # Add confidence check, with the clarifying questions if requested
+    if confidence_check.get("needs_clarification"):
+        response["confidence_check"] = {
+            "needs_clarification": True,
+            "primary_candidate": confidence_check.get("primary_candidate")
+        }
+        if clarification:
+            response["confidence_check"].update({
+                "reason": confidence_check.get("reason"),
+                "alternatives": confidence_check.get("alternatives"),
+                "clarifying_questions": confidence_check.get("clarifying_questions"),
+                "next_step": confidence_check.get("next_step")
+            })
+    else:
+        response["confidence_check"] = {
+            "needs_clarification": False,
+            "confidence": confidence_check.get("confidence")
+        }
+        if clarification:
+            response["confidence_check"]["message"] = (
+                f"Diagnosis confidence is above the {snapshot.scoring.confidence_threshold * 100:g}% threshold"
+            )
+    
+    return response
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _record_request_metrics(response):
+    """Count the request and observe its latency under its route template"""
+    started = g.get('request_started')
+    if started is not None:
+        request_metrics.observe(
+            request.url_rule.rule if request.url_rule else None,
+            request.method,
+            response.status_code,
+            time.perf_counter() - started
+        )
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus text exposition of request counts and latencies per route,
+    per-stage diagnosis latencies, knowledge-base size and cache statistics
+    """
+    try:
+        return Response(render_metrics(model, request_metrics), content_type=MetricsWriter.CONTENT_TYPE)
+    except Exception as e:
+        logger.error(f"Error in metrics endpoint: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -34,8 +328,13 @@ def health_check():
 def diagnose():
     """
     Diagnose possible diseases based on symptoms
-    Expected JSON: {"symptoms": "symptom1, symptom2, ...", "days": 3}
-    Returns detailed XAI formatted explanation with differential diagnosis and confidence checks
+    Expected JSON: {"symptoms": "symptom1, symptom2, ...", "days": 3, "top_k": 5}
+    Optional query parameters: ?expand=all|section,... and ?expand_top=N
+    Returns ranked diseases with differential diagnosis and confidence checks, plus a
+    "result_id" that /recommend, /xai/compare and /diagnose/<result_id>/xai accept.
+    Per-disease XAI sections are only included when requested with expand.
+    With ?debug=timing the response also carries this request's per-stage timings
+    and the aggregated per-stage latency percentiles.
     """
     if model is None:
         return jsonify({"error": "Model not initialized"}), 500
@@ -48,122 +347,234 @@ def diagnose():
         if not symptoms:
             return jsonify({"error": "Please provide symptoms"}), 400
         
-        # Get diagnosis
-        result = model.diagnose(symptoms)
+        try:
+            days = _parse_days(days)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid days: {e}"}), 400
         
-        if result.get("error"):
-            return jsonify(result), 400
+        try:
+            top_k = _parse_top_k(data.get('top_k'))
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"Invalid top_k: {e}"}), 400
         
-        possible_diseases = result.get("possible_diseases", [])
+        try:
+            expand = _parse_expand(request.args.get('expand'))
+            expand_top = _parse_expand_top(request.args.get('expand_top'))
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"Invalid expand: {e}"}), 400
         
-        # Validate duration against diagnosed diseases
-        possible_diseases = XAIFormatter.validate_disease_duration(
-            possible_diseases,
-            days,
-            model.knowledge_base
-        )
+        try:
+            debug = _parse_debug(request.args.get('debug'))
+        except ValueError as e:
+            return jsonify({"error": f"Invalid debug: {e}"}), 400
         
-        # Run confidence checks
-        confidence_check = XAIFormatter.generate_confidence_questions(
-            possible_diseases, 
-            confidence_threshold=0.50
-        )
+        # Every stage below is timed into this request's timer and the model's stage histograms
+        with model.stage_timings.timer() as timer:
+            # Get diagnosis
+            snapshot = model.snapshot
+            result = model.diagnose(symptoms, top_k=top_k, days=days, snapshot=snapshot)
+            
+            if result.get("error"):
+                return jsonify(result), 400
+            
+            result_id = model.store_diagnosis(symptoms, result, snapshot=snapshot)
+            
+            response = _build_diagnosis_response(result, days, snapshot, expand, expand_top)
+            response["result_id"] = result_id
+            
+            with timed("serialization"):
+                http_response = jsonify(response)
         
-        # Run differential diagnosis check
-        differential_diagnosis = XAIFormatter.check_differential_diagnosis(
-            possible_diseases,
-            threshold=0.05
-        )
+        if "timing" in debug:
+            # Serialized again so the breakdown includes the first serialization
+            response["timing"] = {
+                **timer.breakdown(),
+                "histograms": model.stage_timings.summary()
+            }
+            http_response = jsonify(response)
         
-        # Format response with XAI explanations
-        response = {
-            "input_symptoms": result.get("input_symptoms", []),
-            "total_matches": result.get("total_matched", 0),
-            "days": days,
-            "analysis_type": "standard" if not confidence_check.get("needs_clarification") else "clarification_needed",
-            "diseases": []
-        }
+        return http_response, 200
         
-        for disease in possible_diseases:
-            # Format complete diagnosis with XAI
-            formatted_diagnosis = XAIFormatter.format_complete_diagnosis(disease)
+    except Exception as e:
+        logger.error(f"Error in diagnose endpoint: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/diagnose/batch', methods=['POST'])
+def diagnose_batch():
+    """
+    Diagnose many symptom sets in one request
+    Expected JSON: [{"symptoms": "symptom1, symptom2, ...", "days": 3}, ...]
+    Optional query parameters: ?top_k=5, ?expand=all|section,... and ?expand_top=N
+    Streams one /diagnose-formatted result per line as NDJSON, tagged with its
+    "index" in the request array. Items are scored in chunks of BATCH_CHUNK_SIZE.
+    """
+    if model is None:
+        return jsonify({"error": "Model not initialized"}), 500
+    
+    items = request.get_json(silent=True)
+    
+    if not isinstance(items, list):
+        return jsonify({"error": "Please provide an array of {symptoms, days} objects"}), 400
+    
+    try:
+        top_k = _parse_top_k(request.args.get('top_k'))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid top_k: {e}"}), 400
+    
+    try:
+        expand = _parse_expand(request.args.get('expand'))
+        expand_top = _parse_expand_top(request.args.get('expand_top'))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid expand: {e}"}), 400
+    
+    # The whole stream is served from one knowledge-base snapshot
+    snapshot = model.snapshot
+    
+    def generate():
+        for start in range(0, len(items), BATCH_CHUNK_SIZE):
+            chunk = items[start:start + BATCH_CHUNK_SIZE]
             
-            disease_obj = {
-                "name": disease.get("disease_name"),
-                "disease_id": disease.get("disease_id"),
-                "confidence": round(disease.get("confidence_score", 0) * 100, 1),
-                "confidence_level": formatted_diagnosis.get("confidence_level"),
-                "explanation": disease.get("explanation"),
-                "matched_symptoms": disease.get("matched_symptoms", []),
-                "all_symptoms": disease.get("all_symptoms", []),
-                
-                # XAI Data
-                "xai": {
-                    "scoring_breakdown": disease.get("scoring_breakdown", {}),
-                    "explanation": formatted_diagnosis.get("xai_explanation", {}),
-                    "symptom_analysis": formatted_diagnosis.get("symptom_analysis", {}),
-                    "feature_importance": formatted_diagnosis.get("feature_importance", []),
-                }
-            }
+            lines = {}
+            pending = []
+            for offset, item in enumerate(chunk):
+                index = start + offset
+                try:
+                    symptoms = item.get('symptoms') if isinstance(item, dict) else None
+                    if not isinstance(symptoms, str) or not symptoms.strip():
+                        lines[index] = {"index": index, "error": "Please provide symptoms"}
+                        continue
+                    pending.append((index, symptoms.strip(), _parse_days(item.get('days', 3))))
+                except ValueError as e:
+                    lines[index] = {"index": index, "error": f"Invalid days: {e}"}
+                except Exception as e:
+                    logger.error(f"Error parsing batch item {index}: {e}")
+                    lines[index] = {"index": index, "error": str(e)}
             
-            # Add duration validation warning if present
-            if "duration_validation" in disease:
-                duration_val = disease.get("duration_validation", {})
-                disease_obj["duration_warning"] = duration_val.get("warning")
-                disease_obj["xai"]["duration_impact"] = {
-                    "symptom_days": duration_val.get("symptom_days"),
-                    "typical_duration_max": duration_val.get("typical_duration_max"),
-                    "penalty_applied": duration_val.get("penalty_applied")
-                }
+            try:
+                results = model.diagnose_batch(
+                    [symptoms for _, symptoms, _ in pending],
+                    top_k=top_k,
+                    days=[days for _, _, days in pending],
+                    snapshot=snapshot
+                )
+            except Exception as e:
+                # Fall back to diagnosing items one by one so a bad item only fails its own line
+                logger.error(f"Error in diagnose batch endpoint: {e}")
+                results = []
+                for _, symptoms, days in pending:
+                    try:
+                        results.append(model.diagnose(symptoms, top_k=top_k, days=days, snapshot=snapshot))
+                    except Exception as item_error:
+                        results.append({"error": str(item_error)})
             
-            response["diseases"].append(disease_obj)
-        
-        # Add differential diagnosis if applicable
-        if differential_diagnosis.get("is_differential"):
-            response["differential_diagnosis"] = {
-                "is_differential": True,
-                "diseases_compared": differential_diagnosis.get("diseases_compared"),
-                "score_1": differential_diagnosis.get("score_1"),
-                "score_2": differential_diagnosis.get("score_2"),
-                "score_difference": differential_diagnosis.get("score_difference"),
-                "explanation": differential_diagnosis.get("clarification_explanation"),
-                "shared_symptoms": differential_diagnosis.get("shared_symptoms"),
-                "distinguishing_for_top": differential_diagnosis.get("distinguishing_for_top"),
-                "distinguishing_for_alternative": differential_diagnosis.get("distinguishing_for_alternative"),
-                "clarification_symptoms": differential_diagnosis.get("clarification_symptoms")
-            }
-        else:
-            response["differential_diagnosis"] = {"is_differential": False}
+            for (index, _, days), result in zip(pending, results):
+                try:
+                    if result.get("error"):
+                        line = dict(result)
+                    else:
+                        line = _build_diagnosis_response(
+                            result, days, snapshot, expand, expand_top
+                        )
+                except Exception as e:
+                    logger.error(f"Error formatting batch item {index}: {e}")
+                    line = {"error": str(e)}
+                lines[index] = {"index": index, **line}
+            
+            for index in sorted(lines):
+                yield json.dumps(lines[index]) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/diagnose/<result_id>/xai', methods=['GET'])
+def diagnose_xai_sections(result_id):
+    """
+    Build XAI sections for a diagnosis returned earlier by /diagnose
+    Optional query parameters: ?disease_id=<id> (default: every returned disease)
+    and ?expand=all|section,... (default: all)
+    """
+    if model is None:
+        return jsonify({"error": "Model not initialized"}), 500
+    
+    try:
+        try:
+            expand = _parse_expand(request.args.get('expand', 'all'), XAIFormatter.XAI_SECTIONS)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid expand: {e}"}), 400
         
-        # Add confidence check with clarifying questions if needed
-        if confidence_check.get("needs_clarification"):
-            response["confidence_check"] = {
-                "needs_clarification": True,
-                "reason": confidence_check.get("reason"),
-                "primary_candidate": confidence_check.get("primary_candidate"),
-                "alternatives": confidence_check.get("alternatives"),
-                "clarifying_questions": confidence_check.get("clarifying_questions"),
-                "next_step": confidence_check.get("next_step")
-            }
-        else:
-            response["confidence_check"] = {
-                "needs_clarification": False,
-                "confidence": confidence_check.get("confidence"),
-                "message": f"Diagnosis confidence is above the {50}% threshold"
-            }
+        stored = model.get_stored_diagnosis(result_id)
+        if stored is None:
+            return jsonify({"error": "Unknown or expired result_id"}), 404
+        
+        # The stored diagnosis already carries its duration validation
+        possible_diseases = stored["diagnosis"].get("possible_diseases", [])
+        
+        disease_id = request.args.get('disease_id')
+        if disease_id is not None:
+            possible_diseases = [d for d in possible_diseases if d.get("disease_id") == disease_id]
+            if not possible_diseases:
+                return jsonify({"error": f"Disease {disease_id} is not part of this diagnosis"}), 404
+        
+        # Attributions rescore symptom subsets, so they need the knowledge base the
+        # diagnosis came from; after a reload feature importance falls back to an even split
+        snapshot = model.snapshot
+        if "feature_importance" in expand and stored["kb_hash"] == snapshot.kb_hash:
+            model.attribute_symptoms(
+                {"input_fragments": stored["diagnosis"].get("input_fragments", []),
+                 "possible_diseases": possible_diseases},
+                snapshot=snapshot
+            )
         
-        return jsonify(response), 200
+        return jsonify({
+            "result_id": result_id,
+            "diseases": [
+                {
+                    "disease_id": disease.get("disease_id"),
+                    "name": disease.get("disease_name"),
+                    "xai": XAIFormatter.format_xai_sections(disease, expand)
+                }
+                for disease in possible_diseases
+            ]
+        }), 200
         
     except Exception as e:
-        logger.error(f"Error in diagnose endpoint: {e}")
+        logger.error(f"Error in diagnose xai endpoint: {e}")
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/recommend', methods=['POST'])
-def get_recommendation():
+def _session_response(session_id: str, session, expand: tuple = (), expand_top=None):
     """
-    Get recommendation based on symptoms
-    Expected JSON: {"symptoms": "symptom1, symptom2, ..."}
+    Diagnose a session's current symptoms and format it like /diagnose
+    
+    Returns:
+        Tuple of (response dict, status code)
+    """
+    with session.lock:
+        snapshot = session.snapshot
+        symptoms = session.symptoms
+        symptoms_input = ", ".join(session.fragments)
+        days = session.days
+        result = session.diagnose()
+    
+    if result.get("error"):
+        return {"session_id": session_id, "symptoms": symptoms, **result}, 400
+    
+    result_id = model.store_diagnosis(symptoms_input, result, snapshot=snapshot)
+    
+    response = _build_diagnosis_response(result, days, snapshot, expand, expand_top)
+    response["session_id"] = session_id
+    response["result_id"] = result_id
+    return response, 200
+
+
+@app.route('/sessions', methods=['POST'])
+def create_session():
+    """
+    Start a multi-turn assessment whose symptoms can later be edited incrementally
+    Expected JSON: {"symptoms": "symptom1, symptom2, ...", "days": 3, "top_k": 5}
+    Optional query parameters: ?expand=all|section,... and ?expand_top=N
+    Returns the /diagnose response for the symptoms plus a "session_id"
     """
     if model is None:
         return jsonify({"error": "Model not initialized"}), 500
@@ -175,7 +586,105 @@ def get_recommendation():
         if not symptoms:
             return jsonify({"error": "Please provide symptoms"}), 400
         
-        recommendation = model.get_recommendation(symptoms)
+        try:
+            days = _parse_days(data.get('days', 3))
+        except ValueError as e:
+            return jsonify({"error": f"Invalid days: {e}"}), 400
+        
+        try:
+            top_k = _parse_top_k(data.get('top_k'))
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"Invalid top_k: {e}"}), 400
+        
+        try:
+            expand = _parse_expand(request.args.get('expand'))
+            expand_top = _parse_expand_top(request.args.get('expand_top'))
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"Invalid expand: {e}"}), 400
+        
+        session_id, session = model.create_session(symptoms, days=days, top_k=top_k)
+        response, status = _session_response(session_id, session, expand, expand_top)
+        
+        if status != 200:
+            model.delete_session(session_id)
+        
+        return jsonify(response), status
+        
+    except Exception as e:
+        logger.error(f"Error in create session endpoint: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/sessions/<session_id>', methods=['GET', 'PATCH', 'DELETE'])
+def assessment_session(session_id):
+    """
+    Read, edit or end an assessment session
+    PATCH JSON: {"add": "symptom, ..." or [...], "remove": "symptom, ..." or [...], "days": 5}
+    Added and removed symptoms update the session's scores incrementally.
+    GET and PATCH accept ?expand and ?expand_top like /diagnose.
+    """
+    if model is None:
+        return jsonify({"error": "Model not initialized"}), 500
+    
+    try:
+        if request.method == 'DELETE':
+            if not model.delete_session(session_id):
+                return jsonify({"error": "Unknown or expired session_id"}), 404
+            return jsonify({"session_id": session_id, "deleted": True}), 200
+        
+        session = model.get_session(session_id)
+        if session is None:
+            return jsonify({"error": "Unknown or expired session_id"}), 404
+        
+        try:
+            expand = _parse_expand(request.args.get('expand'))
+            expand_top = _parse_expand_top(request.args.get('expand_top'))
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"Invalid expand: {e}"}), 400
+        
+        changes = {}
+        if request.method == 'PATCH':
+            data = request.get_json(silent=True) or {}
+            try:
+                add = _parse_symptom_edit(data.get('add'))
+                remove = _parse_symptom_edit(data.get('remove'))
+            except ValueError as e:
+                return jsonify({"error": f"Invalid symptoms: {e}"}), 400
+            
+            days = None
+            if 'days' in data:
+                try:
+                    days = _parse_days(data['days'])
+                except ValueError as e:
+                    return jsonify({"error": f"Invalid days: {e}"}), 400
+            
+            changes = model.update_session(session, add=add, remove=remove, days=days)
+        
+        response, status = _session_response(session_id, session, expand, expand_top)
+        return jsonify({**response, **changes}), status
+        
+    except Exception as e:
+        logger.error(f"Error in session endpoint: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/recommend', methods=['POST'])
+def get_recommendation():
+    """
+    Get recommendation based on symptoms
+    Expected JSON: {"symptoms": "symptom1, symptom2, ..."} or {"result_id": "..."} from /diagnose
+    """
+    if model is None:
+        return jsonify({"error": "Model not initialized"}), 500
+    
+    try:
+        data = request.get_json()
+        symptoms, diagnosis, _ = _resolve_diagnosis(data)
+        
+        if symptoms is None:
+            return jsonify({"error": "Please provide symptoms or a valid result_id"}), 400
+        
+        recommendation = model.get_recommendation(symptoms, diagnosis=diagnosis)
         return jsonify(recommendation), 200
         
     except Exception as e:
@@ -210,19 +719,17 @@ def xai_compare_diagnoses():
     """
     Get detailed comparison between multiple diagnosis results
     Shows why one disease is more likely than another
-    Expected JSON: {"disease_ids": ["id1", "id2", ...]}
+    Expected JSON: {"symptoms": "symptom1, symptom2, ..."} or {"result_id": "..."} from /diagnose
     """
     if model is None:
         return jsonify({"error": "Model not initialized"}), 500
     
     try:
         data = request.get_json()
-        symptoms = data.get('symptoms', '').strip()
+        symptoms, result, kb_hash = _resolve_diagnosis(data)
         
-        if not symptoms:
-            return jsonify({"error": "Please provide symptoms"}), 400
-        
-        result = model.diagnose(symptoms)
+        if symptoms is None:
+            return jsonify({"error": "Please provide symptoms or a valid result_id"}), 400
         
         if result.get("error") or not result.get("possible_diseases"):
             return jsonify({"error": "No diseases found to compare"}), 400
@@ -242,6 +749,17 @@ def xai_compare_diagnoses():
                 "scoring_breakdown": disease.get("scoring_breakdown", {})
             })
         
+        # What-if analysis of ranks 1 and 2 from rescored symptom additions and removals;
+        # the edits are rescored against the knowledge base the ranking came from,
+        # so a result stored before a reload gets no counterfactual analysis
+        snapshot = model.snapshot
+        if len(top_diseases) >= 2 and kb_hash == snapshot.kb_hash:
+            comparison["counterfactual_analysis"] = XAIFormatter.format_counterfactual_analysis(
+                top_diseases,
+                differential_table=snapshot.differential_table,
+                what_if=model.what_if(result, snapshot=snapshot)
+            )
+        
         return jsonify(comparison), 200
         
     except Exception as e:
@@ -295,14 +813,13 @@ def get_all_diseases():
         return jsonify({"error": "Model not initialized"}), 500
     
     try:
-        diseases = model.knowledge_base.get("diseases", {})
         disease_list = [
             {
-                "id": disease_id,
-                "name": disease_info.get("name", disease_id),
-                "symptom_count": len(disease_info.get("symptoms", []))
+                "id": record.disease_id,
+                "name": record.name,
+                "symptom_count": len(record.symptoms)
             }
-            for disease_id, disease_info in diseases.items()
+            for record in model.snapshot.disease_records
         ]
         return jsonify({
             "total_diseases": len(disease_list),
@@ -313,6 +830,35 @@ def get_all_diseases():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/admin/reload', methods=['POST'])
+def reload_knowledge_base():
+    """
+    Rebuild the model from medical_knowledge_base.json without restarting
+    Requires the ADMIN_TOKEN environment variable and a matching X-Admin-Token header
+    Optional query parameter: ?force=true rebuilds even if the file is unchanged
+    """
+    if model is None:
+        return jsonify({"error": "Model not initialized"}), 500
+    
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    provided = request.headers.get('X-Admin-Token', '')
+    if not admin_token or not hmac.compare_digest(provided, admin_token):
+        return jsonify({"error": "Forbidden"}), 403
+    
+    try:
+        force = request.args.get('force', 'false').lower() == 'true'
+        status = model.reload(force=force)
+        
+        if status.get("reloaded"):
+            logger.info(f"Knowledge base reloaded: {status['kb_hash']}")
+        
+        return jsonify(status), 200
+        
+    except Exception as e:
+        logger.error(f"Error in reload endpoint: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({"error": "Endpoint not found"}), 404
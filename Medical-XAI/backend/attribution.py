@@ -0,0 +1,146 @@
+"""
+Attribution Module - Shapley values of reported symptoms
+Enumerates every coalition of symptoms as a bitmask and scores them in one batch
+for exact values; long symptom lists fall back to sampled permutations under a
+time budget
+"""
+
+import math
+import time
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+# Maps a boolean (n_coalitions, n_players) membership matrix to (n_coalitions, n_targets) scores
+ValueFunction = Callable[[np.ndarray], np.ndarray]
+
+# Up to this many players every coalition is scored (2 ** 12 = 4096 rows)
+EXACT_MAX_PLAYERS = 12
+
+# Seconds spent sampling permutations when there are too many players for exact values
+DEFAULT_TIME_BUDGET = 0.05
+
+# Permutations scored together per batch while sampling
+PERMUTATION_BATCH = 32
+
+
+class ShapleyResult(NamedTuple):
+    """Shapley values of n players for several targets (e.g. diseases) at once"""
+    values: np.ndarray  # (n_players, n_targets)
+    full_value: np.ndarray  # (n_targets,) value of the grand coalition
+    empty_value: np.ndarray  # (n_targets,) value of the empty coalition
+    method: str  # "exact" or "sampled"
+    coalitions_scored: int
+    permutations: int  # 0 for exact values
+
+
+def shapley_values(value_function: ValueFunction, n_players: int,
+                   exact_max_players: int = EXACT_MAX_PLAYERS,
+                   time_budget: float = DEFAULT_TIME_BUDGET,
+                   batch_permutations: int = PERMUTATION_BATCH,
+                   seed: int = 0) -> ShapleyResult:
+    """
+    Shapley values of every player, exact when there are few enough players
+
+    Values satisfy efficiency: for each target they sum to
+    full_value - empty_value (approximately, when sampled).
+
+    Args:
+        value_function: Scores a batch of coalitions
+        n_players: Number of players
+        exact_max_players: Above this, permutations are sampled instead
+        time_budget: Seconds of sampling before the estimate is returned
+        batch_permutations: Permutations scored per value_function call
+        seed: Seed of the permutation sampler, so repeated calls agree
+    """
+    if n_players <= exact_max_players:
+        return exact_shapley(value_function, n_players)
+    return sampled_shapley(value_function, n_players, time_budget, batch_permutations, seed)
+
+
+def exact_shapley(value_function: ValueFunction, n_players: int) -> ShapleyResult:
+    """
+    Exact Shapley values from all 2 ** n_players coalitions
+
+    Coalition c contains player i when bit i of c is set, so c | (1 << i) is
+    c with player i added and every marginal contribution is an array lookup.
+    """
+    masks = np.arange(1 << n_players, dtype=np.int64)
+    membership = ((masks[:, None] >> np.arange(n_players)) & 1).astype(bool)
+    values = np.asarray(value_function(membership), dtype=np.float64)
+
+    # Weight of a coalition of size s not containing the player: s! (n - s - 1)! / n!
+    sizes = membership.sum(axis=1)
+    weights = np.array([
+        math.factorial(s) * math.factorial(n_players - s - 1) / math.factorial(n_players)
+        for s in range(n_players)
+    ])
+
+    shapley = np.zeros((n_players, values.shape[1]))
+    for player in range(n_players):
+        bit = 1 << player
+        without = masks[(masks & bit) == 0]
+        marginals = values[without | bit] - values[without]
+        shapley[player] = weights[sizes[without]] @ marginals
+
+    return ShapleyResult(
+        values=shapley,
+        full_value=values[-1],
+        empty_value=values[0],
+        method="exact",
+        coalitions_scored=len(masks),
+        permutations=0
+    )
+
+
+def sampled_shapley(value_function: ValueFunction, n_players: int,
+                    time_budget: float = DEFAULT_TIME_BUDGET,
+                    batch_permutations: int = PERMUTATION_BATCH,
+                    seed: int = 0) -> ShapleyResult:
+    """
+    Monte Carlo Shapley values from random player orderings
+
+    Each batch scores every prefix of batch_permutations orderings in one
+    value_function call; batches continue until time_budget is spent (at least
+    one batch always runs).
+    """
+    rng = np.random.default_rng(seed)
+    deadline = time.perf_counter() + time_budget
+    steps = np.arange(n_players + 1)
+
+    totals = None
+    full_value = empty_value = None
+    permutations = 0
+    coalitions_scored = 0
+
+    while True:
+        orders = np.argsort(rng.random((batch_permutations, n_players)), axis=1)
+        positions = np.argsort(orders, axis=1)
+
+        # Prefix j of an ordering holds the players placed before position j
+        membership = positions[:, None, :] < steps[None, :, None]
+        values = np.asarray(
+            value_function(membership.reshape(-1, n_players)), dtype=np.float64
+        ).reshape(batch_permutations, n_players + 1, -1)
+
+        # Marginal contribution of the player added at each step of each ordering
+        marginals = np.diff(values, axis=1)
+        if totals is None:
+            totals = np.zeros((n_players, values.shape[2]))
+            full_value = values[0, -1]
+            empty_value = values[0, 0]
+        np.add.at(totals, orders.ravel(), marginals.reshape(-1, values.shape[2]))
+
+        permutations += batch_permutations
+        coalitions_scored += batch_permutations * (n_players + 1)
+        if time.perf_counter() >= deadline:
+            break
+
+    return ShapleyResult(
+        values=totals / permutations,
+        full_value=full_value,
+        empty_value=empty_value,
+        method="sampled",
+        coalitions_scored=coalitions_scored,
+        permutations=permutations
+    )
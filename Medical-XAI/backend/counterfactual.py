@@ -0,0 +1,147 @@
+"""
+Counterfactual Module - What-if rescoring of symptom edits
+Builds every single-symptom addition and removal of a query, rescores all
+variants against all candidate diseases in one batch, and finds the smallest
+edit that swaps the top two diagnoses
+"""
+
+from itertools import combinations, islice
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from xai_formatter import XAIFormatter
+
+# Largest edit (number of symptoms added or removed together) searched for a rank flip
+MAX_EDIT_SIZE = 2
+
+# Upper bound on variants rescored per search step
+MAX_VARIANTS = 4096
+
+
+def rescore_symptom_edits(snapshot, fragments: List[str], ranked_disease_ids: List[str],
+                          symptom_days: Optional[float] = None,
+                          max_edit_size: int = MAX_EDIT_SIZE) -> Optional[Dict]:
+    """
+    Rescore every single-symptom edit of a query and search for the smallest rank flip
+
+    Removals drop one of the query's fragments as typed; additions append a
+    symptom from the profiles of the ranked diseases that the query does not
+    report yet. Each variant is scored like the raw input with that edit,
+    against every disease any of the fragments can reach, with the query's
+    duration penalties applied, so the unedited row is the diagnosis's own
+    ranking.
+
+    Args:
+        snapshot: KnowledgeBaseSnapshot the diagnosis was scored against
+        fragments: input_fragments() of the query
+        ranked_disease_ids: Diagnosed disease ids, best first (at least 2)
+        symptom_days: Symptom duration used for the diagnosis (None: no penalty)
+        max_edit_size: Largest combined edit tried when no single edit flips ranks 1 and 2
+
+    Returns:
+        Dict with the baseline confidences, per-edit score deltas for the ranked
+        diseases and the rank flip (None when no edit within max_edit_size
+        flips them), or None if ranks 1 and 2 are not in the snapshot
+    """
+    ranked = [d for d in ranked_disease_ids if d in snapshot.disease_record_index]
+    if len(ranked) < 2 or ranked[:2] != list(ranked_disease_ids[:2]):
+        return None
+
+    # Players: the query's fragments (present), then candidate additions (absent)
+    reported = list(fragments)
+    reported_symptoms = set(snapshot.preprocess_symptoms(", ".join(reported)))
+    additions = list(dict.fromkeys(
+        symptom
+        for disease_id in ranked
+        for symptom in snapshot.disease_record(disease_id).symptoms
+        if symptom not in reported_symptoms
+    ))
+    players = reported + additions
+    n_players = len(players)
+
+    disease_indices = np.union1d(
+        snapshot.fragment_candidates(players),
+        [snapshot.disease_record_index[d] for d in ranked]
+    )
+    columns = {snapshot.disease_ids[index]: column for column, index in enumerate(disease_indices)}
+    ranked_columns = np.array([columns[d] for d in ranked])
+    top_1, top_2 = ranked_columns[:2]
+
+    value_function = snapshot.coalition_value_function(players, disease_indices)
+    penalty = np.nan_to_num(XAIFormatter.duration_penalties(
+        np.nan if symptom_days is None else float(symptom_days),
+        snapshot.duration_min[disease_indices],
+        snapshot.duration_max[disease_indices],
+        snapshot.duration_chronic[disease_indices]
+    ))
+
+    base = np.zeros(n_players, dtype=bool)
+    base[:len(reported)] = True
+
+    def rescore(membership: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        combined = value_function(membership)
+        return combined, np.maximum(0.0, combined - penalty)
+
+    # Row 0 is the unedited query, row 1 + p flips player p; all scored in one batch
+    single_edits = np.vstack([base, base ^ np.eye(n_players, dtype=bool)])
+    combined, confidence = rescore(single_edits)
+    baseline = confidence[0]
+    combined, confidence = combined[1:], confidence[1:]
+    variants_scored = len(single_edits)
+
+    # Highest-confidence disease above the score cutoff after each edit (knowledge-base order on ties)
+    ranked_confidence = np.where(combined > snapshot.scoring.min_combined_score, confidence, -np.inf)
+    new_top = np.argmax(ranked_confidence, axis=1)
+    has_top = np.isfinite(ranked_confidence[np.arange(n_players), new_top])
+
+    edits = []
+    for player in range(n_players):
+        edits.append({
+            "action": "remove" if player < len(reported) else "add",
+            "symptom": players[player],
+            "deltas": {
+                disease_id: float(confidence[player, column] - baseline[column])
+                for disease_id, column in zip(ranked, ranked_columns)
+            },
+            "new_top": snapshot.disease_ids[disease_indices[new_top[player]]] if has_top[player] else None
+        })
+
+    # Smallest edit after which rank 2 outscores rank 1; among edits of one size the widest margin wins
+    rank_flip = None
+    for size in range(1, max_edit_size + 1):
+        if size == 1:
+            flips = np.arange(n_players)[:, None]
+            flip_confidence = confidence
+        else:
+            flips = np.array(list(islice(combinations(range(n_players), size), MAX_VARIANTS)), dtype=np.int64)
+            if not len(flips):
+                break
+            flips = flips.reshape(-1, size)
+            membership = np.tile(base, (len(flips), 1))
+            membership[np.repeat(np.arange(len(flips)), size), flips.ravel()] ^= True
+            _, flip_confidence = rescore(membership)
+            variants_scored += len(flips)
+
+        margin = flip_confidence[:, top_2] - flip_confidence[:, top_1]
+        best = int(np.argmax(margin))
+        if margin[best] > 0:
+            rank_flip = {
+                "edits": [
+                    {"action": "remove" if p < len(reported) else "add", "symptom": players[p]}
+                    for p in flips[best].tolist()
+                ],
+                "scores": {
+                    ranked[0]: float(flip_confidence[best, top_1]),
+                    ranked[1]: float(flip_confidence[best, top_2])
+                }
+            }
+            break
+
+    return {
+        "baseline": {disease_id: float(baseline[column]) for disease_id, column in zip(ranked, ranked_columns)},
+        "variants_scored": variants_scored,
+        "edits": edits,
+        "rank_flip": rank_flip
+    }
+
@@ -0,0 +1,91 @@
+"""
+Differential Table Module - Precomputed symptom comparisons between diseases
+Stores, for each pair of diseases that share a symptom, the shared symptoms and
+the symptoms unique to either side, so differential analysis is a lookup
+"""
+
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+
+class DifferentialEntry(NamedTuple):
+    """Symptom comparison of disease A against disease B, each list in knowledge-base order"""
+    shared: Tuple[str, ...]
+    unique_a: Tuple[str, ...]
+    unique_b: Tuple[str, ...]
+
+
+class DifferentialTable:
+    """Pairwise shared / unique symptom sets for the diseases of one knowledge base"""
+
+    # Above this many overlapping pairs, entries are computed on demand instead of at load
+    DEFAULT_MAX_PAIRS = 250_000
+
+    def __init__(self, disease_ids: List[str], disease_symptoms: Sequence[Sequence[str]],
+                 symptom_postings: sparse.spmatrix, max_pairs: int = DEFAULT_MAX_PAIRS):
+        """
+        Build the table
+
+        Args:
+            disease_ids: Disease ids, in knowledge-base order
+            disease_symptoms: Symptoms of each disease, aligned with disease_ids
+            symptom_postings: Symptom x disease matrix, nonzero where a disease lists a symptom
+            max_pairs: Maximum number of pairs precomputed at load
+        """
+        self.disease_index = {disease_id: i for i, disease_id in enumerate(disease_ids)}
+        self._symptoms = [tuple(symptoms) for symptoms in disease_symptoms]
+        # Pairs are stored once, keyed (lower index, higher index)
+        self._entries: Dict[Tuple[int, int], DifferentialEntry] = {}
+
+        presence = symptom_postings.tocsr().astype(bool).astype(np.int64)
+        # Upper bound on overlapping pairs, checked before forming the disease x disease product
+        diseases_per_symptom = np.diff(presence.indptr)
+        pair_bound = int((diseases_per_symptom * (diseases_per_symptom - 1) // 2).sum())
+
+        self.precomputed = pair_bound <= max_pairs
+        if self.precomputed:
+            pairs = sparse.triu(presence.T @ presence, k=1).tocoo()
+            for a, b in zip(pairs.row.tolist(), pairs.col.tolist()):
+                self._entries[(a, b)] = self.compare_profiles(self._symptoms[a], self._symptoms[b])
+
+    @staticmethod
+    def compare_profiles(symptoms_a: Sequence[str], symptoms_b: Sequence[str]) -> DifferentialEntry:
+        """Split two symptom lists into shared, unique-to-A and unique-to-B symptoms"""
+        set_a = set(symptoms_a)
+        set_b = set(symptoms_b)
+        return DifferentialEntry(
+            shared=tuple(dict.fromkeys(s for s in symptoms_a if s in set_b)),
+            unique_a=tuple(dict.fromkeys(s for s in symptoms_a if s not in set_b)),
+            unique_b=tuple(dict.fromkeys(s for s in symptoms_b if s not in set_a))
+        )
+
+    def compare(self, disease_a: str, disease_b: str) -> DifferentialEntry:
+        """
+        Look up the comparison of disease_a against disease_b
+
+        Raises:
+            KeyError: If either disease is not in the knowledge base
+        """
+        a = self.disease_index[disease_a]
+        b = self.disease_index[disease_b]
+        low, high = (a, b) if a < b else (b, a)
+
+        entry = self._entries.get((low, high))
+        if entry is None:
+            if self.precomputed:
+                # Diseases without a common symptom: nothing shared, everything unique
+                entry = DifferentialEntry((), self._unique(low), self._unique(high))
+            else:
+                entry = self.compare_profiles(self._symptoms[low], self._symptoms[high])
+
+        if a > b:
+            entry = DifferentialEntry(entry.shared, entry.unique_b, entry.unique_a)
+        return entry
+
+    def _unique(self, index: int) -> Tuple[str, ...]:
+        return tuple(dict.fromkeys(self._symptoms[index]))
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,167 @@
+"""
+Knowledge Base Compiler - Precompiled model artifacts for fast cold start
+Writes the fitted TF-IDF vocabulary, IDF weights, disease matrix, interned
+symptom ids and packed disease profiles to a single binary file that workers memory-map at startup
+
+Usage:
+    python kb_compiler.py [path/to/medical_knowledge_base.json] [-o artifact_path]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+ARTIFACT_MAGIC = b"MXAIKB01"
+ARTIFACT_VERSION = 2
+ARTIFACT_EXTENSION = ".kbc"
+
+# Array blobs start on 64-byte boundaries so memory-mapped views stay aligned
+_ALIGNMENT = 64
+
+
+def content_hash(raw: bytes) -> str:
+    """SHA-256 hex digest identifying a knowledge base file's contents"""
+    return hashlib.sha256(raw).hexdigest()
+
+
+def default_artifact_path(kb_path: str) -> str:
+    """Artifact location for a knowledge base: same path, .kbc extension"""
+    return os.path.splitext(kb_path)[0] + ARTIFACT_EXTENSION
+
+
+def _aligned(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def write_artifact(path: str, metadata: Dict, arrays: Dict[str, np.ndarray]):
+    """
+    Write metadata and named arrays to a compiled artifact
+
+    Layout: magic, 8-byte header length, JSON header, then each array's raw
+    bytes at the aligned offset recorded in the header.
+
+    Args:
+        path: Destination file (written atomically via a temporary file)
+        metadata: JSON-serializable metadata, must include "kb_hash"
+        arrays: Name -> numpy array
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    array_specs = {}
+    offset = 0
+    for name, array in arrays.items():
+        array_specs[name] = {
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset
+        }
+        offset = _aligned(offset + array.nbytes)
+
+    header = json.dumps({
+        "version": ARTIFACT_VERSION,
+        "metadata": metadata,
+        "arrays": array_specs
+    }).encode("utf-8")
+
+    data_start = _aligned(len(ARTIFACT_MAGIC) + 8 + len(header))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(ARTIFACT_MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + array_specs[name]["offset"])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+def load_artifact(path: str, expected_hash: Optional[str] = None) -> Optional[Tuple[Dict, Dict[str, np.ndarray]]]:
+    """
+    Memory-map a compiled artifact
+
+    Args:
+        path: Artifact file
+        expected_hash: Content hash of the knowledge base it must have been built from
+
+    Returns:
+        Tuple of (metadata, arrays) with read-only memory-mapped arrays, or None if
+        the artifact is missing, unreadable, or stale
+    """
+    try:
+        with open(path, "rb") as f:
+            if f.read(len(ARTIFACT_MAGIC)) != ARTIFACT_MAGIC:
+                return None
+            (header_length,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_length).decode("utf-8"))
+    except (OSError, ValueError, struct.error):
+        return None
+
+    if header.get("version") != ARTIFACT_VERSION:
+        return None
+
+    metadata = header.get("metadata", {})
+    if expected_hash is not None and metadata.get("kb_hash") != expected_hash:
+        return None
+
+    data_start = _aligned(len(ARTIFACT_MAGIC) + 8 + header_length)
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        shape = tuple(spec["shape"])
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.empty(shape, dtype=np.dtype(spec["dtype"]))
+            continue
+        arrays[name] = np.memmap(
+            path,
+            dtype=np.dtype(spec["dtype"]),
+            mode="r",
+            offset=data_start + spec["offset"],
+            shape=shape
+        )
+
+    return metadata, arrays
+
+
+def compile_knowledge_base(kb_path: str, artifact_path: Optional[str] = None) -> str:
+    """
+    Fit the model on a knowledge base and write its compiled artifact
+
+    Returns:
+        Path of the written artifact
+    """
+    from model import KnowledgeBaseSnapshot
+
+    artifact_path = artifact_path or default_artifact_path(kb_path)
+    snapshot = KnowledgeBaseSnapshot(kb_path, use_artifact=False)
+
+    if not snapshot.initialization_complete:
+        raise ValueError(f"Knowledge base {kb_path} has no diseases to compile")
+
+    metadata, arrays = snapshot.export_artifact()
+    write_artifact(artifact_path, metadata, arrays)
+    return artifact_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the medical knowledge base into a binary artifact")
+    parser.add_argument(
+        "kb_path",
+        nargs="?",
+        default=os.path.join(os.path.dirname(__file__), "..", "data", "medical_knowledge_base.json"),
+        help="Knowledge base JSON file"
+    )
+    parser.add_argument("-o", "--output", help="Artifact path (default: next to the knowledge base, .kbc)")
+    args = parser.parse_args()
+
+    artifact_path = compile_knowledge_base(args.kb_path, args.output)
+    print(f"Compiled {args.kb_path} -> {artifact_path}")
+
+
+if __name__ == "__main__":
+    main()
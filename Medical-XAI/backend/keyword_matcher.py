@@ -0,0 +1,121 @@
+"""
+Keyword Matcher Module - Multi-pattern symptom keyword matching
+Compiles symptom keyword lists into an Aho-Corasick automaton so free text is
+scanned once, in linear time, regardless of how many keywords are registered
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton mapping keyword phrases to canonical labels"""
+
+    def __init__(self, keyword_map: Dict[str, Iterable[str]]):
+        """
+        Build the automaton
+
+        Args:
+            keyword_map: Canonical label -> keyword phrases that indicate it
+        """
+        # State 0 is the root; goto[state] maps a character to the next state
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Keywords ending at each state (including those reached via fail links)
+        self._output: List[List[str]] = [[]]
+        # Keyword -> canonical labels, in keyword_map order
+        self.labels: Dict[str, List[str]] = {}
+
+        for label, keywords in keyword_map.items():
+            for keyword in keywords:
+                keyword = keyword.lower()
+                if not keyword:
+                    continue
+                if keyword not in self.labels:
+                    self.labels[keyword] = []
+                    self._add_keyword(keyword)
+                if label not in self.labels[keyword]:
+                    self.labels[keyword].append(label)
+
+        self._build_fail_links()
+
+    def _add_keyword(self, keyword: str):
+        """Insert a keyword into the trie"""
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = next_state
+            state = next_state
+        self._output[state].append(keyword)
+
+    def _build_fail_links(self):
+        """Compute failure links breadth-first and merge outputs along them"""
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find_all(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        Find every keyword occurrence in text, including overlapping ones
+
+        Returns:
+            List of (start, end, keyword) tuples ordered by end position
+        """
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        hits = []
+        state = 0
+
+        for end, char in enumerate(text, start=1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for keyword in output[state]:
+                hits.append((end - len(keyword), end, keyword))
+
+        return hits
+
+    def match(self, text: str) -> List[str]:
+        """
+        Find the canonical labels mentioned in text
+
+        A keyword only counts when it starts at a word boundary, so "aches" is not
+        found inside "headaches", and it is dropped when a longer keyword occurrence
+        covers it (e.g. "itch" inside "itchy throat").
+
+        Returns:
+            Canonical labels in order of first appearance
+        """
+        hits = [
+            (start, end, keyword)
+            for start, end, keyword in self.find_all(text)
+            if start == 0 or not text[start - 1].isalnum()
+        ]
+
+        labels = []
+        for start, end, keyword in sorted(hits):
+            covered = any(
+                other_start <= start and end <= other_end and (other_end - other_start) > (end - start)
+                for other_start, other_end, _ in hits
+            )
+            if covered:
+                continue
+            for label in self.labels[keyword]:
+                if label not in labels:
+                    labels.append(label)
+
+        return labels
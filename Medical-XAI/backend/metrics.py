@@ -0,0 +1,194 @@
+"""
+Metrics Module - Prometheus text exposition of server and model metrics
+Request counters and latency histograms are sharded like timing.LatencyHistogram,
+so recording a request takes one uncontended lock in the common case; the
+shards are only summed when /metrics is scraped
+"""
+
+import math
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from timing import HISTOGRAM_STRIPES, LatencyHistogram
+
+# Prefix of every exported metric name
+METRIC_PREFIX = "medical_xai"
+
+# Label of requests that matched no route (kept as one series to bound cardinality)
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class StripedCounter:
+    """Labelled counters split into lock-striped shards by thread id"""
+
+    def __init__(self, stripes: int = HISTOGRAM_STRIPES):
+        self._stripes = stripes
+        self._shards: List[Dict[Tuple, int]] = [{} for _ in range(stripes)]
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def inc(self, labels: Tuple, amount: int = 1):
+        stripe = threading.get_ident() % self._stripes
+        shard = self._shards[stripe]
+        with self._locks[stripe]:
+            shard[labels] = shard.get(labels, 0) + amount
+
+    def totals(self) -> Dict[Tuple, int]:
+        totals: Dict[Tuple, int] = {}
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                items = list(shard.items())
+            for labels, count in items:
+                totals[labels] = totals.get(labels, 0) + count
+        return totals
+
+
+class RequestMetrics:
+    """Request counts per route, method and status, and latency histograms per route and method"""
+
+    def __init__(self):
+        self.requests = StripedCounter()
+        self._latency: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route: Optional[str], method: str, status: int, seconds: float):
+        route = route or UNMATCHED_ROUTE
+        self.requests.inc((route, method, str(status)))
+
+        histogram = self._latency.get((route, method))
+        if histogram is None:
+            with self._lock:
+                histogram = self._latency.setdefault((route, method), LatencyHistogram())
+        histogram.observe(seconds)
+
+    def latency(self) -> Dict[Tuple[str, str], LatencyHistogram]:
+        return dict(self._latency)
+
+
+class MetricsWriter:
+    """Accumulates metric families in the Prometheus text exposition format (version 0.0.4)"""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, prefix: str = METRIC_PREFIX):
+        self.prefix = prefix
+        self._lines: List[str] = []
+
+    def family(self, name: str, metric_type: str, help_text: str) -> str:
+        full_name = f"{self.prefix}_{name}"
+        self._lines.append(f"# HELP {full_name} {help_text}")
+        self._lines.append(f"# TYPE {full_name} {metric_type}")
+        return full_name
+
+    def sample(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
+        self._lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    def histogram(self, name: str, snapshot: Dict, labels: Optional[Dict[str, str]] = None):
+        """Bucket, sum and count samples of one LatencyHistogram.snapshot()"""
+        labels = labels or {}
+        for bound, cumulative in snapshot["buckets"]:
+            self.sample(f"{name}_bucket", cumulative, {**labels, "le": _format_value(bound)})
+        self.sample(f"{name}_sum", snapshot["sum"], labels)
+        self.sample(f"{name}_count", snapshot["count"], labels)
+
+    def metric(self, name: str, help_text: str, samples: Iterable[Tuple[Dict[str, str], float]],
+               metric_type: str = "gauge"):
+        """One family with a sample per label set"""
+        full_name = self.family(name, metric_type, help_text)
+        for labels, value in samples:
+            self.sample(full_name, value, labels)
+
+    def render(self) -> str:
+        return "\n".join(self._lines) + "\n"
+
+
+def _format_labels(labels: Optional[Dict[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels.items()) + "}"
+
+
+def _escape_label(value) -> str:
+    """Backslash, double quote and newline are escaped in label values"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if math.isnan(value):
+            return "NaN"
+        return repr(value)
+    return str(value)
+
+
+def render_metrics(model, request_metrics: RequestMetrics) -> str:
+    """
+    Text exposition of request, model, knowledge-base and cache metrics
+
+    Args:
+        model: MedicalXAIModel (None while the model failed to load)
+        request_metrics: Metrics recorded by the Flask request hooks
+    """
+    writer = MetricsWriter()
+
+    writer.metric(
+        "http_requests_total", "HTTP requests by route template, method and status code.",
+        (
+            ({"route": route, "method": method, "status": status}, count)
+            for (route, method, status), count in sorted(request_metrics.requests.totals().items())
+        ),
+        metric_type="counter"
+    )
+
+    name = writer.family(
+        "http_request_duration_seconds", "histogram",
+        "HTTP request latency by route template and method (streamed bodies excluded)."
+    )
+    for (route, method), histogram in sorted(request_metrics.latency().items()):
+        writer.histogram(name, histogram.snapshot(), {"route": route, "method": method})
+
+    writer.metric("model_loaded", "Whether the diagnosis model is initialized.", [({}, int(model is not None))])
+    if model is None:
+        return writer.render()
+
+    name = writer.family(
+        "stage_duration_seconds", "histogram",
+        "Exclusive time per diagnosis pipeline stage (scoring is the model's scoring latency)."
+    )
+    for stage in sorted(model.stage_timings.stages()):
+        writer.histogram(name, model.stage_timings.histogram(stage).snapshot(), {"stage": stage})
+
+    snapshot = model.snapshot
+    writer.metric("knowledge_base_info", "Currently loaded knowledge base.", [
+        ({"kb_hash": snapshot.kb_hash or "", "loaded_from_artifact": str(snapshot.loaded_from_artifact).lower()}, 1)
+    ])
+    writer.metric("knowledge_base_diseases", "Diseases in the loaded knowledge base.",
+                  [({}, len(snapshot.disease_ids))])
+    writer.metric("knowledge_base_symptoms", "Distinct disease symptoms in the loaded knowledge base.",
+                  [({}, len(snapshot.symptom_vocabulary))])
+    writer.metric("knowledge_base_terms", "TF-IDF vocabulary size of the loaded knowledge base.",
+                  [({}, len(snapshot.term_index))])
+
+    caches = {"result_cache": model.result_cache.stats(), "result_store": model.result_store.stats()}
+    for metric, help_text, key in (
+        ("cache_hits_total", "Cache lookups that found a live entry.", "hits"),
+        ("cache_misses_total", "Cache lookups that found no live entry.", "misses"),
+        ("cache_evictions_total", "Entries dropped for expiry or capacity.", "evictions"),
+    ):
+        writer.metric(metric, help_text, (({"cache": cache}, stats[key]) for cache, stats in caches.items()),
+                      metric_type="counter")
+    writer.metric("cache_entries", "Entries currently held.",
+                  (({"cache": cache}, stats["size"]) for cache, stats in caches.items()))
+    writer.metric("cache_hit_ratio", "Hits over lookups since startup (0 before the first lookup).", (
+        ({"cache": cache}, stats["hits"] / (stats["hits"] + stats["misses"]) if stats["hits"] + stats["misses"] else 0.0)
+        for cache, stats in caches.items()
+    ))
+
+    sessions = model.sessions.stats()
+    writer.metric("sessions_active", "Live assessment sessions.", [({}, sessions["size"])])
+    writer.metric("sessions_bytes", "Approximate memory held by live assessment sessions.", [({}, sessions["bytes"])])
+    writer.metric("sessions_evictions_total", "Assessment sessions dropped for expiry or capacity.",
+                  [({}, sessions["evictions"])], metric_type="counter")
+
+    return writer.render()
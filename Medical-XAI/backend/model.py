@@ -1,200 +1,851 @@
+import copy
 import json
 import os
+import secrets
+import threading
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, NamedTuple, Optional, Tuple
 from difflib import SequenceMatcher
 import numpy as np
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from keyword_matcher import KeywordAutomaton
+from attribution import DEFAULT_TIME_BUDGET, ValueFunction, shapley_values
+from counterfactual import rescore_symptom_edits
+from differential_table import DifferentialTable
+from kb_compiler import content_hash, default_artifact_path, load_artifact
+from result_cache import ResultCache
+from scoring_config import ScoringConfig, load_scoring_config
+from sessions import AssessmentSession, SessionStore
+from timing import StageHistograms, timed
+from xai_formatter import XAIFormatter
 
 
-class MedicalXAIModel:
-    """TinyLM-based Medical Explainable AI Model for symptom diagnosis"""
+# Number of ranked diseases returned by diagnose unless the caller asks for more or fewer
+DEFAULT_TOP_K = 5
+
+# Bit mask of each bit position within a byte packed by np.packbits
+_BIT_MASKS = np.array([0x80 >> bit for bit in range(8)], dtype=np.uint8)
+
+
+class DiseaseRecord(NamedTuple):
+    """Query-independent facts about one disease, built once per knowledge-base snapshot"""
+    disease_id: str
+    name: str
+    explanation: str
+    symptoms: Tuple[str, ...]
+    typical_duration_min: int
+    typical_duration_max: int
+    is_chronic: bool
+    specialist: str
+    specialist_reason: str
+
+
+class KnowledgeBaseSnapshot:
+    """
+    Immutable fitted state for one version of the knowledge base
+    
+    Holds the parsed knowledge base, the TF-IDF vectorizer and disease matrix,
+    interned symptom tables, automata and inverted indexes, and scores queries
+    against them. MedicalXAIModel publishes a new snapshot on reload; requests
+    that already hold the previous one finish on it unaffected.
+    """
     
-    def __init__(self, knowledge_base_path: str):
-        """Initialize the medical model with knowledge base"""
+    def __init__(self, knowledge_base_path: str, artifact_path: Optional[str] = None,
+                 use_artifact: bool = True, scoring: Optional[ScoringConfig] = None):
+        """
+        Load and fit the knowledge base
+        
+        Args:
+            knowledge_base_path: Knowledge base JSON file
+            artifact_path: Compiled artifact (see kb_compiler.py); defaults to the
+                knowledge base path with a .kbc extension
+            use_artifact: Load the compiled artifact when it matches the knowledge base
+            scoring: Score weights and ranking cutoff (default: ScoringConfig())
+        """
         self.kb_path = knowledge_base_path
+        self.artifact_path = artifact_path or default_artifact_path(knowledge_base_path)
+        self.use_artifact = use_artifact
+        self.scoring = scoring or ScoringConfig()
+        self.kb_hash = None
+        self.load_error = None
         self.knowledge_base = self.load_knowledge_base()
-        self.vectorizer = TfidfVectorizer(lowercase=True, stop_words='english')
+        self.vectorizer = self._create_vectorizer()
         self.disease_vectors = None
+        self.disease_ids = []
+        self.disease_records = ()
+        self.disease_record_index = {}
+        self.duration_min = np.zeros(0)
+        self.duration_max = np.zeros(0)
+        self.duration_chronic = np.zeros(0, dtype=bool)
+        self.symptom_vocabulary = []
+        self.symptom_index = {}
+        self.term_index = {}
+        self.differential_table = None
+        self.loaded_from_artifact = False
+        self.keyword_automaton = KeywordAutomaton(self.knowledge_base.get("symptom_keywords", {}))
         self.initialization_complete = False
         self._initialize_model()
         
     def load_knowledge_base(self) -> Dict:
         """Load medical knowledge base from JSON file"""
         try:
-            with open(self.kb_path, 'r') as f:
-                return json.load(f)
+            with open(self.kb_path, 'rb') as f:
+                raw = f.read()
+            self.kb_hash = content_hash(raw)
+            return json.loads(raw)
         except Exception as e:
             print(f"Error loading knowledge base: {e}")
+            self.load_error = str(e)
             return {"diseases": {}, "symptom_keywords": {}}
     
+    @staticmethod
+    def _create_vectorizer(vocabulary: Optional[List[str]] = None) -> TfidfVectorizer:
+        """Create the TF-IDF vectorizer, optionally with an already fitted vocabulary"""
+        return TfidfVectorizer(lowercase=True, stop_words='english', vocabulary=vocabulary)
+    
     def _initialize_model(self):
-        """Initialize vectorizer with disease symptoms"""
+        """Initialize vectorizer with disease symptoms, from the compiled artifact when it is current"""
         diseases = self.knowledge_base.get("diseases", {})
+        
+        # Row i of disease_vectors belongs to disease_ids[i]
+        self.disease_ids = list(diseases.keys())
+        
+        if not self.disease_ids:
+            return
+        
+        self._build_disease_records(diseases)
+        
+        artifact = None
+        if self.use_artifact and self.kb_hash:
+            artifact = load_artifact(self.artifact_path, expected_hash=self.kb_hash)
+        
+        if artifact is not None:
+            self._restore_from_artifact(*artifact)
+            self.loaded_from_artifact = True
+        else:
+            self._fit(diseases)
+        
+        self._build_indexes()
+        self.initialization_complete = True
+    
+    def _build_disease_records(self, diseases: Dict):
+        """Build the immutable per-disease records the request path references"""
+        records = []
+        for disease_id, disease_info in diseases.items():
+            specialist, specialist_reason = XAIFormatter.get_specialist_recommendation(disease_id)
+            records.append(DiseaseRecord(
+                disease_id=disease_id,
+                name=disease_info.get("name", disease_id),
+                explanation=disease_info.get("explanation", "No explanation available"),
+                symptoms=tuple(disease_info.get("symptoms", [])),
+                typical_duration_min=disease_info.get("typical_duration_min", 1),
+                typical_duration_max=disease_info.get("typical_duration_max", 365),
+                is_chronic=disease_info.get("is_chronic", False),
+                specialist=specialist,
+                specialist_reason=specialist_reason
+            ))
+        
+        # disease_records[i] belongs to disease_ids[i]
+        self.disease_records = tuple(records)
+        self.disease_record_index = {record.disease_id: i for i, record in enumerate(records)}
+        
+        # Typical duration ranges, indexed like disease_ids, for vectorized duration penalties
+        self.duration_min = np.array([record.typical_duration_min for record in records], dtype=np.float64)
+        self.duration_max = np.array([record.typical_duration_max for record in records], dtype=np.float64)
+        self.duration_chronic = np.array([bool(record.is_chronic) for record in records], dtype=bool)
+    
+    def with_scoring(self, scoring: ScoringConfig) -> "KnowledgeBaseSnapshot":
+        """Snapshot sharing this one's fitted tables and indexes, scored with other parameters (no refit)"""
+        snapshot = copy.copy(self)
+        snapshot.scoring = scoring
+        return snapshot
+    
+    def disease_record(self, disease_id: str) -> Optional[DiseaseRecord]:
+        """Static record for a disease, or None if it is not in this knowledge base"""
+        index = self.disease_record_index.get(disease_id)
+        return self.disease_records[index] if index is not None else None
+    
+    def _fit(self, diseases: Dict):
+        """Fit the vectorizer and symptom tables from the knowledge base"""
         disease_texts = []
         
         for disease_id, disease_info in diseases.items():
             symptoms_str = " ".join(disease_info.get("symptoms", []))
             disease_texts.append(symptoms_str)
         
-        if disease_texts:
-            self.disease_vectors = self.vectorizer.fit_transform(disease_texts)
-            self.initialization_complete = True
+        # Rows are L2-normalized, so a dot product with a transformed query is its cosine similarity
+        self.disease_vectors = self.vectorizer.fit_transform(disease_texts).tocsr()
+        self._build_symptom_tables(diseases)
+    
+    def _build_symptom_tables(self, diseases: Dict):
+        """
+        Intern symptoms to integer ids and compile each disease's symptom profile
+        
+        Builds the symptom vocabulary (id -> symptom), each disease's symptom ids in
+        knowledge-base order (CSR-style flat array + offsets), and a bitset per disease
+        with bit i set when symptom id i is in its profile.
+        """
+        self.symptom_vocabulary = sorted({
+            symptom
+            for disease_info in diseases.values()
+            for symptom in disease_info.get("symptoms", [])
+        })
+        symptom_index = {symptom: i for i, symptom in enumerate(self.symptom_vocabulary)}
+        
+        profiles = [
+            [symptom_index[symptom] for symptom in diseases[disease_id].get("symptoms", [])]
+            for disease_id in self.disease_ids
+        ]
+        self.disease_symptom_ids = np.array(
+            [symptom_id for profile in profiles for symptom_id in profile], dtype=np.int32
+        )
+        self.disease_symptom_indptr = np.concatenate(
+            [[0], np.cumsum([len(profile) for profile in profiles])]
+        ).astype(np.int64)
+        
+        n_diseases = len(self.disease_ids)
+        n_vocabulary = len(self.symptom_vocabulary)
+        owners = np.repeat(np.arange(n_diseases), np.diff(self.disease_symptom_indptr))
+        # Packed like np.packbits: symptom id i lives in byte i >> 3 under mask 0x80 >> (i & 7)
+        self.disease_profiles = np.zeros((n_diseases, (n_vocabulary + 7) // 8), dtype=np.uint8)
+        np.bitwise_or.at(
+            self.disease_profiles,
+            (owners, self.disease_symptom_ids >> 3),
+            _BIT_MASKS[self.disease_symptom_ids & 7]
+        )
+    
+    def _build_indexes(self):
+        """Build lookup structures derived from the fitted tables"""
+        self.symptom_index = {symptom: i for i, symptom in enumerate(self.symptom_vocabulary)}
+        self.term_index = {term: i for i, term in enumerate(self.vectorizer.get_feature_names_out())}
+        # Finds every disease symptom occurring as a substring of the input in one pass
+        self.symptom_automaton = KeywordAutomaton(
+            {symptom: [symptom] for symptom in self.symptom_vocabulary}
+        )
+        
+        n_diseases = len(self.disease_ids)
+        symptoms_per_disease = np.diff(self.disease_symptom_indptr)
+        self.disease_symptom_totals = symptoms_per_disease.astype(np.float64)
+        
+        # How many times each symptom is listed for each disease (duplicates included).
+        # Stored column-major so scoring can slice out candidate diseases cheaply.
+        owners = np.repeat(np.arange(n_diseases), symptoms_per_disease)
+        self.symptom_disease_counts = sparse.csc_matrix(
+            (np.ones(len(owners)), (self.disease_symptom_ids, owners)),
+            shape=(len(self.symptom_vocabulary), n_diseases)
+        )
+        
+        # Inverted indexes: row i lists (as column indices) the diseases containing
+        # TF-IDF term i / symptom id i
+        self.term_postings = self.disease_vectors.T.tocsr()
+        self.symptom_postings = self.symptom_disease_counts.tocsr()
+        
+        # Shared / distinguishing symptoms for every pair of diseases with a common symptom
+        self.differential_table = DifferentialTable(
+            self.disease_ids,
+            [record.symptoms for record in self.disease_records],
+            self.symptom_postings
+        )
+    
+    def export_artifact(self) -> Tuple[Dict, Dict[str, np.ndarray]]:
+        """
+        Export the fitted model state for kb_compiler.write_artifact
+        
+        Returns:
+            Tuple of (metadata, arrays)
+        """
+        vocabulary = sorted(self.vectorizer.vocabulary_, key=self.vectorizer.vocabulary_.get)
+        
+        metadata = {
+            "kb_hash": self.kb_hash,
+            "disease_ids": self.disease_ids,
+            "vocabulary": vocabulary,
+            "symptom_vocabulary": self.symptom_vocabulary,
+            "disease_vectors_shape": list(self.disease_vectors.shape)
+        }
+        arrays = {
+            "idf": self.vectorizer.idf_,
+            "disease_vectors_data": self.disease_vectors.data,
+            "disease_vectors_indices": self.disease_vectors.indices,
+            "disease_vectors_indptr": self.disease_vectors.indptr,
+            "disease_symptom_ids": self.disease_symptom_ids,
+            "disease_symptom_indptr": self.disease_symptom_indptr,
+            "disease_profiles": self.disease_profiles
+        }
+        return metadata, arrays
+    
+    def _restore_from_artifact(self, metadata: Dict, arrays: Dict[str, np.ndarray]):
+        """Restore the fitted model state from a memory-mapped artifact instead of refitting"""
+        self.vectorizer = self._create_vectorizer(vocabulary=metadata["vocabulary"])
+        self.vectorizer.idf_ = np.asarray(arrays["idf"])
+        
+        self.disease_vectors = sparse.csr_matrix(
+            (arrays["disease_vectors_data"], arrays["disease_vectors_indices"], arrays["disease_vectors_indptr"]),
+            shape=tuple(metadata["disease_vectors_shape"])
+        )
+        self.symptom_vocabulary = metadata["symptom_vocabulary"]
+        self.disease_symptom_ids = arrays["disease_symptom_ids"]
+        self.disease_symptom_indptr = arrays["disease_symptom_indptr"]
+        self.disease_profiles = arrays["disease_profiles"]
+    
+    @staticmethod
+    def input_fragments(symptoms_input: str) -> List[str]:
+        """
+        Lowercased, stripped comma-separated parts of a raw input, in input order
+        
+        Every score component of an input is a function of its fragments: TF-IDF
+        terms and symptom substrings never span a comma, and preprocess_symptoms()
+        canonicalizes each fragment on its own.
+        """
+        return [fragment.strip() for fragment in symptoms_input.lower().split(',') if fragment.strip()]
     
     def preprocess_symptoms(self, symptoms_input: str) -> List[str]:
         """Preprocess and normalize symptom input"""
-        # Convert to lowercase and split by common delimiters
-        symptoms_raw = symptoms_input.lower().split(',')
         processed = []
         
-        symptom_keywords = self.knowledge_base.get("symptom_keywords", {})
-        
-        for symptom in symptoms_raw:
-            symptom = symptom.strip()
-            if symptom:
-                # Try to match with known symptoms
-                matched = False
-                for key_symptom, keywords in symptom_keywords.items():
-                    if any(kw in symptom for kw in keywords):
-                        if key_symptom not in processed:
-                            processed.append(key_symptom)
-                        matched = True
-                        break
-                
-                # If no match, keep the symptom as is (fuzzy matching)
-                if not matched:
-                    processed.append(symptom)
+        for symptom in self.input_fragments(symptoms_input):
+            # Match all known symptoms mentioned in this fragment in a single scan
+            matched = self.keyword_automaton.match(symptom)
+            for key_symptom in matched:
+                if key_symptom not in processed:
+                    processed.append(key_symptom)
+            
+            # If no match, keep the symptom as is (fuzzy matching)
+            if not matched and symptom not in processed:
+                processed.append(symptom)
         
         return processed
     
-    def _calculate_similarity(self, symptoms_input: str, disease_symptoms: List[str]) -> Tuple[float, Dict]:
+    def _intern_symptoms(self, processed_symptoms: List[str]) -> np.ndarray:
+        """Symptom ids of the processed symptoms known to the knowledge base, in input order"""
+        symptom_ids = [self.symptom_index.get(symptom) for symptom in processed_symptoms]
+        return np.array([i for i in symptom_ids if i is not None], dtype=np.int64)
+    
+    def _profile_bits(self, disease_indices: np.ndarray, symptom_ids: np.ndarray) -> np.ndarray:
         """
-        Calculate similarity between input symptoms and disease symptoms with explainability
+        AND disease bitsets with the bits of the given symptom ids
         
         Returns:
-            Tuple of (similarity_score, explanation_dict)
+            Boolean (len(disease_indices), len(symptom_ids)) array, True where the
+            disease profile contains the symptom
         """
-        input_str = symptoms_input.lower()
-        disease_str = " ".join(disease_symptoms).lower()
+        profile_bytes = self.disease_profiles[np.ix_(disease_indices, symptom_ids >> 3)]
+        return (profile_bytes & _BIT_MASKS[symptom_ids & 7]) != 0
+    
+    def _matched_counts(self, query_symptom_ids: List[np.ndarray], candidates: np.ndarray) -> np.ndarray:
+        """
+        Count reported symptoms in each candidate's profile for every input
         
-        explanation = {}
+        Walks the symptom postings of the reported symptoms and counts each
+        (input, disease) posting with one bincount, so the work grows with the
+        number of postings rather than with inputs x candidates. Symptoms listed
+        twice in a profile count once.
         
-        # TF-IDF similarity
-        try:
-            vectors = self.vectorizer.transform([input_str, disease_str])
-            tfidf_similarity = cosine_similarity(vectors[0:1], vectors[1:2])[0][0]
-        except:
-            tfidf_similarity = 0.0
+        Returns:
+            (n_inputs, n_candidates) array of matched symptom counts
+        """
+        n_inputs, n_candidates = len(query_symptom_ids), len(candidates)
+        lengths = [len(symptom_ids) for symptom_ids in query_symptom_ids]
+        flat_ids = np.concatenate(query_symptom_ids) if query_symptom_ids else np.zeros(0, dtype=np.int64)
+        
+        # Every posting of every reported symptom, with the input it was reported in
+        starts = self.symptom_postings.indptr[flat_ids]
+        posting_lengths = self.symptom_postings.indptr[flat_ids + 1] - starts
+        entries = np.repeat(starts - np.cumsum(posting_lengths) + posting_lengths, posting_lengths)
+        entries += np.arange(len(entries))
+        owners = np.repeat(np.repeat(np.arange(n_inputs), lengths), posting_lengths)
+        
+        # Diseases listing a reported symptom are always candidates
+        columns = np.searchsorted(candidates, self.symptom_postings.indices[entries])
+        counts = np.bincount(owners * n_candidates + columns, minlength=n_inputs * n_candidates)
+        return counts.reshape(n_inputs, n_candidates).astype(np.float64)
+    
+    def _score_batch(self, inputs: List[str], processed_batch: List[List[str]],
+                     symptom_days: Optional[List[Optional[float]]] = None) -> Dict[str, np.ndarray]:
+        """
+        Score every input against every disease with array operations
+        
+        All inputs are vectorized into one sparse matrix and scored against the
+        precomputed disease matrix with a single sparse matrix-matrix product.
+        Reported symptoms are counted through the symptom postings; symptoms
+        mentioned in the raw text through the symptom-to-disease incidence matrix
+        built at load time.
+        
+        Only diseases found through the inverted indexes are scored. Duration
+        penalties for all inputs x candidates come from one array expression.
+        
+        Args:
+            inputs: Raw symptom inputs
+            processed_batch: preprocess_symptoms() of each input
+            symptom_days: Symptom duration per input (None: no duration penalty)
+            
+        Returns:
+            Dict of (n_inputs, n_candidates) arrays plus "candidates", the disease
+            index (position in disease_ids) of each column
+        """
+        lowered_inputs = [symptoms_input.lower() for symptoms_input in inputs]
+        n_inputs = len(inputs)
+        n_vocabulary = len(self.symptom_vocabulary)
+        
+        with timed("tfidf_transform"):
+            query_vectors = self.vectorizer.transform(lowered_inputs)
+        
+        with timed("symptom_matching"):
+            # Known disease symptoms appearing anywhere in the raw input text
+            present_rows, present_cols = [], []
+            for row, input_str in enumerate(lowered_inputs):
+                for symptom in {keyword for _, _, keyword in self.symptom_automaton.find_all(input_str)}:
+                    for label in self.symptom_automaton.labels[symptom]:
+                        present_rows.append(row)
+                        present_cols.append(self.symptom_index[label])
+            
+            present = sparse.csr_matrix(
+                (np.ones(len(present_rows)), (present_rows, present_cols)),
+                shape=(n_inputs, n_vocabulary)
+            )
+            
+            # Processed symptoms that exactly name a disease symptom, as interned ids
+            query_symptom_ids = [self._intern_symptoms(processed) for processed in processed_batch]
+        
+        with timed("scoring"):
+            # Every score component is zero for diseases outside the candidate set
+            candidates = self._candidate_diseases(query_vectors, present, query_symptom_ids)
+            
+            # TF-IDF similarity (rows of both matrices are L2-normalized)
+            tfidf_similarity = (query_vectors @ self.disease_vectors[candidates].T).toarray()
+            
+            bonus_counts = (present @ self.symptom_disease_counts[:, candidates]).toarray()
+            matched_counts = self._matched_counts(query_symptom_ids, candidates)
+            
+            components = self._combine_scores(tfidf_similarity, bonus_counts, matched_counts, candidates)
+            combined_score = components["combined_score"]
         
-        explanation["tfidf_similarity"] = float(tfidf_similarity)
+        with timed("duration_validation"):
+            # Penalize durations outside each candidate's typical range (NaN days: no penalty)
+            if symptom_days is None:
+                symptom_days = [None] * n_inputs
+            days = np.array([np.nan if d is None else float(d) for d in symptom_days], dtype=np.float64)
+            duration_penalty = XAIFormatter.duration_penalties(
+                days[:, None],
+                self.duration_min[candidates],
+                self.duration_max[candidates],
+                self.duration_chronic[candidates]
+            )
         
-        # Calculate exact symptom matches
-        matched_count = 0
-        for symptom in disease_symptoms:
-            if symptom.lower() in input_str:
-                matched_count += 1
+        return {
+            "candidates": candidates,
+            "query_symptom_ids": query_symptom_ids,
+            "matched_counts": matched_counts,
+            "tfidf_similarity": tfidf_similarity,
+            "bonus_counts": bonus_counts,
+            **components,
+            "symptom_days": symptom_days,
+            "input_fragments": [self.input_fragments(symptoms_input) for symptoms_input in inputs],
+            "duration_penalty": duration_penalty,
+            "confidence_score": np.maximum(0.0, combined_score - duration_penalty)
+        }
+    
+    def _combine_scores(self, tfidf_similarity: np.ndarray, bonus_counts: np.ndarray,
+                        matched_counts: np.ndarray, diseases: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Combine the raw score components into each disease's combined score
         
-        match_bonus = 0.0
-        if len(disease_symptoms) > 0:
-            match_bonus = (matched_count / len(disease_symptoms)) * 0.3
+        Args:
+            tfidf_similarity: (n_queries, n_diseases) cosine similarities
+            bonus_counts: (n_queries, n_diseases) disease symptoms mentioned in the raw text
+            matched_counts: (n_queries, n_diseases) reported symptoms in the disease profile
+            diseases: Disease index (position in disease_ids) of each column
+        """
+        totals = self.disease_symptom_totals[diseases]
+        has_symptoms = totals > 0
+        safe_totals = np.where(has_symptoms, totals, 1)
         
-        explanation["matched_symptoms_count"] = matched_count
-        explanation["total_disease_symptoms"] = len(disease_symptoms)
-        explanation["match_bonus"] = float(match_bonus)
+        match_bonus = np.where(has_symptoms, (bonus_counts / safe_totals) * self.scoring.match_bonus_factor, 0.0)
+        match_ratio = np.where(has_symptoms, matched_counts / safe_totals, 0.0)
         
-        similarity = min(1.0, tfidf_similarity + match_bonus)
+        similarity = np.minimum(1.0, tfidf_similarity + match_bonus)
         
-        return similarity, explanation
+        # Combine scores: 60% TF-IDF, 40% Match Ratio by default
+        tfidf_component = similarity * self.scoring.tfidf_weight
+        match_component = match_ratio * self.scoring.match_weight
+        
+        return {
+            "match_bonus": match_bonus,
+            "match_ratio": match_ratio,
+            "tfidf_component": tfidf_component,
+            "match_component": match_component,
+            "combined_score": tfidf_component + match_component
+        }
     
-    def diagnose(self, symptoms_input: str) -> Dict:
+    def _fragment_features(self, fragments: List[str]) -> Tuple[sparse.csr_matrix, sparse.csr_matrix,
+                                                                 sparse.csr_matrix]:
         """
-        Diagnose possible diseases based on symptoms with detailed explainability
+        Per-fragment score inputs
+        
+        Returns:
+            Tuple of (TF-IDF term counts, disease-symptom mentions, reported symptoms),
+            one sparse row per fragment (see input_fragments()); reported symptoms are
+            the interned preprocess_symptoms() of the fragment
+        """
+        analyze = self.vectorizer.build_analyzer()
+        
+        term_rows, term_cols = [], []
+        present_rows, present_cols = [], []
+        reported_rows, reported_cols = [], []
+        for row, fragment in enumerate(fragments):
+            lowered = fragment.lower()
+            for token in analyze(lowered):
+                term = self.term_index.get(token)
+                if term is not None:
+                    term_rows.append(row)
+                    term_cols.append(term)
+            for keyword in {keyword for _, _, keyword in self.symptom_automaton.find_all(lowered)}:
+                for label in self.symptom_automaton.labels[keyword]:
+                    present_rows.append(row)
+                    present_cols.append(self.symptom_index[label])
+            symptom_ids = self._intern_symptoms(self.preprocess_symptoms(lowered))
+            reported_rows.extend([row] * len(symptom_ids))
+            reported_cols.extend(symptom_ids.tolist())
+        
+        # Duplicate entries are summed into term counts
+        term_counts = sparse.csr_matrix(
+            (np.ones(len(term_rows)), (term_rows, term_cols)),
+            shape=(len(fragments), len(self.term_index))
+        )
+        symptom_mentions = sparse.csr_matrix(
+            (np.ones(len(present_rows)), (present_rows, present_cols)),
+            shape=(len(fragments), len(self.symptom_vocabulary))
+        )
+        reported_symptoms = sparse.csr_matrix(
+            (np.ones(len(reported_rows)), (reported_rows, reported_cols)),
+            shape=(len(fragments), len(self.symptom_vocabulary))
+        )
+        return term_counts, symptom_mentions, reported_symptoms
+    
+    def fragment_candidates(self, fragments: List[str]) -> np.ndarray:
+        """Diseases that any subset of the given fragments can score above zero, sorted"""
+        term_counts, symptom_mentions, reported_symptoms = self._fragment_features(fragments)
+        return self._candidate_diseases(
+            term_counts, symptom_mentions, [reported_symptoms.indices.astype(np.int64)]
+        )
+    
+    def coalition_value_function(self, fragments: List[str],
+                                 disease_indices: np.ndarray) -> ValueFunction:
+        """
+        Score function over subsets of an input's fragments, for attribution and what-if analysis
+        
+        A coalition is scored exactly like an input made of only its member
+        fragments, so the grand coalition reproduces the combined scores
+        diagnose() reports for the whole input. TF-IDF term counts are additive
+        over members; mentioned and reported symptoms are unions (a symptom
+        counts once however many members name it). Each fragment's features are
+        computed once here and a whole batch of coalitions is scored with sparse
+        products of its membership matrix.
         
         Args:
-            symptoms_input: Comma-separated symptoms or free text
+            fragments: The players, e.g. input_fragments() of the input
+            disease_indices: Diseases to score (positions in disease_ids)
             
         Returns:
-            Dictionary with diagnosis results and detailed explanations
+            Function mapping a boolean (n_coalitions, n_fragments) membership matrix
+            to the (n_coalitions, len(disease_indices)) combined scores
         """
-        if not self.initialization_complete:
-            return {"error": "Model not initialized", "diseases": []}
+        term_counts, symptom_mentions, reported_symptoms = self._fragment_features(fragments)
+        # Unnormalized TF-IDF row of each fragment
+        term_weights = term_counts @ sparse.diags(self.vectorizer.idf_)
         
-        processed_symptoms = self.preprocess_symptoms(symptoms_input)
+        # hits[i, j]: reported symptom reported_ids[i] is in the profile of disease j
+        reported_ids = np.unique(reported_symptoms.indices).astype(np.int64)
+        reported = reported_symptoms[:, reported_ids].toarray()
+        hits = self._profile_bits(disease_indices, reported_ids).T.astype(np.float64)
         
-        if not processed_symptoms:
-            return {"error": "No valid symptoms provided", "diseases": []}
+        disease_matrix = self.disease_vectors[disease_indices].T
+        disease_counts = self.symptom_disease_counts[:, disease_indices]
         
-        diseases = self.knowledge_base.get("diseases", {})
+        def value_function(coalitions: np.ndarray) -> np.ndarray:
+            membership = sparse.csr_matrix(coalitions, dtype=np.float64)
+            
+            weights = membership @ term_weights
+            norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+            inverse_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+            tfidf_similarity = ((sparse.diags(inverse_norms) @ weights) @ disease_matrix).toarray()
+            
+            mentioned = membership @ symptom_mentions
+            mentioned.data[:] = 1.0
+            bonus_counts = (mentioned @ disease_counts).toarray()
+            
+            matched_counts = ((membership @ reported) > 0) @ hits
+            
+            return self._combine_scores(
+                tfidf_similarity, bonus_counts, matched_counts, disease_indices
+            )["combined_score"]
+        
+        return value_function
+    
+    def _candidate_diseases(self, query_vectors: sparse.csr_matrix, present: sparse.csr_matrix,
+                            query_symptom_ids: List[np.ndarray]) -> np.ndarray:
+        """
+        Look up the diseases sharing at least one TF-IDF term or symptom with any input
+        
+        Returns:
+            Sorted array of disease indices (positions in disease_ids)
+        """
+        term_ids = np.unique(query_vectors.indices)
+        symptom_ids = np.unique(np.concatenate([present.indices, *query_symptom_ids]).astype(np.int64))
+        
+        postings = np.concatenate([
+            self.term_postings[term_ids].indices,
+            self.symptom_postings[symptom_ids].indices
+        ])
+        
+        return np.unique(postings)
+    
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """
+        Positions of the k highest scores, best first
+        
+        Uses argpartition instead of a full sort. Ties are broken by position, as a
+        stable descending sort would.
+        """
+        if len(scores) > k:
+            partition = np.argpartition(-scores, k - 1)[:k]
+            kth_score = scores[partition].min()
+            above = np.flatnonzero(scores > kth_score)
+            tied = np.flatnonzero(scores == kth_score)[:k - len(above)]
+            selected = np.concatenate([above, tied])
+        else:
+            selected = np.arange(len(scores))
+        
+        return selected[np.lexsort((selected, -scores[selected]))]
+    
+    @staticmethod
+    def _top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+        """
+        _top_k() of every row of a 2-D score array at once
+        
+        Returns:
+            (n_rows, min(k, n_columns)) column positions, best first in each row
+        """
+        n_rows, n_columns = scores.shape
+        k = min(k, n_columns)
+        if n_columns > k > 0:
+            partition = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            kth_score = np.take_along_axis(scores, partition, axis=1).min(axis=1, keepdims=True)
+            above = scores > kth_score
+            # Ties at the k-th score are taken by position until each row holds k columns
+            tied = scores == kth_score
+            tied &= np.cumsum(tied, axis=1) <= k - above.sum(axis=1, keepdims=True)
+            selected = np.nonzero(above | tied)[1].reshape(n_rows, k)
+        else:
+            selected = np.broadcast_to(np.arange(k), (n_rows, k))
+        
+        # Columns are in position order, so a stable sort keeps position order on ties
+        order = np.argsort(-np.take_along_axis(scores, selected, axis=1), axis=1, kind="stable")
+        return np.take_along_axis(selected, order, axis=1)
+    
+    def _build_diagnosis(self, processed_symptoms: List[str], scores: Dict[str, np.ndarray], row: int,
+                         top_k: int = DEFAULT_TOP_K) -> Dict:
+        """
+        Build the ranked diagnosis for one scored input, materializing only the top_k diseases
+        
+        Diseases are ranked by confidence after the duration penalty; duration
+        warnings are only rendered for the diseases returned.
+        """
+        combined_scores = scores["combined_score"][row]
+        confidence_scores = scores["confidence_score"][row]
+        
+        with timed("sorting"):
+            # Only include diseases with meaningful similarity, best top_k first
+            relevant = np.flatnonzero(combined_scores > self.scoring.min_combined_score)
+            included = relevant[self._top_k(confidence_scores[relevant], top_k)]
+        
+        with timed("result_building"):
+            return self._materialize_diagnosis(processed_symptoms, scores, row, included)
+    
+    def _materialize_diagnosis(self, processed_symptoms: List[str], scores: Dict[str, np.ndarray], row: int,
+                               included: np.ndarray) -> Dict:
+        """Diagnosis dict for the selected score columns of one input, in rank order"""
+        combined_scores = scores["combined_score"][row]
+        confidence_scores = scores["confidence_score"][row]
+        symptom_days = scores["symptom_days"][row]
+        query_symptom_ids = scores["query_symptom_ids"][row]
         results = []
         
-        # Score each disease
-        for disease_id, disease_info in diseases.items():
-            disease_symptoms = disease_info.get("symptoms", [])
+        included_diseases = scores["candidates"][included]
+        matched_bits = self._profile_bits(included_diseases, query_symptom_ids)
+        
+        for index, disease_index, matched_mask in zip(included, included_diseases, matched_bits):
+            # Static fields are shared with the snapshot's record, only scores and matches are per query
+            record = self.disease_records[disease_index]
             
-            # Get similarity with explanation
-            similarity_score, similarity_explanation = self._calculate_similarity(
-                symptoms_input,
-                disease_symptoms
-            )
+            profile_ids = self.disease_symptom_ids[
+                self.disease_symptom_indptr[disease_index]:self.disease_symptom_indptr[disease_index + 1]
+            ]
+            matched_symptoms = [self.symptom_vocabulary[i] for i in query_symptom_ids[matched_mask]]
+            unmatched_symptoms = [
+                self.symptom_vocabulary[i] for i in profile_ids[~np.isin(profile_ids, query_symptom_ids)]
+            ]
             
-            # Count matching symptoms
-            matched_symptoms = [s for s in processed_symptoms if s in disease_symptoms]
-            unmatched_symptoms = [s for s in disease_symptoms if s not in processed_symptoms]
-            match_ratio = len(matched_symptoms) / len(disease_symptoms) if disease_symptoms else 0
-            
-            # Combine scores: 60% TF-IDF, 40% Match Ratio
-            tfidf_component = similarity_score * 0.6
-            match_component = match_ratio * 0.4
-            combined_score = tfidf_component + match_component
-            
-            if combined_score > 0.1:  # Only include if there's meaningful similarity
-                # Create detailed scoring explanation
-                scoring_breakdown = {
-                    "tfidf_component": float(tfidf_component),
-                    "tfidf_weight": 0.6,
-                    "match_component": float(match_component),
-                    "match_weight": 0.4,
-                    "final_score": float(combined_score),
-                    "tfidf_details": similarity_explanation,
-                    "match_ratio": float(match_ratio),
-                    "matched_count": len(matched_symptoms),
-                    "unmatched_disease_symptoms": unmatched_symptoms
-                }
-                
-                results.append({
-                    "disease_id": disease_id,
-                    "disease_name": disease_info.get("name", disease_id),
-                    "confidence_score": float(combined_score),
-                    "matched_symptoms": matched_symptoms,
-                    "disease_symptoms": disease_symptoms,
-                    "explanation": disease_info.get("explanation", "No explanation available"),
-                    "all_symptoms": disease_info.get("symptoms", []),
-                    "scoring_breakdown": scoring_breakdown
-                })
-        
-        # Sort by confidence score
-        results.sort(key=lambda x: x["confidence_score"], reverse=True)
+            similarity_explanation = {
+                "tfidf_similarity": float(scores["tfidf_similarity"][row, index]),
+                "matched_symptoms_count": int(scores["bonus_counts"][row, index]),
+                "total_disease_symptoms": len(record.symptoms),
+                "match_bonus": float(scores["match_bonus"][row, index])
+            }
+            
+            # Create detailed scoring explanation
+            scoring_breakdown = {
+                "tfidf_component": float(scores["tfidf_component"][row, index]),
+                "tfidf_weight": self.scoring.tfidf_weight,
+                "match_component": float(scores["match_component"][row, index]),
+                "match_weight": self.scoring.match_weight,
+                "final_score": float(combined_scores[index]),
+                "tfidf_details": similarity_explanation,
+                "match_ratio": float(scores["match_ratio"][row, index]),
+                "matched_count": len(matched_symptoms),
+                "unmatched_disease_symptoms": unmatched_symptoms
+            }
+            
+            disease_result = {
+                "disease_id": record.disease_id,
+                "disease_name": record.name,
+                "confidence_score": float(confidence_scores[index]),
+                "matched_symptoms": matched_symptoms,
+                "disease_symptoms": record.symptoms,
+                "explanation": record.explanation,
+                "all_symptoms": record.symptoms,
+                "scoring_breakdown": scoring_breakdown
+            }
+            
+            if symptom_days is not None:
+                with timed("duration_validation"):
+                    disease_result["duration_validation"] = XAIFormatter.format_duration_validation(
+                        record.name,
+                        symptom_days,
+                        record.typical_duration_min,
+                        record.typical_duration_max,
+                        record.is_chronic,
+                        float(combined_scores[index]),
+                        float(scores["duration_penalty"][row, index])
+                    )
+            
+            results.append(disease_result)
         
         # Add comparative analysis
-        top_results = results[:5]
-        for i, disease in enumerate(top_results):
+        for i, disease in enumerate(results):
             disease["rank"] = i + 1
             if i > 0:
-                prev_disease = top_results[i-1]
+                prev_disease = results[i-1]
                 score_diff = prev_disease["confidence_score"] - disease["confidence_score"]
                 disease["score_difference_from_previous"] = float(score_diff)
                 disease["comparative_analysis"] = self._explain_score_difference(
                     prev_disease, disease
                 )
         
-        return {
+        diagnosis = {
             "input_symptoms": processed_symptoms,
-            "possible_diseases": top_results,
-            "total_matched": len(top_results)
+            # What attribute_symptoms() and what_if() rescore subsets of
+            "input_fragments": scores["input_fragments"][row],
+            "possible_diseases": results,
+            "total_matched": len(results)
         }
+        if symptom_days is not None:
+            diagnosis["symptom_days"] = symptom_days
+        return diagnosis
     
-    def _explain_score_difference(self, higher_disease: Dict, lower_disease: Dict) -> str:
+    def diagnose_batch(self, symptoms_inputs: List[str], top_k: int = DEFAULT_TOP_K,
+                       days: Optional[List[Optional[float]]] = None) -> List[Dict]:
+        """
+        Diagnose many symptom inputs at once
+        
+        Scores all inputs together with one sparse matrix-matrix product.
+        
+        Args:
+            symptoms_inputs: List of comma-separated symptoms or free text
+            top_k: Maximum number of ranked diseases to return per input
+            days: Symptom duration of each input, for duration penalties (None entries: none)
+            
+        Returns:
+            List of diagnosis dictionaries, in input order
+        """
+        if not self.initialization_complete:
+            return [{"error": "Model not initialized", "diseases": []} for _ in symptoms_inputs]
+        
+        with timed("preprocessing"):
+            processed_batch = [self.preprocess_symptoms(symptoms_input) for symptoms_input in symptoms_inputs]
+        
+        # Inputs without any valid symptom are reported individually and not scored
+        valid_rows = [i for i, processed in enumerate(processed_batch) if processed]
+        results = [{"error": "No valid symptoms provided", "diseases": []} for _ in symptoms_inputs]
+        
+        if valid_rows:
+            scores = self._score_batch(
+                [symptoms_inputs[i] for i in valid_rows],
+                [processed_batch[i] for i in valid_rows],
+                [days[i] for i in valid_rows] if days is not None else None
+            )
+            for row, i in enumerate(valid_rows):
+                results[i] = self._build_diagnosis(processed_batch[i], scores, row, top_k)
+        
+        return results
+    
+    def rank_batch(self, symptoms_inputs: List[str], top_k: int = DEFAULT_TOP_K,
+                   days: Optional[List[Optional[float]]] = None) -> Dict[str, np.ndarray]:
+        """
+        Rank diseases for many symptom inputs without building diagnosis dicts
+        
+        Scores like diagnose_batch() and ranks every row at once, so each row holds
+        the diseases and confidence scores diagnose_batch() would return, in the
+        same order. Meant for offline evaluation over large labelled case sets.
+        
+        Args:
+            symptoms_inputs: List of comma-separated symptoms or free text
+            top_k: Number of ranked diseases per input
+            days: Symptom duration of each input, for duration penalties (None entries: none)
+            
+        Returns:
+            Dict of (n_inputs, top_k) arrays, best first:
+                "disease_indices": position in disease_ids (-1 past the last ranked disease)
+                "confidence_scores": confidence score (NaN past the last ranked disease)
+        """
+        n_inputs = len(symptoms_inputs)
+        disease_indices = np.full((n_inputs, top_k), -1, dtype=np.int64)
+        confidence_scores = np.full((n_inputs, top_k), np.nan)
+        
+        if self.initialization_complete:
+            with timed("preprocessing"):
+                processed_batch = [self.preprocess_symptoms(symptoms_input) for symptoms_input in symptoms_inputs]
+            
+            # Inputs without any valid symptom rank nothing, as diagnose_batch() reports them as errors
+            valid_rows = np.array([i for i, processed in enumerate(processed_batch) if processed], dtype=np.int64)
+        else:
+            valid_rows = np.array([], dtype=np.int64)
+        
+        if len(valid_rows):
+            scores = self._score_batch(
+                [symptoms_inputs[i] for i in valid_rows],
+                [processed_batch[i] for i in valid_rows],
+                [days[i] for i in valid_rows] if days is not None else None
+            )
+            
+            with timed("sorting"):
+                ranked = np.where(
+                    scores["combined_score"] > self.scoring.min_combined_score, scores["confidence_score"], -np.inf
+                )
+                columns = self._top_k_rows(ranked, top_k)
+                confidence = np.take_along_axis(ranked, columns, axis=1)
+                is_ranked = np.isfinite(confidence)
+                
+                width = columns.shape[1]
+                disease_indices[valid_rows, :width] = np.where(is_ranked, scores["candidates"][columns], -1)
+                confidence_scores[valid_rows, :width] = np.where(is_ranked, confidence, np.nan)
+        
+        return {"disease_indices": disease_indices, "confidence_scores": confidence_scores}
+    
+    @staticmethod
+    def _explain_score_difference(higher_disease: Dict, lower_disease: Dict) -> str:
         """Explain why one disease scored higher than another"""
         higher_name = higher_disease["disease_name"]
         lower_name = lower_disease["disease_name"]
@@ -220,25 +871,468 @@ class MedicalXAIModel:
         
         return explanation
     
+
+class MedicalXAIModel:
+    """TinyLM-based Medical Explainable AI Model for symptom diagnosis"""
+    
+    def __init__(self, knowledge_base_path: str, artifact_path: Optional[str] = None,
+                 use_artifact: bool = True, cache_size: int = 1024, cache_ttl: Optional[float] = 300.0,
+                 result_store_size: int = 4096, result_store_ttl: Optional[float] = 600.0,
+                 session_store_size: int = 1024, session_ttl: Optional[float] = 1800.0,
+                 session_max_bytes: Optional[int] = 256 * 1024 * 1024,
+                 scoring_config_path: Optional[str] = None):
+        """
+        Initialize the medical model with knowledge base
+        
+        Args:
+            knowledge_base_path: Knowledge base JSON file
+            artifact_path: Compiled artifact (see kb_compiler.py); defaults to the
+                knowledge base path with a .kbc extension
+            use_artifact: Load the compiled artifact when it matches the knowledge base
+            cache_size: Maximum number of memoized diagnose() results (0 disables the cache)
+            cache_ttl: Seconds a memoized result stays valid (None for no expiry)
+            result_store_size: Maximum number of diagnoses kept for reuse by result id
+            result_store_ttl: Seconds a stored diagnosis can be reused (None for no expiry)
+            session_store_size: Maximum number of live assessment sessions
+            session_ttl: Seconds an idle assessment session is kept (None for no expiry)
+            session_max_bytes: Approximate memory budget for all sessions (None for no limit)
+            scoring_config_path: Score weights and thresholds (see scoring_config.py); defaults
+                to data/scoring_config.json, built-in values when that file does not exist
+        """
+        self.kb_path = knowledge_base_path
+        self.artifact_path = artifact_path
+        self.use_artifact = use_artifact
+        self.scoring = load_scoring_config(scoring_config_path)
+        self.result_cache = ResultCache(maxsize=cache_size, ttl=cache_ttl)
+        self.result_store = ResultCache(maxsize=result_store_size, ttl=result_store_ttl)
+        self.sessions = SessionStore(maxsize=session_store_size, ttl=session_ttl, max_bytes=session_max_bytes)
+        # Per-stage latency histograms of diagnose() and of requests timed with stage_timings.timer()
+        self.stage_timings = StageHistograms()
+        self._reload_lock = threading.Lock()
+        self._watch_stop = None
+        self._snapshot = self._load_snapshot()
+    
+    def _load_snapshot(self) -> KnowledgeBaseSnapshot:
+        return KnowledgeBaseSnapshot(self.kb_path, self.artifact_path, self.use_artifact, self.scoring)
+    
+    @property
+    def snapshot(self) -> KnowledgeBaseSnapshot:
+        """The currently published knowledge-base snapshot"""
+        return self._snapshot
+    
+    @property
+    def knowledge_base(self) -> Dict:
+        return self._snapshot.knowledge_base
+    
+    @property
+    def kb_hash(self) -> Optional[str]:
+        return self._snapshot.kb_hash
+    
+    @property
+    def initialization_complete(self) -> bool:
+        return self._snapshot.initialization_complete
+    
+    @property
+    def loaded_from_artifact(self) -> bool:
+        return self._snapshot.loaded_from_artifact
+    
+    def preprocess_symptoms(self, symptoms_input: str) -> List[str]:
+        """Preprocess and normalize symptom input"""
+        return self._snapshot.preprocess_symptoms(symptoms_input)
+    
+    def reload(self, force: bool = False) -> Dict:
+        """
+        Rebuild the knowledge base from disk and publish it atomically
+        
+        The new vectorizer, matrices and indexes are built while requests keep
+        being served from the current snapshot, then swapped in with a single
+        reference assignment. A knowledge base that fails to load is not published.
+        
+        Args:
+            force: Rebuild even if the file's content hash is unchanged
+            
+        Returns:
+            Dict describing whether a new snapshot was published
+        """
+        with self._reload_lock:
+            current = self._snapshot
+            
+            if not force:
+                try:
+                    with open(self.kb_path, 'rb') as f:
+                        if content_hash(f.read()) == current.kb_hash:
+                            return {"reloaded": False, "reason": "Knowledge base unchanged", "kb_hash": current.kb_hash}
+                except OSError as e:
+                    return {"reloaded": False, "reason": f"Error reading knowledge base: {e}", "kb_hash": current.kb_hash}
+            
+            candidate = self._load_snapshot()
+            
+            if not candidate.initialization_complete:
+                reason = candidate.load_error or "Knowledge base has no diseases"
+                return {"reloaded": False, "reason": reason, "kb_hash": current.kb_hash}
+            
+            self._snapshot = candidate
+            # Old entries are keyed by the previous hash and can never hit again
+            self.result_cache.clear()
+            
+            return {
+                "reloaded": True,
+                "kb_hash": candidate.kb_hash,
+                "previous_kb_hash": current.kb_hash,
+                "total_diseases": len(candidate.disease_ids),
+                "loaded_from_artifact": candidate.loaded_from_artifact
+            }
+    
+    def apply_scoring(self, scoring: ScoringConfig):
+        """
+        Score with other weights and thresholds from now on, without refitting
+        
+        Publishes a copy of the current snapshot that shares its fitted tables;
+        requests already holding the previous snapshot finish with the old parameters.
+        """
+        with self._reload_lock:
+            self.scoring = scoring.validate()
+            self._snapshot = self._snapshot.with_scoring(self.scoring)
+            # Memoized results were ranked with the previous parameters
+            self.result_cache.clear()
+    
+    def start_watching(self, interval: float = 2.0):
+        """
+        Poll the knowledge base file in a background thread and reload it when it changes
+        
+        Args:
+            interval: Seconds between modification-time checks
+        """
+        if self._watch_stop is not None:
+            return
+        
+        self._watch_stop = threading.Event()
+        stop = self._watch_stop
+        
+        def watch():
+            # The first poll always compares content hashes, catching edits made before the watcher started
+            last_mtime = None
+            while not stop.wait(interval):
+                mtime = self._kb_mtime()
+                if mtime != last_mtime:
+                    last_mtime = mtime
+                    status = self.reload()
+                    if status.get("reloaded"):
+                        print(f"Reloaded knowledge base {status['kb_hash'][:12]}")
+                    elif status.get("reason") != "Knowledge base unchanged":
+                        print(f"Knowledge base reload skipped: {status.get('reason')}")
+        
+        threading.Thread(target=watch, name="kb-watcher", daemon=True).start()
+    
+    def stop_watching(self):
+        """Stop the background file watcher"""
+        if self._watch_stop is not None:
+            self._watch_stop.set()
+            self._watch_stop = None
+    
+    def _kb_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.kb_path).st_mtime_ns
+        except OSError:
+            return None
+    
+    def diagnose(self, symptoms_input: str, top_k: int = DEFAULT_TOP_K, days: Optional[float] = None,
+                 snapshot: Optional[KnowledgeBaseSnapshot] = None) -> Dict:
+        """
+        Diagnose possible diseases based on symptoms with detailed explainability
+        
+        Args:
+            symptoms_input: Comma-separated symptoms or free text
+            top_k: Maximum number of ranked diseases to return
+            days: How many days symptoms have lasted; confidences are penalized for
+                diseases with a different typical duration before ranking
+            snapshot: Knowledge-base snapshot to score against (default: the current one)
+            
+        Returns:
+            Dictionary with diagnosis results and detailed explanations
+        """
+        snapshot = snapshot or self._snapshot
+        
+        # Stage durations go to the caller's timer if one is active, else to a timer of our own
+        with self.stage_timings.timer():
+            with timed("cache_lookup"):
+                cache_key = self._cache_key(snapshot, symptoms_input, top_k, days)
+                cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return cached
+            
+            result = snapshot.diagnose_batch([symptoms_input], top_k=top_k, days=[days])[0]
+            if not result.get("error"):
+                with timed("cache_store"):
+                    self.result_cache.put(cache_key, result)
+            return result
+    
+    @staticmethod
+    def _cache_key(snapshot: KnowledgeBaseSnapshot, symptoms_input: str, top_k: int,
+                   days: Optional[float] = None) -> Tuple:
+        """
+        Memoization key for diagnose(): knowledge-base hash, normalized input
+        fragments, top_k and days
+        
+        The fragments are the lowercased, stripped comma-separated parts, which fully
+        determine the canonical symptoms as well as the TF-IDF and match-bonus scores.
+        Keying on the canonical symptom set alone would merge inputs that score
+        differently (e.g. "hot" and "fever" both canonicalize to fever).
+        """
+        fragments = tuple(
+            fragment.strip() for fragment in symptoms_input.lower().split(',') if fragment.strip()
+        )
+        return (snapshot.kb_hash, fragments, top_k, days)
+    
+    def diagnose_batch(self, symptoms_inputs: List[str], top_k: int = DEFAULT_TOP_K,
+                       days: Optional[List[Optional[float]]] = None,
+                       snapshot: Optional[KnowledgeBaseSnapshot] = None) -> List[Dict]:
+        """
+        Diagnose many symptom inputs at once
+        
+        Scores all inputs together with one sparse matrix-matrix product; each
+        item of the returned list is identical to diagnose() for that input.
+        
+        Args:
+            symptoms_inputs: List of comma-separated symptoms or free text
+            top_k: Maximum number of ranked diseases to return per input
+            days: Symptom duration of each input (None, or None entries: no duration penalty)
+            snapshot: Knowledge-base snapshot to score against (default: the current one)
+            
+        Returns:
+            List of diagnosis dictionaries, in input order
+        """
+        return (snapshot or self._snapshot).diagnose_batch(symptoms_inputs, top_k=top_k, days=days)
+    
+    def rank_batch(self, symptoms_inputs: List[str], top_k: int = DEFAULT_TOP_K,
+                   days: Optional[List[Optional[float]]] = None,
+                   snapshot: Optional[KnowledgeBaseSnapshot] = None) -> Dict[str, np.ndarray]:
+        """
+        Ranked disease indices and confidence scores of many inputs as arrays
+        
+        See KnowledgeBaseSnapshot.rank_batch(); disease indices are positions in
+        the snapshot's disease_ids.
+        """
+        return (snapshot or self._snapshot).rank_batch(symptoms_inputs, top_k=top_k, days=days)
+    
+    def store_diagnosis(self, symptoms_input: str, diagnosis: Dict,
+                        snapshot: Optional[KnowledgeBaseSnapshot] = None) -> str:
+        """
+        Keep a diagnosis so follow-up calls can reuse its ranking instead of rescoring
+        
+        Args:
+            symptoms_input: Symptoms the diagnosis was computed from
+            diagnosis: Result of diagnose()
+            snapshot: Knowledge-base snapshot it was scored against (default: the current one)
+            
+        Returns:
+            Opaque result id, valid for result_store_ttl seconds
+        """
+        snapshot = snapshot or self._snapshot
+        result_id = secrets.token_urlsafe(16)
+        with timed("result_store"):
+            self.result_store.put(result_id, {
+                "symptoms": symptoms_input,
+                "kb_hash": snapshot.kb_hash,
+                "diagnosis": diagnosis
+            })
+        return result_id
+    
+    def get_stored_diagnosis(self, result_id: str) -> Optional[Dict]:
+        """
+        Look up a diagnosis kept by store_diagnosis()
+        
+        Returns:
+            Dict with the original "symptoms", "kb_hash" and "diagnosis", or None if
+            the id is unknown or expired
+        """
+        if not result_id:
+            return None
+        return self.result_store.get(result_id)
+    
+    def create_session(self, symptoms_input: str, days: Optional[float] = None,
+                       top_k: int = DEFAULT_TOP_K) -> Tuple[str, AssessmentSession]:
+        """
+        Start an assessment session that later symptom edits update incrementally
+        
+        Args:
+            symptoms_input: Comma-separated symptoms or free text
+            days: Symptom duration for duration penalties
+            top_k: Maximum number of ranked diseases the session's diagnosis returns
+            
+        Returns:
+            Tuple of (session id, session)
+        """
+        snapshot = self._snapshot
+        session = AssessmentSession(snapshot, snapshot.input_fragments(symptoms_input), days, top_k)
+        session_id = secrets.token_urlsafe(16)
+        self.sessions.put(session_id, session)
+        return session_id, session
+    
+    def get_session(self, session_id: str) -> Optional[AssessmentSession]:
+        """
+        Look up a live session, rebuilding it on the current snapshot after a reload
+        
+        Returns:
+            The session, or None if the id is unknown or expired
+        """
+        session = self.sessions.get(session_id) if session_id else None
+        if session is not None and session.snapshot is not self._snapshot:
+            with session.lock:
+                if session.snapshot is not self._snapshot:
+                    session.rebase(self._snapshot)
+            self.sessions.trim()
+        return session
+    
+    def update_session(self, session: AssessmentSession, add: str = "", remove: str = "",
+                       days: Optional[float] = None) -> Dict:
+        """
+        Add and remove symptoms of a session, updating its scores incrementally
+        
+        The session store re-checks its memory cap afterwards, so sessions
+        that grew past it are evicted, least recently used first.
+        
+        Args:
+            session: Session from create_session() / get_session()
+            add: Symptoms to add (comma-separated or free text, kept as typed like diagnose input)
+            remove: Symptoms to remove (same format; matched by canonical symptom)
+            days: New symptom duration (None: unchanged)
+            
+        Returns:
+            Dict with the canonical symptoms "added" and "removed" by the edit
+        """
+        with session.lock:
+            before = session.symptoms
+            if remove:
+                session.remove_fragments(KnowledgeBaseSnapshot.input_fragments(remove))
+            if add:
+                session.add_fragments(KnowledgeBaseSnapshot.input_fragments(add))
+            if days is not None:
+                session.days = days
+            after = session.symptoms
+        self.sessions.trim()
+        return {
+            "added": [symptom for symptom in after if symptom not in before],
+            "removed": [symptom for symptom in before if symptom not in after]
+        }
+    
+    def delete_session(self, session_id: str) -> bool:
+        """End a session; returns False if it did not exist"""
+        return self.sessions.delete(session_id)
+    
+    def attribute_symptoms(self, diagnosis: Dict, disease_ids: Optional[List[str]] = None,
+                           snapshot: Optional[KnowledgeBaseSnapshot] = None,
+                           time_budget: float = DEFAULT_TIME_BUDGET) -> Dict:
+        """
+        Attach Shapley attributions of the reported symptoms to diagnosed diseases
+        
+        The players are the input's fragments as typed ("stomach ache", not the
+        canonical symptoms it maps to), so for each disease baseline_score plus
+        the Shapley values sums to the reported final_score (the combined score
+        before any duration penalty). All coalitions for all selected diseases
+        are scored in one batch; long inputs are estimated from sampled
+        permutations, which keep that sum exact.
+        
+        Args:
+            diagnosis: Result of diagnose() or a session; updated in place
+            disease_ids: Diseases to attribute (default: every returned disease)
+            snapshot: Knowledge-base snapshot the diagnosis was scored against
+                (default: the current one)
+            time_budget: Seconds of permutation sampling when values cannot be exact
+        
+        Returns:
+            The diagnosis
+        """
+        snapshot = snapshot or self._snapshot
+        fragments = diagnosis.get("input_fragments", [])
+        diseases = [
+            disease for disease in diagnosis.get("possible_diseases", [])
+            if (disease_ids is None or disease["disease_id"] in disease_ids)
+            and disease["disease_id"] in snapshot.disease_record_index
+        ]
+        
+        if not fragments or not diseases:
+            return diagnosis
+        
+        disease_indices = np.array([snapshot.disease_record_index[d["disease_id"]] for d in diseases])
+        with timed("attribution"):
+            result = shapley_values(
+                snapshot.coalition_value_function(fragments, disease_indices),
+                len(fragments),
+                time_budget=time_budget
+            )
+        
+        for column, disease in enumerate(diseases):
+            disease["symptom_attributions"] = {
+                "method": result.method,
+                "coalitions_scored": result.coalitions_scored,
+                "attributed_score": float(result.full_value[column]),
+                "baseline_score": float(result.empty_value[column]),
+                "values": [
+                    {"symptom": fragment, "shapley_value": float(result.values[row, column])}
+                    for row, fragment in enumerate(fragments)
+                ]
+            }
+        
+        return diagnosis
+    
+    def what_if(self, diagnosis: Dict, snapshot: Optional[KnowledgeBaseSnapshot] = None) -> Optional[Dict]:
+        """
+        Rescore single-symptom additions and removals of a diagnosed query
+        
+        See counterfactual.rescore_symptom_edits: returns the true confidence
+        deltas of each edit for the diagnosed diseases and the smallest edit that
+        swaps ranks 1 and 2.
+        
+        Args:
+            diagnosis: Result of diagnose()
+            snapshot: Knowledge-base snapshot the diagnosis was scored against
+                (default: the current one)
+            
+        Returns:
+            What-if analysis, or None with fewer than two diagnosed diseases
+        """
+        ranked_ids = [d["disease_id"] for d in diagnosis.get("possible_diseases", [])]
+        if len(ranked_ids) < 2 or not diagnosis.get("input_fragments"):
+            return None
+        
+        with timed("counterfactual"):
+            return rescore_symptom_edits(
+                snapshot or self._snapshot,
+                diagnosis["input_fragments"],
+                ranked_ids,
+                symptom_days=diagnosis.get("symptom_days")
+            )
+    
     def explain_diagnosis(self, disease_id: str) -> Dict:
         """Get detailed explanation for a specific disease"""
-        diseases = self.knowledge_base.get("diseases", {})
+        record = self._snapshot.disease_record(disease_id)
         
-        if disease_id not in diseases:
+        if record is None:
             return {"error": f"Disease {disease_id} not found"}
         
-        disease = diseases[disease_id]
-        
         return {
-            "disease_name": disease.get("name", disease_id),
-            "symptoms": disease.get("symptoms", []),
-            "explanation": disease.get("explanation", ""),
-            "disease_id": disease_id
+            "disease_name": record.name,
+            "symptoms": list(record.symptoms),
+            "explanation": record.explanation,
+            "disease_id": disease_id,
+            "specialist": record.specialist,
+            "specialist_reason": record.specialist_reason,
+            "typical_duration_min": record.typical_duration_min,
+            "typical_duration_max": record.typical_duration_max,
+            "is_chronic": record.is_chronic
         }
     
-    def get_recommendation(self, symptoms_input: str) -> Dict:
-        """Get diagnostic recommendation based on symptoms"""
-        diagnosis = self.diagnose(symptoms_input)
+    def get_recommendation(self, symptoms_input: str, diagnosis: Optional[Dict] = None) -> Dict:
+        """
+        Get diagnostic recommendation based on symptoms
+        
+        Args:
+            symptoms_input: Comma-separated symptoms or free text
+            diagnosis: Already computed diagnose() result for symptoms_input (scored if omitted)
+        """
+        if diagnosis is None:
+            diagnosis = self.diagnose(symptoms_input)
         
         if diagnosis.get("error"):
             return {"recommendation": "Please provide valid symptoms", "urgency": "low"}
@@ -271,8 +1365,9 @@ class MedicalXAIModel:
         }
 
 
-def initialize_model(kb_path: str = None) -> MedicalXAIModel:
-    """Initialize and return the medical XAI model"""
+
+def initialize_model(kb_path: str = None, **model_options) -> MedicalXAIModel:
+    """Initialize and return the medical XAI model (model_options go to MedicalXAIModel)"""
     if kb_path is None:
         kb_path = os.path.join(
             os.path.dirname(__file__),
@@ -281,4 +1376,4 @@ def initialize_model(kb_path: str = None) -> MedicalXAIModel:
             "medical_knowledge_base.json"
         )
     
-    return MedicalXAIModel(kb_path)
+    return MedicalXAIModel(kb_path, **model_options)
@@ -0,0 +1,117 @@
+"""
+Question Selector Module - Information-gain ranking of clarifying symptoms
+Treats the normalized scores of the ranked diseases as a distribution and asks
+about the unreported symptoms whose answer is expected to reduce its entropy most
+"""
+
+from typing import Dict, List
+
+import numpy as np
+
+# Probability that a patient answers against a disease's profile (missing or atypical symptom)
+DEFAULT_ANSWER_NOISE = 0.05
+
+# Questions expected to gain less than this many bits are not worth a round trip
+DEFAULT_MIN_GAIN = 0.05
+
+
+def expected_information_gain(prior: np.ndarray, likelihood: np.ndarray) -> np.ndarray:
+    """
+    Expected entropy reduction of asking each yes/no question
+
+    Args:
+        prior: (n_diseases,) probability of each disease
+        likelihood: (n_questions, n_diseases) probability of a "yes" under each disease
+
+    Returns:
+        (n_questions,) expected information gain in bits
+    """
+    joint_yes = likelihood * prior
+    joint_no = (1.0 - likelihood) * prior
+    p_yes = joint_yes.sum(axis=1)
+    p_no = joint_no.sum(axis=1)
+
+    # Expected posterior entropy = H(answer, disease) - H(answer), summed over both answers
+    joint_entropy = -(_plogp(joint_yes).sum(axis=1) + _plogp(joint_no).sum(axis=1))
+    answer_entropy = -(_plogp(p_yes) + _plogp(p_no))
+
+    return -_plogp(prior).sum() - (joint_entropy - answer_entropy)
+
+
+def _plogp(p: np.ndarray) -> np.ndarray:
+    """p * log2(p), with 0 log 0 = 0"""
+    return np.where(p > 0, p * np.log2(np.where(p > 0, p, 1.0)), 0.0)
+
+
+def symptom_information_gains(top_diseases: List[Dict],
+                              answer_noise: float = DEFAULT_ANSWER_NOISE) -> Dict[str, float]:
+    """
+    Information gain of asking about each unreported symptom of the ranked diseases
+
+    Args:
+        top_diseases: Ranked diagnoses (confidence_score, disease_symptoms, matched_symptoms)
+        answer_noise: Probability of an answer contradicting a disease's profile
+
+    Returns:
+        Symptom -> expected gain in bits, in knowledge-base order of first appearance
+        (empty with fewer than two scored diseases)
+    """
+    scores = np.array([max(d.get("confidence_score", 0), 0.0) for d in top_diseases], dtype=np.float64)
+    if len(top_diseases) < 2 or scores.sum() <= 0:
+        return {}
+    prior = scores / scores.sum()
+
+    reported = {s for d in top_diseases for s in d.get("matched_symptoms", [])}
+    symptoms = list(dict.fromkeys(
+        s for d in top_diseases for s in d.get("disease_symptoms", []) if s not in reported
+    ))
+    if not symptoms:
+        return {}
+    row_index = {symptom: row for row, symptom in enumerate(symptoms)}
+
+    # presence[i, j]: symptom i is in the profile of disease j
+    presence = np.zeros((len(symptoms), len(top_diseases)), dtype=bool)
+    for column, disease in enumerate(top_diseases):
+        rows = [row_index[s] for s in set(disease.get("disease_symptoms", [])) if s in row_index]
+        presence[rows, column] = True
+
+    likelihood = np.where(presence, 1.0 - answer_noise, answer_noise)
+    gains = expected_information_gain(prior, likelihood)
+    return dict(zip(symptoms, gains.tolist()))
+
+
+def select_clarifying_symptoms(top_diseases: List[Dict], max_questions: int = 3,
+                               min_gain: float = DEFAULT_MIN_GAIN,
+                               answer_noise: float = DEFAULT_ANSWER_NOISE) -> List[Dict]:
+    """
+    The unreported symptoms whose answers best separate the ranked diseases
+
+    Args:
+        top_diseases: Ranked diagnoses
+        max_questions: Maximum number of symptoms returned
+        min_gain: Minimum expected gain (bits) for a symptom to be asked about
+        answer_noise: Probability of an answer contradicting a disease's profile
+
+    Returns:
+        List of {"symptom", "information_gain", "suggests", "argues_against"},
+        best first; the last two name the diseases with and without the symptom
+    """
+    gains = symptom_information_gains(top_diseases, answer_noise)
+    ranked = sorted(
+        (symptom for symptom, gain in gains.items() if gain >= min_gain),
+        key=lambda symptom: gains[symptom],
+        reverse=True
+    )[:max_questions]
+
+    selected = []
+    for symptom in ranked:
+        with_symptom = [d.get("disease_name") for d in top_diseases if symptom in d.get("disease_symptoms", [])]
+        selected.append({
+            "symptom": symptom,
+            "information_gain": gains[symptom],
+            "suggests": with_symptom,
+            "argues_against": [
+                d.get("disease_name") for d in top_diseases if d.get("disease_name") not in with_symptom
+            ]
+        })
+    return selected
@@ -0,0 +1,84 @@
+"""
+Result Cache Module - Bounded, thread-safe memoization for diagnosis results
+Least-recently-used eviction with a per-entry time-to-live and hit/miss counters
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class ResultCache:
+    """LRU cache with TTL expiry, safe to share between request threads"""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 300.0):
+        """
+        Args:
+            maxsize: Maximum number of entries kept (0 disables caching)
+            ttl: Seconds an entry stays valid (None for no expiry)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a copy of the cached value, or None on a miss or expired entry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            value = None
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is not None and expires_at <= time.monotonic():
+                    del self._entries[key]
+                    self.evictions += 1
+                    value = None
+                else:
+                    self._entries.move_to_end(key)
+
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        # Callers mutate results (e.g. duration penalties), so never hand out the stored object
+        return copy.deepcopy(value)
+
+    def put(self, key: Hashable, value: Any):
+        """Store a copy of value, evicting the least recently used entry when full"""
+        if self.maxsize <= 0:
+            return
+
+        stored = copy.deepcopy(value)
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+
+        with self._lock:
+            self._entries[key] = (expires_at, stored)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all entries (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Current size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
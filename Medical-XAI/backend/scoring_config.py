@@ -0,0 +1,82 @@
+"""
+Scoring Configuration - Weights and thresholds used to rank diseases and flag uncertain diagnoses
+Read once at startup from data/scoring_config.json (written by python -m benchmarks.tune).
+None of these values enters the fitted TF-IDF model or the compiled artifact, so changing
+them never requires a refit.
+"""
+
+import json
+import os
+from typing import Dict, NamedTuple, Optional
+
+DEFAULT_SCORING_CONFIG_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "data", "scoring_config.json"
+)
+
+
+class ScoringConfig(NamedTuple):
+    """Scoring parameters; the defaults are the values the model has always used"""
+    # Combined score = tfidf_weight * min(1, tfidf + match_bonus) + match_weight * match_ratio
+    tfidf_weight: float = 0.6
+    match_weight: float = 0.4
+    # match_bonus = match_bonus_factor * share of the disease's symptoms mentioned in the raw text
+    match_bonus_factor: float = 0.3
+    # Diseases must score above this combined score to be ranked at all
+    min_combined_score: float = 0.1
+    # A top confidence below this asks clarifying questions
+    confidence_threshold: float = 0.50
+    # Diseases scoring within this of each other are a differential diagnosis
+    differential_threshold: float = 0.05
+
+    def validate(self) -> "ScoringConfig":
+        """Return self, or raise ValueError if a parameter is out of range"""
+        for name in ("tfidf_weight", "match_weight", "match_bonus_factor"):
+            if getattr(self, name) < 0:
+                raise ValueError(f"{name} must be non-negative")
+        for name in ("min_combined_score", "confidence_threshold", "differential_threshold"):
+            if not 0 <= getattr(self, name) <= 1:
+                raise ValueError(f"{name} must be between 0 and 1")
+        return self
+
+
+def load_scoring_config(path: Optional[str] = None) -> ScoringConfig:
+    """
+    Load scoring parameters
+
+    Args:
+        path: Config JSON (default: data/scoring_config.json)
+
+    Returns:
+        ScoringConfig; parameters missing from the file, or a missing file, keep their defaults
+
+    Raises:
+        ValueError: Unknown or out-of-range parameters
+    """
+    path = path or DEFAULT_SCORING_CONFIG_PATH
+    if not os.path.exists(path):
+        return ScoringConfig()
+
+    with open(path, 'r') as f:
+        parameters = json.load(f).get("parameters", {})
+
+    unknown = sorted(set(parameters) - set(ScoringConfig._fields))
+    if unknown:
+        raise ValueError(f"unknown scoring parameter(s) in {path}: {', '.join(unknown)}")
+    return ScoringConfig(**{name: float(value) for name, value in parameters.items()}).validate()
+
+
+def save_scoring_config(config: ScoringConfig, path: Optional[str] = None, tuning: Optional[Dict] = None):
+    """
+    Write scoring parameters, with optional notes on how they were chosen
+
+    Args:
+        config: Parameters to write
+        path: Config JSON (default: data/scoring_config.json)
+        tuning: Stored under "tuning" and ignored when loading
+    """
+    document = {"parameters": config.validate()._asdict()}
+    if tuning is not None:
+        document["tuning"] = tuning
+
+    with open(path or DEFAULT_SCORING_CONFIG_PATH, 'w') as f:
+        json.dump(document, f, indent=2)
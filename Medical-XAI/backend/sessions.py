@@ -0,0 +1,280 @@
+"""
+Sessions Module - Incrementally scored multi-turn assessments
+An assessment session keeps its query's TF-IDF term counts and per-disease
+partial sums, so adding or removing a symptom is one sparse row update instead
+of a full rescore
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from scipy import sparse
+
+from xai_formatter import XAIFormatter
+
+
+class AssessmentSession:
+    """
+    Running score state of one assessment against one knowledge-base snapshot
+
+    The session holds input fragments as typed (see
+    KnowledgeBaseSnapshot.input_fragments), so its scores equal those of a
+    /diagnose of the fragments joined with ", ", synonyms and free text included.
+    """
+
+    def __init__(self, snapshot, fragments: Iterable[str] = (), days: Optional[float] = None,
+                 top_k: int = 5):
+        """
+        Args:
+            snapshot: KnowledgeBaseSnapshot to score against
+            fragments: Initial input fragments (input_fragments() of the first input)
+            days: Symptom duration for duration penalties (None: no penalty)
+            top_k: Number of ranked diseases diagnose() returns
+        """
+        self.lock = threading.Lock()
+        self.days = days
+        self.top_k = top_k
+        self._reset(snapshot)
+        self._add(list(fragments))
+
+    def _reset(self, snapshot):
+        self.snapshot = snapshot
+        self.fragments: List[str] = []
+        # preprocess_symptoms() of each fragment
+        self.fragment_symptoms: List[List[str]] = []
+        n_diseases = len(snapshot.disease_ids)
+        # Partial sums per disease: unnormalized TF-IDF dot products, mentioned
+        # disease-symptom counts and matched profile symptoms
+        self.term_dots = np.zeros(n_diseases)
+        self.bonus_counts = np.zeros(n_diseases)
+        self.matched_counts = np.zeros(n_diseases)
+        # Query term counts, and how many fragments mention / report each disease symptom
+        self.term_counts: Dict[int, int] = {}
+        self.mention_counts: Dict[int, int] = {}
+        self.report_counts: Dict[int, int] = {}
+
+    @property
+    def symptoms(self) -> List[str]:
+        """Canonical symptoms of the session, as preprocess_symptoms() returns them for the joined fragments"""
+        return list(dict.fromkeys(symptom for symptoms in self.fragment_symptoms for symptom in symptoms))
+
+    def rebase(self, snapshot):
+        """Rebuild the partial sums against another snapshot (e.g. after a reload)"""
+        fragments = self.fragments
+        self._reset(snapshot)
+        self._add(fragments)
+
+    def add_fragments(self, fragments: Iterable[str]) -> List[str]:
+        """
+        Add input fragments, skipping those whose symptoms are all reported already
+
+        Returns:
+            The fragments added
+        """
+        reported = set(self.symptoms)
+        added = []
+        for fragment in dict.fromkeys(fragments):
+            symptoms = self.snapshot.preprocess_symptoms(fragment)
+            if not set(symptoms) <= reported:
+                added.append(fragment)
+                reported.update(symptoms)
+        self._add(added)
+        return added
+
+    def remove_fragments(self, fragments: Iterable[str]) -> List[str]:
+        """
+        Remove every session fragment whose symptoms are all among those of the given fragments
+
+        Removing "fever" also drops a fragment typed as "hot"; a fragment naming
+        several symptoms stays until all of them are removed.
+
+        Returns:
+            The fragments removed
+        """
+        removing = set(self.snapshot.preprocess_symptoms(", ".join(fragments)))
+        keep = [not set(symptoms) <= removing for symptoms in self.fragment_symptoms]
+        removed = [fragment for fragment, kept in zip(self.fragments, keep) if not kept]
+        self._update(removed, -1)
+        self.fragment_symptoms = [symptoms for symptoms, kept in zip(self.fragment_symptoms, keep) if kept]
+        self.fragments = [fragment for fragment, kept in zip(self.fragments, keep) if kept]
+        return removed
+
+    def _add(self, fragments: List[str]):
+        self._update(fragments, 1)
+        self.fragments.extend(fragments)
+        self.fragment_symptoms.extend(self.snapshot.preprocess_symptoms(fragment) for fragment in fragments)
+
+    @staticmethod
+    def _count(counts: Dict[int, int], key: int, sign: int) -> bool:
+        """Adjust a reference count; returns True when it moved between zero and non-zero"""
+        before = counts.get(key, 0)
+        after = before + sign
+        if after:
+            counts[key] = after
+        else:
+            del counts[key]
+        return (before == 0) != (after == 0)
+
+    def _update(self, fragments: List[str], sign: int):
+        """Apply (+1) or retract (-1) the contribution of each fragment to the partial sums"""
+        if not fragments:
+            return
+        snapshot = self.snapshot
+        term_counts, symptom_mentions, reported_symptoms = snapshot._fragment_features(fragments)
+
+        # One sparse (fragments x terms) x (terms x diseases) product per batch of fragments
+        term_weights = term_counts @ sparse.diags(snapshot.vectorizer.idf_)
+        self.term_dots += sign * np.asarray((term_weights @ snapshot.term_postings).sum(axis=0)).ravel()
+
+        term_totals = np.asarray(term_counts.sum(axis=0)).ravel()
+        for term in np.flatnonzero(term_totals).tolist():
+            count = self.term_counts.get(term, 0) + sign * int(term_totals[term])
+            if count:
+                self.term_counts[term] = count
+            else:
+                del self.term_counts[term]
+
+        # A disease symptom adds to the bonus / match count only while at least one fragment mentions / reports it
+        for symptom_id in symptom_mentions.indices.tolist():
+            if self._count(self.mention_counts, symptom_id, sign):
+                row = snapshot.symptom_postings[symptom_id]
+                self.bonus_counts[row.indices] += sign * row.data
+
+        for symptom_id in reported_symptoms.indices.tolist():
+            if self._count(self.report_counts, symptom_id, sign):
+                self.matched_counts[snapshot.symptom_postings[symptom_id].indices] += sign
+
+    def scores(self) -> Dict[str, np.ndarray]:
+        """Score arrays for every disease, in the layout KnowledgeBaseSnapshot._build_diagnosis expects"""
+        snapshot = self.snapshot
+        idf = snapshot.vectorizer.idf_
+        terms = np.fromiter(self.term_counts.keys(), dtype=np.int64, count=len(self.term_counts))
+        counts = np.fromiter(self.term_counts.values(), dtype=np.float64, count=len(self.term_counts))
+        norm = float(np.sqrt(np.sum((counts * idf[terms]) ** 2)))
+
+        candidates = np.arange(len(snapshot.disease_ids))
+        tfidf_similarity = (self.term_dots / norm if norm > 0 else np.zeros_like(self.term_dots))[None, :]
+        bonus_counts = self.bonus_counts[None, :]
+        matched_counts = self.matched_counts[None, :]
+
+        components = snapshot._combine_scores(tfidf_similarity, bonus_counts, matched_counts, candidates)
+        days = np.nan if self.days is None else float(self.days)
+        duration_penalty = XAIFormatter.duration_penalties(
+            np.array([[days]]), snapshot.duration_min, snapshot.duration_max, snapshot.duration_chronic
+        )
+
+        return {
+            "candidates": candidates,
+            "query_symptom_ids": [snapshot._intern_symptoms(self.symptoms)],
+            "matched_counts": matched_counts,
+            "tfidf_similarity": tfidf_similarity,
+            "bonus_counts": bonus_counts,
+            **components,
+            "symptom_days": [self.days],
+            "input_fragments": [list(self.fragments)],
+            "duration_penalty": duration_penalty,
+            "confidence_score": np.maximum(0.0, components["combined_score"] - duration_penalty)
+        }
+
+    def diagnose(self) -> Dict:
+        """Ranked diagnosis of the current symptoms, formatted like MedicalXAIModel.diagnose()"""
+        symptoms = self.symptoms
+        if not symptoms:
+            return {"error": "No valid symptoms provided", "diseases": []}
+        return self.snapshot._build_diagnosis(symptoms, self.scores(), 0, self.top_k)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the session"""
+        arrays = self.term_dots.nbytes + self.bonus_counts.nbytes + self.matched_counts.nbytes
+        # Dict entries and symptom strings, roughly
+        return arrays + 100 * (
+            len(self.term_counts) + len(self.mention_counts) + len(self.report_counts) + len(self.fragments)
+        )
+
+
+class SessionStore:
+    """Thread-safe session registry with idle TTL, a session-count cap and a memory cap"""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 1800.0,
+                 max_bytes: Optional[int] = 256 * 1024 * 1024):
+        """
+        Args:
+            maxsize: Maximum number of live sessions
+            ttl: Seconds a session survives without being used (None for no expiry)
+            max_bytes: Approximate memory budget for all sessions (None for no limit)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, session_id: str) -> Optional[AssessmentSession]:
+        """Return the session and refresh its TTL, or None if unknown or expired"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            expires_at, session = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._sessions[session_id]
+                self.evictions += 1
+                return None
+            self._sessions[session_id] = (self._expiry(), session)
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def put(self, session_id: str, session: AssessmentSession):
+        """Register a session, evicting expired then least recently used sessions over the caps"""
+        with self._lock:
+            self._sessions[session_id] = (self._expiry(), session)
+            self._sessions.move_to_end(session_id)
+            self._evict()
+
+    def trim(self):
+        """Re-check the caps after live sessions changed size (e.g. symptoms were added)"""
+        with self._lock:
+            self._evict()
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def _expiry(self) -> Optional[float]:
+        return time.monotonic() + self.ttl if self.ttl is not None else None
+
+    def _evict(self):
+        now = time.monotonic()
+        for session_id in [sid for sid, (expires_at, _) in self._sessions.items()
+                           if expires_at is not None and expires_at <= now]:
+            del self._sessions[session_id]
+            self.evictions += 1
+
+        total_bytes = sum(session.nbytes for _, session in self._sessions.values())
+        while self._sessions and (
+            len(self._sessions) > self.maxsize
+            or (self.max_bytes is not None and total_bytes > self.max_bytes)
+        ):
+            _, (_, session) = self._sessions.popitem(last=False)
+            total_bytes -= session.nbytes
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "size": len(self._sessions),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "bytes": sum(session.nbytes for _, session in self._sessions.values()),
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions
+            }
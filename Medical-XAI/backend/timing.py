@@ -0,0 +1,190 @@
+"""
+Timing Module - Per-stage latency instrumentation
+A StageTimer collects the stage durations of one request; the timed() blocks
+placed around pipeline stages record into whichever timer is active in the
+current context and cost one context-variable lookup when none is. Nested
+stages are recorded exclusively, so a stage's time excludes the stages inside it
+"""
+
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence
+
+# Histogram bucket upper bounds in seconds (an implicit +Inf bucket follows)
+DEFAULT_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5
+)
+
+# Independently locked shards per histogram, so concurrent requests rarely contend
+HISTOGRAM_STRIPES = 8
+
+_active_timer: contextvars.ContextVar = contextvars.ContextVar("stage_timer", default=None)
+
+
+class StageTimer:
+    """Stage durations of one request, in the order the stages first ran"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        # Time spent in nested stages of each currently open stage
+        self._nested: List[float] = []
+
+    def record(self, stage: str, seconds: float):
+        """Add seconds to a stage (stages entered repeatedly accumulate)"""
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def breakdown(self) -> Dict:
+        """Milliseconds per stage and since the timer started"""
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "stages_ms": {stage: round(seconds * 1000, 3) for stage, seconds in self.stages.items()}
+        }
+
+
+class _TimedStage:
+    __slots__ = ("stage", "timer", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.timer = _active_timer.get()
+        if self.timer is not None:
+            self.timer._nested.append(0.0)
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        timer = self.timer
+        if timer is not None:
+            elapsed = time.perf_counter() - self.start
+            timer.record(self.stage, elapsed - timer._nested.pop())
+            if timer._nested:
+                timer._nested[-1] += elapsed
+        return False
+
+
+def timed(stage: str) -> _TimedStage:
+    """Context manager recording the enclosed block as stage of the active timer, if any"""
+    return _TimedStage(stage)
+
+
+class LatencyHistogram:
+    """
+    Cumulative latency histogram safe to update from many threads
+
+    Observations go to one of HISTOGRAM_STRIPES shards chosen by thread id, each
+    with its own lock, and are only summed across shards when read.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS, stripes: int = HISTOGRAM_STRIPES):
+        self.buckets = tuple(buckets)
+        self._stripes = stripes
+        # Per shard: bucket counts (last one is +Inf) followed by the sum of observations
+        self._shards = [[0] * (len(self.buckets) + 1) + [0.0] for _ in range(stripes)]
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def observe(self, seconds: float):
+        stripe = threading.get_ident() % self._stripes
+        bucket = bisect_left(self.buckets, seconds)
+        shard = self._shards[stripe]
+        with self._locks[stripe]:
+            shard[bucket] += 1
+            shard[-1] += seconds
+
+    def snapshot(self) -> Dict:
+        """
+        Returns:
+            Dict with "buckets" (upper bound, cumulative count) pairs ending with
+            +Inf, "count" and "sum" (seconds)
+        """
+        totals = [0] * (len(self.buckets) + 2)
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                copied = list(shard)
+            totals = [total + value for total, value in zip(totals, copied)]
+
+        cumulative, running = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), totals[:-1]):
+            running += count
+            cumulative.append((bound, running))
+        return {"buckets": cumulative, "count": running, "sum": totals[-1]}
+
+    def quantile(self, q: float, snapshot: Optional[Dict] = None) -> Optional[float]:
+        """Estimate of the q-quantile in seconds, interpolated within its bucket (None if empty)"""
+        snapshot = snapshot or self.snapshot()
+        if not snapshot["count"]:
+            return None
+        rank = q * snapshot["count"]
+        lower, below = 0.0, 0
+        for bound, cumulative in snapshot["buckets"]:
+            if cumulative >= rank:
+                if bound == float("inf"):
+                    return lower
+                return lower + (bound - lower) * (rank - below) / max(cumulative - below, 1)
+            lower, below = bound, cumulative
+        return lower
+
+
+class StageHistograms:
+    """Latency histogram per pipeline stage, filled by the timers it hands out"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage: str) -> LatencyHistogram:
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, LatencyHistogram(self.buckets))
+        return histogram
+
+    def observe(self, stages: Dict[str, float]):
+        for stage, seconds in stages.items():
+            self.histogram(stage).observe(seconds)
+
+    @contextmanager
+    def timer(self) -> Iterator[StageTimer]:
+        """
+        Activate a StageTimer for the enclosed block and add its stages to the histograms
+
+        Nested calls reuse the outer timer, whose owner records it once on exit.
+        """
+        current = _active_timer.get()
+        if current is not None:
+            yield current
+            return
+
+        timer = StageTimer()
+        token = _active_timer.set(timer)
+        try:
+            yield timer
+        finally:
+            _active_timer.reset(token)
+            self.observe(timer.stages)
+
+    def stages(self) -> List[str]:
+        return list(self._histograms)
+
+    def summary(self, quantiles: Sequence[float] = (0.5, 0.95, 0.99)) -> Dict[str, Dict]:
+        """Count, mean and estimated quantiles (milliseconds) of every stage"""
+        summary = {}
+        for stage, histogram in list(self._histograms.items()):
+            snapshot = histogram.snapshot()
+            count = snapshot["count"]
+            stage_summary = {
+                "count": count,
+                "mean_ms": round(snapshot["sum"] / count * 1000, 3) if count else None
+            }
+            for q in quantiles:
+                value = histogram.quantile(q, snapshot)
+                stage_summary[f"p{round(q * 100):g}_ms"] = round(value * 1000, 3) if value is not None else None
+            summary[stage] = stage_summary
+        return summary
@@ -3,9 +3,15 @@ XAI Formatter Module - Converts model outputs to human-readable explanations
 Formats explainability data for UI consumption
 """
 
-from typing import Dict, List, Any
+from itertools import combinations
+from typing import Dict, Iterable, List, Any, Optional
 import json
 
+import numpy as np
+
+from differential_table import DifferentialEntry, DifferentialTable
+from question_selector import select_clarifying_symptoms, symptom_information_gains
+
 
 class XAIFormatter:
     """Formats medical diagnosis explanations for human readability"""
@@ -30,12 +36,77 @@ class XAIFormatter:
         "thyroiditis": ("Endocrinologist", "Thyroid function testing and management"),
     }
     
+    # Per-disease XAI sections, in response order; each is only built when requested
+    XAI_SECTIONS = ("scoring_breakdown", "explanation", "symptom_analysis", "feature_importance", "duration_impact")
+    
+    @staticmethod
+    def duration_penalties(symptom_days, duration_min, duration_max, is_chronic) -> np.ndarray:
+        """
+        Confidence penalties for a symptom duration outside a disease's typical range
+        
+        Works elementwise on anything that broadcasts, e.g. a column of symptom
+        days against rows of candidate duration ranges. NaN days get no penalty.
+        
+        Args:
+            symptom_days: How many days symptoms have lasted
+            duration_min: Typical minimum duration of each disease (days)
+            duration_max: Typical maximum duration of each disease (days)
+            is_chronic: Whether each disease is chronic
+            
+        Returns:
+            Array of penalties to subtract from the confidence scores
+        """
+        days = np.asarray(symptom_days, dtype=np.float64)
+        duration_min = np.asarray(duration_min, dtype=np.float64)
+        
+        # Symptoms came too fast - disease usually takes longer to develop
+        too_short = days < duration_min
+        short_penalty = 0.15 * (duration_min - days) / np.maximum(1, duration_min)
+        
+        # Symptoms lasted way too long for an acute illness
+        too_long = (days > duration_max) & ~np.asarray(is_chronic, dtype=bool)
+        
+        return np.where(too_short, short_penalty, np.where(too_long, 0.25, 0.0))
+    
+    @staticmethod
+    def duration_warning(disease_name: str, symptom_days, duration_min: int, duration_max: int,
+                         is_chronic: bool) -> Optional[str]:
+        """Warning text matching duration_penalties, or None when the duration is plausible"""
+        if symptom_days < duration_min:
+            return f"⚠️ Symptoms developed very quickly. {disease_name} typically develops over {duration_min}+ days."
+        
+        if symptom_days > duration_max and not is_chronic:
+            return f"⚠️ Symptoms lasting {symptom_days} days is unusual for {disease_name} (typically {duration_max} days max). Consider chronic condition re-evaluation."
+        
+        return None
+    
+    @staticmethod
+    def format_duration_validation(disease_name: str, symptom_days, duration_min: int, duration_max: int,
+                                   is_chronic: bool, original_confidence: float, penalty: float) -> Dict:
+        """Duration validation block reported with a diagnosed disease"""
+        adjusted_confidence = max(0.0, original_confidence - penalty)
+        return {
+            "symptom_days": symptom_days,
+            "typical_duration_min": duration_min,
+            "typical_duration_max": duration_max,
+            "is_chronic": is_chronic,
+            "penalty_applied": round(penalty, 3),
+            "original_confidence": round(original_confidence, 3),
+            "adjusted_confidence": round(adjusted_confidence, 3),
+            "warning": XAIFormatter.duration_warning(
+                disease_name, symptom_days, duration_min, duration_max, is_chronic
+            )
+        }
+    
     @staticmethod
     def validate_disease_duration(possible_diseases: List[Dict], symptom_days: int, knowledge_base: Dict) -> List[Dict]:
         """
         Validate if symptom duration makes sense for the diagnosed diseases.
         Apply penalty to confidence score if duration is unrealistic.
         
+        The model applies the same penalties itself, before ranking, when
+        diagnose() is given days; this is for diagnoses produced without them.
+        
         Args:
             possible_diseases: List of diagnosed diseases with scores
             symptom_days: How many days symptoms have lasted
@@ -46,51 +117,22 @@ class XAIFormatter:
         """
         diseases = knowledge_base.get("diseases", {})
         
-        for disease in possible_diseases:
-            disease_id = disease.get("disease_id")
-            disease_data = diseases.get(disease_id, {})
-            
-            # Get typical duration range for this disease
-            min_duration = disease_data.get("typical_duration_min", 1)
-            max_duration = disease_data.get("typical_duration_max", 365)
-            is_chronic = disease_data.get("is_chronic", False)
-            
-            # Check if duration is reasonable
+        durations = [diseases.get(disease.get("disease_id"), {}) for disease in possible_diseases]
+        duration_min = [data.get("typical_duration_min", 1) for data in durations]
+        duration_max = [data.get("typical_duration_max", 365) for data in durations]
+        is_chronic = [data.get("is_chronic", False) for data in durations]
+        
+        penalties = XAIFormatter.duration_penalties(symptom_days, duration_min, duration_max, is_chronic)
+        
+        for i, disease in enumerate(possible_diseases):
             original_confidence = disease.get("confidence_score", 0)
+            penalty = float(penalties[i])
             
-            if symptom_days < min_duration:
-                # Symptoms came too fast - disease usually takes longer to develop
-                penalty = 0.15 * (min_duration - symptom_days) / max(1, min_duration)
-                duration_warning = f"⚠️ Symptoms developed very quickly. {disease_data.get('name')} typically develops over {min_duration}+ days."
-                
-            elif symptom_days > max_duration and not is_chronic:
-                # Symptoms lasted way too long for an acute illness
-                penalty = 0.25  # Large penalty for acute conditions lasting months
-                duration_warning = f"⚠️ Symptoms lasting {symptom_days} days is unusual for {disease_data.get('name')} (typically {max_duration} days max). Consider chronic condition re-evaluation."
-                
-            elif symptom_days > (max_duration * 2) and not is_chronic:
-                # Symptoms lasted VERY long
-                penalty = 0.35  # Major penalty
-                duration_warning = f"⚠️ These symptoms have persisted for {symptom_days} days, which is far longer than typical for {disease_data.get('name')}. Please consult specialist."
-                
-            else:
-                penalty = 0.0
-                duration_warning = None
-            
-            # Apply penalty
-            adjusted_confidence = max(0.0, original_confidence - penalty)
-            
-            disease["confidence_score"] = adjusted_confidence
-            disease["duration_validation"] = {
-                "symptom_days": symptom_days,
-                "typical_duration_min": min_duration,
-                "typical_duration_max": max_duration,
-                "is_chronic": is_chronic,
-                "penalty_applied": round(penalty, 3),
-                "original_confidence": round(original_confidence, 3),
-                "adjusted_confidence": round(adjusted_confidence, 3),
-                "warning": duration_warning
-            }
+            disease["confidence_score"] = max(0.0, original_confidence - penalty)
+            disease["duration_validation"] = XAIFormatter.format_duration_validation(
+                durations[i].get("name"), symptom_days, duration_min[i], duration_max[i], is_chronic[i],
+                original_confidence, penalty
+            )
         
         return possible_diseases
     
@@ -291,12 +333,18 @@ class XAIFormatter:
         """
         Generate feature importance from diagnosis breakdown
         
+        Uses the Shapley attributions attached by MedicalXAIModel.attribute_symptoms
+        when present; otherwise importance is split evenly across matched symptoms.
+        
         Args:
             diagnosis: Disease diagnosis dict
             
         Returns:
             List of important features (symptoms) with importance scores
         """
+        if "symptom_attributions" in diagnosis:
+            return XAIFormatter._format_shapley_importance(diagnosis)
+        
         matched_symptoms = diagnosis.get("matched_symptoms", [])
         sb = diagnosis.get("scoring_breakdown", {})
         
@@ -330,6 +378,49 @@ class XAIFormatter:
         features.sort(key=lambda x: x["importance"], reverse=True)
         return features
     
+    @staticmethod
+    def _format_shapley_importance(diagnosis: Dict) -> List[Dict]:
+        """
+        Feature importance from Shapley values of the input fragments
+        
+        importance is each fragment's share of the attributed score above the
+        baseline (shares sum to 1; a fragment that lowers the score has a
+        negative share).
+        """
+        attributions = diagnosis["symptom_attributions"]
+        attributed_score = attributions.get("attributed_score", 0) - attributions.get("baseline_score", 0)
+        disease_name = diagnosis.get("disease_name", "this diagnosis")
+        
+        features = []
+        for entry in attributions.get("values", []):
+            value = entry["shapley_value"]
+            share = value / attributed_score if attributed_score > 0 else 0.0
+            
+            if share >= 0.4:
+                contribution = "High"
+            elif share >= 0.15:
+                contribution = "Medium"
+            else:
+                contribution = "Low"
+            
+            if value > 0:
+                explanation = f"Raises the {disease_name} score by {value * 100:.1f} points on average across symptom combinations"
+            elif value < 0:
+                explanation = f"Lowers the {disease_name} score by {-value * 100:.1f} points on average across symptom combinations"
+            else:
+                explanation = f"Does not change the {disease_name} score"
+            
+            features.append({
+                "symptom": entry["symptom"],
+                "importance": round(share, 4),
+                "shapley_value": round(value, 4),
+                "contribution": contribution,
+                "explanation": explanation
+            })
+        
+        features.sort(key=lambda x: x["shapley_value"], reverse=True)
+        return features
+    
     @staticmethod
     def format_complete_diagnosis(diagnosis: Dict) -> Dict:
         """
@@ -363,13 +454,59 @@ class XAIFormatter:
         }
     
     @staticmethod
-    def format_counterfactual_analysis(top_diseases: List[Dict]) -> Dict:
+    def format_xai_sections(diagnosis: Dict, sections: Iterable[str]) -> Dict:
+        """
+        Build only the requested XAI sections for one diagnosed disease
+        
+        Args:
+            diagnosis: Raw diagnosis from model (after duration validation, if any)
+            sections: Names from XAI_SECTIONS
+            
+        Returns:
+            Dict of section name -> payload, in XAI_SECTIONS order
+        """
+        sections = set(sections)
+        xai = {}
+        
+        if "scoring_breakdown" in sections:
+            xai["scoring_breakdown"] = diagnosis.get("scoring_breakdown", {})
+        
+        if "explanation" in sections:
+            xai["explanation"] = XAIFormatter.format_scoring_explanation(diagnosis)
+        
+        if "symptom_analysis" in sections:
+            xai["symptom_analysis"] = XAIFormatter.format_symptom_analysis(
+                diagnosis.get("matched_symptoms", []),
+                diagnosis.get("scoring_breakdown", {}).get("tfidf_details", {}).get("unmatched_disease_symptoms", []),
+                diagnosis.get("disease_symptoms", [])
+            )
+        
+        if "feature_importance" in sections:
+            xai["feature_importance"] = XAIFormatter.format_feature_importance(diagnosis)
+        
+        if "duration_impact" in sections and "duration_validation" in diagnosis:
+            duration_val = diagnosis["duration_validation"]
+            xai["duration_impact"] = {
+                "symptom_days": duration_val.get("symptom_days"),
+                "typical_duration_max": duration_val.get("typical_duration_max"),
+                "penalty_applied": duration_val.get("penalty_applied")
+            }
+        
+        return xai
+    
+    @staticmethod
+    def format_counterfactual_analysis(top_diseases: List[Dict],
+                                       differential_table: Optional[DifferentialTable] = None,
+                                       what_if: Optional[Dict] = None) -> Dict:
         """
         Generate counterfactual analysis comparing top 2 diagnoses.
         Explains exactly which missing symptoms kept the #2 result lower.
         
         Args:
             top_diseases: List of top disease predictions (at least 2)
+            differential_table: Precomputed pairwise symptom table of the knowledge base
+            what_if: Rescored symptom edits from MedicalXAIModel.what_if(); without
+                them the impact of a missing symptom is only estimated
             
         Returns:
             Counterfactual analysis explaining symptom gaps
@@ -392,25 +529,42 @@ class XAIFormatter:
         # Get symptoms
         top_1_matched = set(top_1.get("matched_symptoms", []))
         top_2_matched = set(top_2.get("matched_symptoms", []))
-        top_2_disease_symptoms = set(top_2.get("disease_symptoms", []))
-        
-        # Find missing symptoms - symptoms that disease #2 expects but weren't in user input
-        # AND that are in disease #1's profile
-        top_2_unmatched = top_2_disease_symptoms - top_2_matched
-        top_1_disease_symptoms = set(top_1.get("disease_symptoms", []))
+        entry = XAIFormatter._lookup_differential(top_1, top_2, differential_table)
+        shared_with_top_1 = set(entry.shared)
         
         # Symptoms that would boost #2 scores (present in #2 disease but not reported by user)
-        critical_missing = list(top_2_unmatched)[:5]
+        critical_missing = [
+            s for s in dict.fromkeys(top_2.get("disease_symptoms", [])) if s not in top_2_matched
+        ][:5]
         
         # Calculate how much each missing symptom would help
         symptom_impact = []
-        if critical_missing:
+        if what_if is not None:
+            # True change in #2's confidence when the symptom is added, strongest first
+            top_2_id = top_2.get("disease_id")
+            missing_set = set(dict.fromkeys(top_2.get("disease_symptoms", []))) - top_2_matched
+            additions = sorted(
+                (edit for edit in what_if["edits"] if edit["action"] == "add" and edit["symptom"] in missing_set),
+                key=lambda edit: edit["deltas"].get(top_2_id, 0),
+                reverse=True
+            )
+            critical_missing = [edit["symptom"] for edit in additions][:5]
+            for edit in additions[:5]:
+                symptom_impact.append({
+                    "symptom": edit["symptom"],
+                    "estimated_impact": round(edit["deltas"].get(top_2_id, 0) * 100, 1),
+                    "also_in_top_choice": edit["symptom"] in shared_with_top_1,
+                    "explanation": (
+                        f"If you had reported {edit['symptom']}, it would strengthen the case for {top_2_name}"
+                    )
+                })
+        elif critical_missing:
             # Estimate impact - each missing symptom typically adds 10-15% to score
             impact_per_symptom = min(confidence_gap / len(critical_missing) if critical_missing else 0, 0.15)
             
             for symptom in critical_missing:
                 # Add more weight to symptoms that are also in top_1
-                is_in_top_1 = symptom in top_1_disease_symptoms
+                is_in_top_1 = symptom in shared_with_top_1
                 
                 symptom_impact.append({
                     "symptom": symptom,
@@ -443,10 +597,10 @@ class XAIFormatter:
                 f"These symptoms are hallmark indicators of {top_2_name}, and their absence lowered its ranking."
             )
         
-        # Additional context about differential diagnosis
-        symptom_overlap = top_1_matched & top_2_matched
-        unique_to_top_1 = top_1_matched - top_2_matched
-        unique_to_top_2 = top_2_matched - top_1_matched
+        # Additional context about differential diagnosis: the table entry masked by the reported symptoms
+        symptom_overlap = [s for s in entry.shared if s in top_1_matched]
+        unique_to_top_1 = [s for s in entry.unique_a if s in top_1_matched]
+        unique_to_top_2 = [s for s in entry.unique_b if s in top_2_matched]
         
         analysis = {
             "available": True,
@@ -463,14 +617,14 @@ class XAIFormatter:
             "critical_missing_symptoms": [
                 {
                     "symptom": s["symptom"],
-                    "impact_if_present": f"+{s['estimated_impact']}% confidence"
+                    "impact_if_present": f"{s['estimated_impact']:+}% confidence"
                 }
                 for s in symptom_impact[:3]
             ],
             "symptom_comparison": {
-                "shared_with_top_choice": sorted(list(symptom_overlap)),
-                "unique_to_top_choice": sorted(list(unique_to_top_1)),
-                "unique_to_alternative": sorted(list(unique_to_top_2)),
+                "shared_with_top_choice": sorted(symptom_overlap),
+                "unique_to_top_choice": sorted(unique_to_top_1),
+                "unique_to_alternative": sorted(unique_to_top_2),
                 "symptom_overlap_percentage": round(
                     (len(symptom_overlap) / max(len(top_1_matched | top_2_matched), 1)) * 100, 1
                 )
@@ -482,8 +636,59 @@ class XAIFormatter:
             )
         }
         
+        if what_if is not None:
+            analysis["what_if"] = XAIFormatter._format_what_if(top_1, top_2, what_if)
+        
         return analysis
     
+    @staticmethod
+    def _format_what_if(top_1: Dict, top_2: Dict, what_if: Dict) -> Dict:
+        """Rescored removals of reported symptoms and the smallest edit swapping the top 2"""
+        top_1_id = top_1.get("disease_id")
+        top_2_id = top_2.get("disease_id")
+        
+        removals = [
+            {
+                "symptom": edit["symptom"],
+                "impact_on_top_choice": round(edit["deltas"].get(top_1_id, 0) * 100, 1),
+                "impact_on_alternative": round(edit["deltas"].get(top_2_id, 0) * 100, 1),
+                "new_top_choice": edit["new_top"]
+            }
+            for edit in what_if["edits"] if edit["action"] == "remove"
+        ]
+        
+        rank_flip = what_if.get("rank_flip")
+        if rank_flip is None:
+            flip = {
+                "possible": False,
+                "explanation": (
+                    f"No single or paired symptom change would rank {top_2.get('disease_name')} "
+                    f"above {top_1.get('disease_name')}"
+                )
+            }
+        else:
+            changes = " and ".join(
+                f"{'adding' if edit['action'] == 'add' else 'removing'} {edit['symptom']}"
+                for edit in rank_flip["edits"]
+            )
+            flip = {
+                "possible": True,
+                "edits": rank_flip["edits"],
+                "top_choice_confidence": round(rank_flip["scores"][top_1_id] * 100, 1),
+                "alternative_confidence": round(rank_flip["scores"][top_2_id] * 100, 1),
+                "explanation": (
+                    f"{changes[0].upper()}{changes[1:]} would rank {top_2.get('disease_name')} "
+                    f"({rank_flip['scores'][top_2_id] * 100:.1f}%) above {top_1.get('disease_name')} "
+                    f"({rank_flip['scores'][top_1_id] * 100:.1f}%)"
+                )
+            }
+        
+        return {
+            "variants_scored": what_if["variants_scored"],
+            "removals": removals,
+            "rank_flip": flip
+        }
+    
     @staticmethod
     def get_specialist_recommendation(disease_key: str) -> tuple:
         """
@@ -518,94 +723,130 @@ class XAIFormatter:
         }
     
     @staticmethod
-    def check_differential_diagnosis(top_diseases: List[Dict], threshold: float = 0.05) -> Dict:
+    def _lookup_differential(disease_a: Dict, disease_b: Dict,
+                             differential_table: Optional[DifferentialTable] = None) -> DifferentialEntry:
+        """Shared and unique symptoms of two diagnosed diseases, from the precomputed table when given"""
+        if differential_table is not None:
+            try:
+                return differential_table.compare(disease_a.get("disease_id"), disease_b.get("disease_id"))
+            except KeyError:
+                pass
+        return DifferentialTable.compare_profiles(
+            disease_a.get("disease_symptoms", []),
+            disease_b.get("disease_symptoms", [])
+        )
+    
+    @staticmethod
+    def _format_differential_pair(top_1: Dict, top_2: Dict, entry: DifferentialEntry,
+                                  symptom_gains: Optional[Dict[str, float]] = None) -> Dict:
+        """
+        Explain what separates two closely scored diseases, masking the table entry with the matched symptoms
+        
+        Distinguishing symptoms are ranked by symptom_gains (information gain over
+        the ranked diseases, from question_selector) when given.
+        """
+        name_1 = top_1.get("disease_name", "Disease 1")
+        name_2 = top_2.get("disease_name", "Disease 2")
+        score_1 = top_1.get("confidence_score", 0)
+        score_2 = top_2.get("confidence_score", 0)
+        
+        matched_1 = set(top_1.get("matched_symptoms", []))
+        matched_2 = set(top_2.get("matched_symptoms", []))
+        
+        # Reported symptoms both diseases explain
+        shared_symptoms = sorted(s for s in entry.shared if s in matched_1)
+        
+        # Unreported symptoms unique to each side would best tell them apart
+        distinguishing_1 = [s for s in entry.unique_a if s not in matched_1] or list(entry.unique_a)
+        distinguishing_2 = [s for s in entry.unique_b if s not in matched_2] or list(entry.unique_b)
+        if symptom_gains:
+            distinguishing_1.sort(key=lambda s: symptom_gains.get(s, 0.0), reverse=True)
+            distinguishing_2.sort(key=lambda s: symptom_gains.get(s, 0.0), reverse=True)
+        distinguishing_1 = distinguishing_1[:2]
+        distinguishing_2 = distinguishing_2[:2]
+        
+        explanation = (
+            f"While {name_1} is listed first ({score_1*100:.1f}%), {name_2} has an equal or very similar score "
+            f"({score_2*100:.1f}%) because of shared symptoms: {', '.join(shared_symptoms[:3]) if shared_symptoms else 'similar presentation'}. "
+        )
+        
+        if distinguishing_1:
+            explanation += (
+                f"The presence of {', '.join(distinguishing_1)} would clearly point to {name_1}. "
+            )
+        
+        if distinguishing_2:
+            explanation += (
+                f"Conversely, {', '.join(distinguishing_2)} would indicate {name_2}."
+            )
+        
+        return {
+            "diseases_compared": [name_1, name_2],
+            "score_1": round(score_1 * 100, 1),
+            "score_2": round(score_2 * 100, 1),
+            "score_difference": round((score_1 - score_2) * 100, 1),
+            "shared_symptoms": shared_symptoms,
+            "distinguishing_for_top": distinguishing_1,
+            "distinguishing_for_alternative": distinguishing_2,
+            "clarification_explanation": explanation,
+            "clarification_symptoms": sorted(
+                dict.fromkeys(distinguishing_1 + distinguishing_2),
+                key=lambda s: (symptom_gains or {}).get(s, 0.0),
+                reverse=True
+            )[:4]
+        }
+    
+    @staticmethod
+    def check_differential_diagnosis(top_diseases: List[Dict], threshold: float = 0.05,
+                                     differential_table: Optional[DifferentialTable] = None) -> Dict:
         """
         Check if top diseases have similar scores within threshold (5% by default).
         Returns differential diagnosis information explaining what distinguishes them.
         
+        The top-level fields compare ranks 1 and 2; "close_pairs" lists every pair
+        in top_diseases whose scores are within threshold, in rank order.
+        
         Args:
             top_diseases: List of top disease predictions
             threshold: Score difference threshold (0.05 = 5%)
+            differential_table: Precomputed pairwise symptom table of the knowledge base
+                (sets are derived from the diagnoses when omitted)
             
         Returns:
             Dict with differential diagnosis analysis or empty if clear winner
         """
         if len(top_diseases) < 2:
-            return {"is_differential": False}
-        
-        top_1 = top_diseases[0]
-        top_2 = top_diseases[1]
-        
-        score_1 = top_1.get("confidence_score", 0)
-        score_2 = top_2.get("confidence_score", 0)
-        score_diff = score_1 - score_2
+            return {"is_differential": False, "close_pairs": []}
+        
+        scores = [disease.get("confidence_score", 0) for disease in top_diseases]
+        symptom_gains = symptom_information_gains(top_diseases)
+        
+        close_pairs = []
+        for i, j in combinations(range(len(top_diseases)), 2):
+            if scores[i] - scores[j] <= threshold:
+                entry = XAIFormatter._lookup_differential(top_diseases[i], top_diseases[j], differential_table)
+                close_pairs.append({
+                    "ranks": [i + 1, j + 1],
+                    **XAIFormatter._format_differential_pair(
+                        top_diseases[i], top_diseases[j], entry, symptom_gains
+                    )
+                })
         
         # Check if scores are too close (differential diagnosis territory)
-        if score_diff <= threshold:
-            name_1 = top_1.get("disease_name", "Disease 1")
-            name_2 = top_2.get("disease_name", "Disease 2")
-            
-            matched_1 = set(top_1.get("matched_symptoms", []))
-            matched_2 = set(top_2.get("matched_symptoms", []))
-            
-            disease_symptoms_1 = set(top_1.get("disease_symptoms", []))
-            disease_symptoms_2 = set(top_2.get("disease_symptoms", []))
-            
-            # Find distinguishing symptoms
-            unique_to_1 = disease_symptoms_1 - disease_symptoms_2
-            unique_to_2 = disease_symptoms_2 - disease_symptoms_1
-            
-            # Find unmatched symptoms that would help distinguish
-            unmatched_1 = disease_symptoms_1 - matched_1
-            unmatched_2 = disease_symptoms_2 - matched_2
-            
-            distinguishing_symptoms_1 = (unique_to_1 & unmatched_1) or (unique_to_1)
-            distinguishing_symptoms_2 = (unique_to_2 & unmatched_2) or (unique_to_2)
-            
-            distinguishing_1 = list(distinguishing_symptoms_1)[:2]
-            distinguishing_2 = list(distinguishing_symptoms_2)[:2]
-            
-            shared_symptoms = sorted(list(matched_1 & matched_2))
-            
-            explanation = (
-                f"While {name_1} is listed first ({score_1*100:.1f}%), {name_2} has an equal or very similar score "
-                f"({score_2*100:.1f}%) because of shared symptoms: {', '.join(shared_symptoms[:3]) if shared_symptoms else 'similar presentation'}. "
-            )
-            
-            clarification_needed = []
-            if distinguishing_1:
-                explanation += (
-                    f"The presence of {', '.join(distinguishing_1)} would clearly point to {name_1}. "
-                )
-                clarification_needed.extend(distinguishing_1)
-            
-            if distinguishing_2:
-                explanation += (
-                    f"Conversely, {', '.join(distinguishing_2)} would indicate {name_2}."
-                )
-                clarification_needed.extend(distinguishing_2)
-            
-            return {
-                "is_differential": True,
-                "diseases_compared": [name_1, name_2],
-                "score_1": round(score_1 * 100, 1),
-                "score_2": round(score_2 * 100, 1),
-                "score_difference": round(score_diff * 100, 1),
-                "shared_symptoms": shared_symptoms,
-                "distinguishing_for_top": distinguishing_1,
-                "distinguishing_for_alternative": distinguishing_2,
-                "clarification_explanation": explanation,
-                "clarification_symptoms": list(set(clarification_needed))[:4]
-            }
+        if close_pairs and close_pairs[0]["ranks"] == [1, 2]:
+            top_pair = {key: value for key, value in close_pairs[0].items() if key != "ranks"}
+            return {"is_differential": True, **top_pair, "close_pairs": close_pairs}
         
-        return {"is_differential": False}
+        return {"is_differential": False, "close_pairs": close_pairs}
     
     @staticmethod
     def generate_confidence_questions(top_diseases: List[Dict], 
                                      confidence_threshold: float = 0.50) -> Dict:
         """
         Generate generic patient information form for all diagnoses.
-        Collects lifestyle and medical history data regardless of confidence level.
+        Collects lifestyle and medical history data regardless of confidence level,
+        preceded by the few symptom questions that best separate the ranked
+        diseases (largest expected information gain, see question_selector).
         
         Args:
             top_diseases: List of disease predictions
@@ -679,6 +920,21 @@ class XAIFormatter:
             }
         ]
         
+        # Yes/no symptom questions whose answers are expected to separate the candidates most
+        symptom_questions = [
+            {
+                "type": "symptom_confirmation",
+                "question": f"Do you also have {selected['symptom']}?",
+                "symptoms": [selected["symptom"]],
+                "explanation": (
+                    f"Typical of {', '.join(selected['suggests'])}"
+                    + (f" but not of {', '.join(selected['argues_against'])}" if selected["argues_against"] else "")
+                ),
+                "information_gain": round(selected["information_gain"], 3)
+            }
+            for selected in select_clarifying_symptoms(top_diseases)
+        ]
+        
         # ALWAYS return needs_clarification=True to collect patient information
         analysis = {
             "needs_clarification": True,
@@ -691,7 +947,7 @@ class XAIFormatter:
                 "confidence": round(top_confidence * 100, 1)
             },
             "alternatives": alternatives,
-            "clarifying_questions": patient_info_fields,  # Now contains patient info fields
+            "clarifying_questions": symptom_questions + patient_info_fields,
             "next_step": "Please provide the following information for your health report"
         }
         
@@ -700,7 +956,8 @@ class XAIFormatter:
     @staticmethod
     def format_diagnosis_with_confidence_check(top_diseases: List[Dict],
                                               differential_threshold: float = 0.05,
-                                              confidence_threshold: float = 0.50) -> Dict:
+                                              confidence_threshold: float = 0.50,
+                                              differential_table: Optional[DifferentialTable] = None) -> Dict:
         """
         Format diagnosis with both differential diagnosis and confidence checks.
         
@@ -708,6 +965,7 @@ class XAIFormatter:
             top_diseases: List of disease predictions
             differential_threshold: Score difference for differential diagnosis
             confidence_threshold: Minimum confidence level
+            differential_table: Precomputed pairwise symptom table of the knowledge base
             
         Returns:
             Comprehensive diagnosis with all checks
@@ -721,7 +979,9 @@ class XAIFormatter:
         }
         
         # Check differential diagnosis
-        differential = XAIFormatter.check_differential_diagnosis(top_diseases, differential_threshold)
+        differential = XAIFormatter.check_differential_diagnosis(
+            top_diseases, differential_threshold, differential_table
+        )
         if differential.get("is_differential"):
             result["differential_diagnosis"] = differential
         
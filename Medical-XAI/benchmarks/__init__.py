@@ -0,0 +1,9 @@
+"""
+Benchmarks - Reproducible latency benchmarks, synthetic test data, offline evaluation and scoring tuning for the diagnosis pipeline
+
+Usage (from the Medical-XAI directory):
+    python -m benchmarks [--sizes bundled,1000,10000,100000] [-o results.json] [--baseline benchmarks/baseline.json]
+    python -m benchmarks.synthetic --diseases 10000 --cases 100000 --kb-output kb.json --cases-output cases.jsonl
+    python -m benchmarks.evaluate [--kb kb.json] [--cases cases.jsonl] [--min-top1 0.85] [-o report.json]
+    python -m benchmarks.tune [--kb kb.json] [--cases cases.jsonl] [--max-p95-ms 20] [--write]
+"""
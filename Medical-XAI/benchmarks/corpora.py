@@ -0,0 +1,74 @@
+"""
+Query Corpora - Fixed benchmark inputs for a knowledge base
+Each corpus is drawn with a fixed seed from the knowledge base's own symptoms and
+keywords, so runs against the same knowledge base always see the same queries
+"""
+
+from typing import Dict, List
+
+import numpy as np
+
+CORPORA = ("short", "long_free_text", "unknown_heavy")
+
+_FILLERS = [
+    "for the last few days I have had", "it started with", "and now there is also",
+    "my doctor mentioned", "at night it gets worse with", "along with some",
+    "I also noticed", "which comes and goes with",
+]
+
+# Words no knowledge base term matches, so they exercise the unknown-symptom path
+_UNKNOWN_WORDS = [
+    "zorvex", "plinth", "quarble", "mendrix", "sollow", "vantic", "brelm", "oskary",
+    "tressim", "ulvane", "grophet", "kindle", "wexlor", "yarrow", "flimmer", "drosk",
+]
+
+
+def build_corpora(knowledge_base: Dict, n_queries: int = 100, seed: int = 0) -> Dict[str, List[str]]:
+    """
+    Build the benchmark corpora for a knowledge base
+
+    Args:
+        knowledge_base: Knowledge base dict ("diseases", "symptom_keywords")
+        n_queries: Queries per corpus
+        seed: Random seed
+
+    Returns:
+        Dict of corpus name -> queries:
+            short: two or three symptoms of one disease, comma-separated
+            long_free_text: six to ten symptoms or keyword synonyms embedded in prose
+            unknown_heavy: one known symptom among four to six unknown terms
+    """
+    rng = np.random.default_rng(seed)
+    profiles = [info.get("symptoms", []) for info in knowledge_base.get("diseases", {}).values()]
+    profiles = [profile for profile in profiles if profile]
+    keywords = knowledge_base.get("symptom_keywords", {})
+
+    def pick(items: List[str], k: int) -> List[str]:
+        k = min(k, len(items))
+        return [items[i] for i in rng.choice(len(items), size=k, replace=False)]
+
+    def phrase(symptom: str) -> str:
+        # Free text names a symptom by any of its keywords
+        synonyms = keywords.get(symptom) or [symptom]
+        return synonyms[int(rng.integers(len(synonyms)))]
+
+    short, long_free_text, unknown_heavy = [], [], []
+    for _ in range(n_queries):
+        profile = profiles[int(rng.integers(len(profiles)))]
+        short.append(", ".join(pick(profile, int(rng.integers(2, 4)))))
+
+        # Mostly one disease's profile, padded from a second one
+        mixed = list(dict.fromkeys(profile + profiles[int(rng.integers(len(profiles)))]))
+        parts = []
+        for symptom in pick(mixed, int(rng.integers(6, 11))):
+            parts.append(f"{_FILLERS[int(rng.integers(len(_FILLERS)))]} {phrase(symptom)}")
+        long_free_text.append(" ".join(parts))
+
+        unknown = [
+            " ".join(pick(_UNKNOWN_WORDS, int(rng.integers(1, 3))))
+            for _ in range(int(rng.integers(4, 7)))
+        ]
+        unknown.insert(int(rng.integers(len(unknown) + 1)), pick(profile, 1)[0])
+        unknown_heavy.append(", ".join(unknown))
+
+    return {"short": short, "long_free_text": long_free_text, "unknown_heavy": unknown_heavy}
@@ -0,0 +1,356 @@
+"""
+Offline Evaluation - Accuracy, calibration, confusion and latency on labelled patient cases
+Cases are scored in chunks with MedicalXAIModel.rank_batch (one sparse matrix product and
+one row-wise top-k per chunk, no diagnosis dicts), so 100k cases take seconds on the
+bundled knowledge base and every metric is computed with array operations
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from benchmarks.runner import BUNDLED_KB_PATH, environment, summarize
+from benchmarks.synthetic import generate_patient_cases, load_patient_cases
+
+# Top-k accuracies reported; the largest k is also how many diseases are ranked per case
+ACCURACY_KS = (1, 3, 5)
+
+# Equal-width confidence bins of the reliability table
+CALIBRATION_BINS = 10
+
+# Approximate memory for one chunk's dense (cases x candidate diseases) score arrays
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+# Dense score arrays _score_batch keeps alive per chunk, for sizing chunks
+_ARRAYS_PER_CHUNK = 16
+
+# Cases timed one at a time through MedicalXAIModel.diagnose for the single-call latency
+DEFAULT_LATENCY_SAMPLE = 1000
+
+
+def chunk_size_for(n_diseases: int, memory_budget: int = DEFAULT_MEMORY_BUDGET) -> int:
+    """Cases per rank_batch call that keep the dense score arrays within memory_budget"""
+    return int(np.clip(memory_budget // max(1, n_diseases * 8 * _ARRAYS_PER_CHUNK), 32, 4096))
+
+
+def score_cases(model, cases: List[Dict], top_k: int, chunk_size: int, use_days: bool = True) -> Dict:
+    """
+    Rank every case in chunks
+
+    Returns:
+        Dict of "disease_indices" and "confidence_scores" (n_cases, top_k) arrays as
+        returned by rank_batch, plus the wall time ("chunk_seconds") and size
+        ("chunk_sizes") of each chunk
+    """
+    disease_indices, confidence_scores, chunk_seconds, chunk_sizes = [], [], [], []
+    for start in range(0, len(cases), chunk_size):
+        chunk = cases[start:start + chunk_size]
+        texts = [case["symptoms"] for case in chunk]
+        days = [case.get("days") for case in chunk] if use_days else None
+
+        started = time.perf_counter()
+        ranked = model.rank_batch(texts, top_k=top_k, days=days)
+        chunk_seconds.append(time.perf_counter() - started)
+        chunk_sizes.append(len(chunk))
+
+        disease_indices.append(ranked["disease_indices"])
+        confidence_scores.append(ranked["confidence_scores"])
+
+    return {
+        "disease_indices": np.vstack(disease_indices) if cases else np.empty((0, top_k), dtype=np.int64),
+        "confidence_scores": np.vstack(confidence_scores) if cases else np.empty((0, top_k)),
+        "chunk_seconds": np.array(chunk_seconds),
+        "chunk_sizes": np.array(chunk_sizes)
+    }
+
+
+def label_ranks(disease_indices: np.ndarray, labels: np.ndarray) -> np.ndarray:
+    """0-based rank of each case's true disease among its ranked diseases (-1 if not ranked)"""
+    hits = disease_indices == labels[:, None]
+    return np.where(hits.any(axis=1), hits.argmax(axis=1), -1)
+
+
+def accuracy_metrics(ranks: np.ndarray, predicted: np.ndarray, ks: Sequence[int] = ACCURACY_KS) -> Dict:
+    """Top-k accuracy, mean reciprocal rank and the share of cases with no disease ranked at all"""
+    if not len(ranks):
+        return {}
+    found = ranks >= 0
+    metrics = {f"top{k}": float(np.mean(found & (ranks < k))) for k in ks}
+    metrics["mrr"] = float(np.mean(np.where(found, 1.0 / (np.maximum(ranks, 0) + 1), 0.0)))
+    metrics["no_prediction"] = float(np.mean(predicted < 0))
+    return metrics
+
+
+def calibration(top_confidence: np.ndarray, correct: np.ndarray, n_bins: int = CALIBRATION_BINS) -> Dict:
+    """
+    Reliability of the top-ranked confidence score as a probability of being correct
+
+    Cases with nothing ranked count as confidence 0.
+
+    Returns:
+        Dict with the expected calibration error ("ece"), Brier score ("brier") and
+        "bins": one {"lower", "upper", "count", "mean_confidence", "accuracy"} per
+        non-empty bin
+    """
+    if not len(top_confidence):
+        return {"ece": None, "brier": None, "bins": []}
+    confidence = np.clip(np.nan_to_num(top_confidence, nan=0.0), 0.0, 1.0)
+    outcome = correct.astype(np.float64)
+
+    bins = np.minimum((confidence * n_bins).astype(np.int64), n_bins - 1)
+    counts = np.bincount(bins, minlength=n_bins)
+    safe_counts = np.maximum(counts, 1)
+    mean_confidence = np.bincount(bins, weights=confidence, minlength=n_bins) / safe_counts
+    accuracy = np.bincount(bins, weights=outcome, minlength=n_bins) / safe_counts
+
+    return {
+        "ece": float(np.sum(counts * np.abs(accuracy - mean_confidence)) / len(confidence)),
+        "brier": float(np.mean((confidence - outcome) ** 2)),
+        "bins": [
+            {"lower": b / n_bins, "upper": (b + 1) / n_bins, "count": int(counts[b]),
+             "mean_confidence": float(mean_confidence[b]), "accuracy": float(accuracy[b])}
+            for b in np.flatnonzero(counts)
+        ]
+    }
+
+
+def confusion(labels: np.ndarray, predicted: np.ndarray, disease_ids: Sequence[str],
+              top_pairs: int = 20) -> Dict:
+    """
+    Per-disease precision and recall of the top-ranked disease, and the most frequent confusions
+
+    The confusion matrix is kept sparse (only observed true/predicted pairs), so it
+    scales to knowledge bases of any size.
+
+    Returns:
+        Dict with "per_disease" ({disease_id: {"support", "predicted", "correct",
+        "precision", "recall", "f1", "most_confused_with"}} for every labelled or
+        predicted disease) and "most_confused" (the top_pairs most frequent
+        {"true", "predicted", "count"} errors; predicted None means nothing was ranked)
+    """
+    n_diseases = len(disease_ids)
+    predicted_any = predicted >= 0
+    correct = labels == predicted
+
+    support = np.bincount(labels, minlength=n_diseases)
+    predicted_counts = np.bincount(predicted[predicted_any], minlength=n_diseases)
+    correct_counts = np.bincount(labels[correct], minlength=n_diseases)
+
+    # Errors as (true, predicted) pair codes; "nothing ranked" is predicted column n_diseases
+    errors = ~correct
+    pair_codes = labels[errors] * (n_diseases + 1) + np.where(predicted_any, predicted, n_diseases)[errors]
+    pairs, pair_counts = np.unique(pair_codes, return_counts=True)
+    pair_true, pair_predicted = np.divmod(pairs, n_diseases + 1)
+
+    def disease_id(index: int) -> Optional[str]:
+        return disease_ids[index] if index < n_diseases else None
+
+    # Most frequent wrong prediction per true disease: pairs sorted by count, first per disease wins
+    order = np.lexsort((-pair_counts, pair_true))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = pair_true[order][1:] != pair_true[order][:-1]
+    most_confused_with = {
+        int(pair_true[i]): (disease_id(int(pair_predicted[i])), int(pair_counts[i])) for i in order[first]
+    }
+
+    per_disease = {}
+    for index in np.flatnonzero((support > 0) | (predicted_counts > 0)):
+        precision = correct_counts[index] / predicted_counts[index] if predicted_counts[index] else 0.0
+        recall = correct_counts[index] / support[index] if support[index] else 0.0
+        confused = most_confused_with.get(int(index))
+        per_disease[disease_ids[index]] = {
+            "support": int(support[index]),
+            "predicted": int(predicted_counts[index]),
+            "correct": int(correct_counts[index]),
+            "precision": float(precision),
+            "recall": float(recall),
+            "f1": float(2 * precision * recall / (precision + recall)) if precision + recall else 0.0,
+            "most_confused_with": {"disease_id": confused[0], "count": confused[1]} if confused else None
+        }
+
+    top = np.argsort(-pair_counts, kind="stable")[:top_pairs]
+    return {
+        "per_disease": per_disease,
+        "most_confused": [
+            {"true": disease_id(int(pair_true[i])), "predicted": disease_id(int(pair_predicted[i])),
+             "count": int(pair_counts[i])}
+            for i in top
+        ]
+    }
+
+
+def single_call_latency(model, cases: List[Dict], n_samples: int, seed: int = 0, use_days: bool = True) -> Optional[Dict]:
+    """Latency of MedicalXAIModel.diagnose on a random sample of cases, one call per case"""
+    if n_samples <= 0 or not cases:
+        return None
+    rng = np.random.default_rng(seed)
+    sample = [cases[i] for i in rng.choice(len(cases), size=min(n_samples, len(cases)), replace=False)]
+
+    samples_ns = []
+    for case in sample:
+        days = case.get("days") if use_days else None
+        started = time.perf_counter_ns()
+        model.diagnose(case["symptoms"], days=days)
+        samples_ns.append(time.perf_counter_ns() - started)
+    return summarize(samples_ns)
+
+
+def evaluate(model, cases: List[Dict], top_k: int = max(ACCURACY_KS), chunk_size: Optional[int] = None,
+             latency_sample: int = DEFAULT_LATENCY_SAMPLE, seed: int = 0, use_days: bool = True) -> Dict:
+    """
+    Evaluate a model on labelled cases
+
+    Args:
+        model: MedicalXAIModel (its result cache should be disabled for the latency sample)
+        cases: Labelled cases ({"disease_id", "symptoms", "days"}, as written by benchmarks.synthetic)
+        top_k: Diseases ranked per case
+        chunk_size: Cases per rank_batch call (default: sized from the knowledge base)
+        latency_sample: Cases timed one at a time through diagnose (0 to skip)
+        seed: Seed for the latency sample
+        use_days: Apply each case's symptom duration
+
+    Returns:
+        Report dict: "cases", "accuracy", "calibration", "confusion" and "latency"
+    """
+    snapshot = model.snapshot
+    disease_ids = snapshot.disease_ids
+    positions = {disease_id: i for i, disease_id in enumerate(disease_ids)}
+
+    # Cases labelled with a disease outside the knowledge base cannot be scored
+    known = [case for case in cases if case.get("disease_id") in positions]
+    labels = np.array([positions[case["disease_id"]] for case in known], dtype=np.int64)
+    chunk_size = chunk_size or chunk_size_for(len(disease_ids))
+
+    started = time.perf_counter()
+    scored = score_cases(model, known, top_k, chunk_size, use_days)
+    total_seconds = time.perf_counter() - started
+
+    predicted = scored["disease_indices"][:, 0] if top_k else np.full(len(known), -1)
+    ranks = label_ranks(scored["disease_indices"], labels)
+
+    # Amortized per-case latency of each chunk, weighted by the cases it scored
+    per_case_ms = np.repeat(scored["chunk_seconds"] * 1000 / np.maximum(scored["chunk_sizes"], 1),
+                            scored["chunk_sizes"])
+    batch_latency = {
+        "total_seconds": round(total_seconds, 3),
+        "chunk_size": chunk_size,
+        "cases_per_s": round(len(known) / total_seconds, 1) if total_seconds else None,
+    }
+    if len(per_case_ms):
+        for percentile, value in zip((50, 95, 99), np.percentile(per_case_ms, (50, 95, 99))):
+            batch_latency[f"per_case_p{percentile}_ms"] = round(float(value), 4)
+
+    return {
+        "cases": {"total": len(cases), "evaluated": len(known), "unknown_label": len(cases) - len(known),
+                  "top_k": top_k, "use_days": use_days},
+        "accuracy": accuracy_metrics(ranks, predicted, [k for k in ACCURACY_KS if k <= top_k]),
+        "calibration": calibration(scored["confidence_scores"][:, 0] if top_k else np.zeros(len(known)),
+                                   ranks == 0),
+        "confusion": confusion(labels, predicted, disease_ids),
+        "latency": {
+            "batch": batch_latency,
+            "single_call": single_call_latency(model, known, latency_sample, seed, use_days)
+        }
+    }
+
+
+def print_report(report: Dict, worst: int = 10):
+    cases = report["cases"]
+    print(f"Cases: {cases['evaluated']} evaluated"
+          + (f", {cases['unknown_label']} skipped (label not in knowledge base)" if cases["unknown_label"] else ""))
+
+    accuracy = report["accuracy"]
+    print("Accuracy: " + "  ".join(f"{name} {value:.3f}" for name, value in accuracy.items()))
+
+    calibration_report = report["calibration"]
+    if calibration_report["bins"]:
+        print(f"\nCalibration: ECE {calibration_report['ece']:.3f}  Brier {calibration_report['brier']:.3f}")
+        print(f"{'confidence':<14}{'cases':>8}{'mean conf':>12}{'accuracy':>10}")
+        for b in calibration_report["bins"]:
+            print(f"{b['lower']:.1f} - {b['upper']:.1f}".ljust(14)
+                  + f"{b['count']:>8}{b['mean_confidence']:>12.3f}{b['accuracy']:>10.3f}")
+
+    per_disease = report["confusion"]["per_disease"]
+    lowest = sorted((item for item in per_disease.items() if item[1]["support"]),
+                    key=lambda item: (item[1]["recall"], -item[1]["support"]))[:worst]
+    if lowest:
+        print(f"\nLowest recall{'':<27}{'support':>8}{'recall':>8}{'precision':>11}  most confused with")
+        for disease_id, stats in lowest:
+            confused = stats["most_confused_with"]
+            confused_text = f"{confused['disease_id'] or '(nothing ranked)'} ({confused['count']})" if confused else "-"
+            print(f"{disease_id[:40]:<40}{stats['support']:>8}{stats['recall']:>8.3f}"
+                  f"{stats['precision']:>11.3f}  {confused_text}")
+
+    latency = report["latency"]
+    batch = latency["batch"]
+    print(f"\nBatch scoring: {batch['total_seconds']}s, {batch['cases_per_s']} cases/s "
+          f"(chunks of {batch['chunk_size']})"
+          + (f", per case p50 {batch['per_case_p50_ms']} ms p99 {batch['per_case_p99_ms']} ms"
+             if "per_case_p50_ms" in batch else ""))
+    single = latency["single_call"]
+    if single:
+        print(f"Single diagnose calls ({single['n']}): p50 {single['p50_ms']} ms  "
+              f"p95 {single['p95_ms']} ms  p99 {single['p99_ms']} ms")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Evaluate diagnosis accuracy and latency on labelled cases")
+    parser.add_argument("--kb", default=BUNDLED_KB_PATH, help="Knowledge base JSON (default: the bundled one)")
+    parser.add_argument("--cases", help="Labelled cases JSONL (default: generate --generate cases from --kb)")
+    parser.add_argument("--generate", type=int, default=100000, help="Synthetic cases to generate without --cases")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for generated cases and the latency sample")
+    parser.add_argument("--top-k", type=int, default=max(ACCURACY_KS), help="Diseases ranked per case")
+    parser.add_argument("--chunk-size", type=int, help="Cases per batch (default: sized from the knowledge base)")
+    parser.add_argument("--latency-sample", type=int, default=DEFAULT_LATENCY_SAMPLE,
+                        help="Cases timed one at a time through diagnose (0 to skip)")
+    parser.add_argument("--no-days", action="store_true", help="Ignore case durations (no duration penalties)")
+    parser.add_argument("--worst", type=int, default=10, help="Lowest-recall diseases to print")
+    parser.add_argument("--min-top1", type=float, help="Exit with status 1 if top-1 accuracy is below this")
+    parser.add_argument("--min-top3", type=float, help="Exit with status 1 if top-3 accuracy is below this")
+    parser.add_argument("--scoring-config", help="Scoring parameters JSON (default: data/scoring_config.json if present)")
+    parser.add_argument("-o", "--output", help="Write the full report JSON here")
+    args = parser.parse_args(argv)
+
+    from model import MedicalXAIModel
+
+    model = MedicalXAIModel(args.kb, use_artifact=False, cache_size=0, scoring_config_path=args.scoring_config)
+    if not model.initialization_complete:
+        print(f"Could not load knowledge base {args.kb}", file=sys.stderr)
+        return 2
+
+    if args.cases:
+        cases = load_patient_cases(args.cases)
+        source = os.path.abspath(args.cases)
+    else:
+        cases = generate_patient_cases(model.knowledge_base, args.generate, seed=args.seed)
+        source = f"synthetic (seed {args.seed})"
+
+    report = evaluate(model, cases, top_k=args.top_k, chunk_size=args.chunk_size,
+                      latency_sample=args.latency_sample, seed=args.seed, use_days=not args.no_days)
+    report["cases"]["source"] = source
+    report["knowledge_base"] = {"path": os.path.abspath(args.kb), "kb_hash": model.kb_hash,
+                                "diseases": len(model.snapshot.disease_ids)}
+    report["environment"] = environment()
+
+    print_report(report, args.worst)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failures = [
+        f"{name} {report['accuracy'].get(name, 0.0):.3f} < {minimum}"
+        for name, minimum in (("top1", args.min_top1), ("top3", args.min_top3))
+        if minimum is not None and report["accuracy"].get(name, 0.0) < minimum
+    ]
+    for failure in failures:
+        print(f"FAILED: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""
+Benchmark Runner - Latency percentiles and throughput of the diagnosis pipeline
+Times preprocess_symptoms, MedicalXAIModel.diagnose, each XAIFormatter method and the
+full /diagnose route (Flask test client) over the query corpora, for the bundled
+knowledge base and synthetic ones, and compares the results with a stored baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+BUNDLED_KB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "medical_knowledge_base.json")
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.corpora import build_corpora  # noqa: E402
+from benchmarks.synthetic import generate_knowledge_base, write_knowledge_base  # noqa: E402
+
+# "bundled" is data/medical_knowledge_base.json (16 diseases); numbers are synthetic sizes
+DEFAULT_SIZES = ("bundled", "1000", "10000", "100000")
+
+# Percentiles reported for every benchmark
+PERCENTILES = (50, 95, 99)
+
+# A benchmark regresses when a percentile grows by more than this fraction of the baseline...
+DEFAULT_TOLERANCE = 0.25
+
+# ...and by more than this many milliseconds, so microsecond-scale noise is not flagged
+DEFAULT_MIN_DELTA_MS = 0.05
+
+# Percentiles compared against the baseline (p99 of short runs is too noisy to gate on)
+COMPARED_PERCENTILES = ("p50_ms", "p95_ms")
+
+
+def summarize(samples_ns: Sequence[int]) -> Dict:
+    """Percentiles, mean and throughput of per-call durations in nanoseconds"""
+    samples_ms = np.asarray(samples_ns, dtype=np.float64) / 1e6
+    summary = {"n": len(samples_ms)}
+    for percentile, value in zip(PERCENTILES, np.percentile(samples_ms, PERCENTILES)):
+        summary[f"p{percentile}_ms"] = round(float(value), 4)
+    summary["mean_ms"] = round(float(samples_ms.mean()), 4)
+    summary["throughput_per_s"] = round(len(samples_ms) / (samples_ms.sum() / 1000), 1) if samples_ms.sum() else None
+    return summary
+
+
+def time_calls(function: Callable, arguments: Sequence, repeat: int = 3, warmup: int = 5) -> Dict:
+    """
+    Time function(argument) once per argument, repeat times over the whole list
+
+    Args:
+        function: Callable taking one argument
+        arguments: Inputs, each timed separately
+        repeat: Passes over arguments
+        warmup: Untimed calls before measuring
+    """
+    for argument in list(arguments)[:warmup]:
+        function(argument)
+
+    samples = []
+    for _ in range(repeat):
+        for argument in arguments:
+            start = time.perf_counter_ns()
+            function(argument)
+            samples.append(time.perf_counter_ns() - start)
+    return summarize(samples)
+
+
+def formatter_benchmarks(model, diagnoses: List[Dict], days: float) -> Dict[str, Callable[[Dict], object]]:
+    """One callable per XAIFormatter method, each taking a diagnosis from model.diagnose()"""
+    from xai_formatter import XAIFormatter
+
+    snapshot = model.snapshot
+    top = lambda diagnosis: diagnosis["possible_diseases"][0]  # noqa: E731
+
+    return {
+        "format_scoring_explanation": lambda d: XAIFormatter.format_scoring_explanation(top(d)),
+        "format_symptom_analysis": lambda d: XAIFormatter.format_symptom_analysis(
+            top(d)["matched_symptoms"], top(d)["scoring_breakdown"]["unmatched_disease_symptoms"],
+            top(d)["disease_symptoms"]
+        ),
+        "format_feature_importance": lambda d: XAIFormatter.format_feature_importance(top(d)),
+        "format_comparative_analysis": lambda d: XAIFormatter.format_comparative_analysis(d["possible_diseases"]),
+        "format_complete_diagnosis": lambda d: XAIFormatter.format_complete_diagnosis(top(d)),
+        "format_xai_sections": lambda d: XAIFormatter.format_xai_sections(top(d), XAIFormatter.XAI_SECTIONS),
+        "format_counterfactual_analysis": lambda d: XAIFormatter.format_counterfactual_analysis(
+            d["possible_diseases"], snapshot.differential_table
+        ),
+        "check_differential_diagnosis": lambda d: XAIFormatter.check_differential_diagnosis(
+            d["possible_diseases"], differential_table=snapshot.differential_table
+        ),
+        "generate_confidence_questions": lambda d: XAIFormatter.generate_confidence_questions(d["possible_diseases"]),
+        "format_diagnosis_with_confidence_check": lambda d: XAIFormatter.format_diagnosis_with_confidence_check(
+            d["possible_diseases"], differential_table=snapshot.differential_table
+        ),
+        "duration_penalties": lambda d: XAIFormatter.duration_penalties(
+            np.full((1, len(snapshot.disease_ids)), float(days)),
+            snapshot.duration_min, snapshot.duration_max, snapshot.duration_chronic
+        ),
+    }
+
+
+def benchmark_knowledge_base(kb_path: str, n_queries: int = 100, repeat: int = 3, days: float = 3,
+                             seed: int = 0, include_route: bool = True) -> Dict:
+    """
+    Run every benchmark against one knowledge base file
+
+    The result cache is disabled so repeated queries are scored every time.
+    """
+    from model import MedicalXAIModel
+
+    start = time.perf_counter()
+    model = MedicalXAIModel(kb_path, use_artifact=False, cache_size=0)
+    load_seconds = time.perf_counter() - start
+    if not model.initialization_complete:
+        raise RuntimeError(f"Could not load knowledge base {kb_path}")
+
+    snapshot = model.snapshot
+    corpora = build_corpora(snapshot.knowledge_base, n_queries=n_queries, seed=seed)
+    results = {}
+
+    for corpus, queries in corpora.items():
+        results[f"preprocess_symptoms/{corpus}"] = time_calls(model.preprocess_symptoms, queries, repeat)
+        results[f"diagnose/{corpus}"] = time_calls(lambda q: model.diagnose(q, days=days), queries, repeat)
+
+    # Formatter inputs: diagnoses of the short corpus, top disease attributed as /diagnose?expand does
+    diagnoses = []
+    for query in corpora["short"]:
+        diagnosis = model.diagnose(query, days=days)
+        if diagnosis.get("possible_diseases"):
+            model.attribute_symptoms(diagnosis, [diagnosis["possible_diseases"][0]["disease_id"]])
+            diagnoses.append(diagnosis)
+    if diagnoses:
+        for name, function in formatter_benchmarks(model, diagnoses, days).items():
+            results[f"xai_formatter.{name}"] = time_calls(function, diagnoses, repeat)
+
+    if include_route:
+        import app as app_module
+
+        app_module.model = model
+        client = app_module.app.test_client()
+        for corpus, queries in corpora.items():
+            for label, path in (("ranking", "/diagnose"), ("expand_top1", "/diagnose?expand=all&expand_top=1")):
+                results[f"route/{label}/{corpus}"] = time_calls(
+                    lambda q: client.post(path, json={"symptoms": q, "days": days}), queries, repeat
+                )
+
+    return {
+        "kb": {
+            "diseases": len(snapshot.disease_ids),
+            "symptoms": len(snapshot.symptom_vocabulary),
+            "terms": len(snapshot.term_index),
+            "load_seconds": round(load_seconds, 3)
+        },
+        "benchmarks": results
+    }
+
+
+def compare_with_baseline(results: Dict, baseline: Dict, tolerance: float = DEFAULT_TOLERANCE,
+                          min_delta_ms: float = DEFAULT_MIN_DELTA_MS) -> List[Dict]:
+    """
+    Benchmarks whose p50 or p95 regressed against the baseline
+
+    Only benchmarks present in both runs, for the same knowledge base label, are compared.
+
+    Returns:
+        List of {"kb", "benchmark", "percentile", "baseline_ms", "current_ms", "ratio"}
+    """
+    regressions = []
+    for kb_label, current in results.get("results", {}).items():
+        previous = baseline.get("results", {}).get(kb_label)
+        if previous is None:
+            continue
+        for name, stats in current["benchmarks"].items():
+            old = previous["benchmarks"].get(name)
+            if old is None:
+                continue
+            for percentile in COMPARED_PERCENTILES:
+                before, after = old.get(percentile), stats.get(percentile)
+                if not before or after is None:
+                    continue
+                if after > before * (1 + tolerance) and after - before > min_delta_ms:
+                    regressions.append({
+                        "kb": kb_label,
+                        "benchmark": name,
+                        "percentile": percentile,
+                        "baseline_ms": before,
+                        "current_ms": after,
+                        "ratio": round(after / before, 3)
+                    })
+    return regressions
+
+
+def environment() -> Dict:
+    import scipy
+    import sklearn
+
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "scikit_learn": sklearn.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+def run(sizes: Sequence[str] = DEFAULT_SIZES, n_queries: int = 100, repeat: int = 3, seed: int = 0,
+        include_route: bool = True, log: Callable[[str], None] = print) -> Dict:
+    """Benchmark every requested knowledge base; synthetic ones are generated into a temporary directory"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            if size == "bundled":
+                kb_path = BUNDLED_KB_PATH
+            else:
+                kb_path = os.path.join(tmp, f"synthetic_{size}.json")
+                write_knowledge_base(kb_path, generate_knowledge_base(int(size), seed=seed))
+            log(f"Benchmarking {size} knowledge base...")
+            results[size] = benchmark_knowledge_base(kb_path, n_queries, repeat, seed=seed, include_route=include_route)
+            results[size]["kb"]["source"] = "data/medical_knowledge_base.json" if size == "bundled" else "synthetic"
+
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "settings": {"n_queries": n_queries, "repeat": repeat, "seed": seed},
+        "environment": environment(),
+        "results": results
+    }
+
+
+def print_summary(report: Dict, regressions: List[Dict]):
+    for kb_label, result in report["results"].items():
+        kb = result["kb"]
+        print(f"\n== {kb_label}: {kb['diseases']} diseases, {kb['symptoms']} symptoms, loaded in {kb['load_seconds']}s")
+        print(f"{'benchmark':<58}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>12}")
+        for name, stats in result["benchmarks"].items():
+            print(f"{name:<58}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}"
+                  f"{stats['throughput_per_s'] or 0:>12.1f}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) against the baseline:")
+        for r in regressions:
+            print(f"  [{r['kb']}] {r['benchmark']} {r['percentile']}: "
+                  f"{r['baseline_ms']:.3f} -> {r['current_ms']:.3f} ms (x{r['ratio']})")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Medical-XAI diagnosis pipeline")
+    parser.add_argument("--sizes", default=",".join(DEFAULT_SIZES),
+                        help="Comma-separated knowledge bases: 'bundled' and/or synthetic disease counts")
+    parser.add_argument("--queries", type=int, default=100, help="Queries per corpus")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes over each corpus")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for synthetic knowledge bases and corpora")
+    parser.add_argument("--no-route", action="store_true", help="Skip the /diagnose route benchmarks")
+    parser.add_argument("-o", "--output", help="Write the results JSON here")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH,
+                        help="Baseline JSON to compare against (skipped if missing)")
+    parser.add_argument("--save-baseline", action="store_true", help="Write these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed fractional p50/p95 increase before flagging a regression")
+    args = parser.parse_args(argv)
+
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    report = run(sizes, args.queries, args.repeat, args.seed, include_route=not args.no_route)
+
+    regressions = []
+    if not args.save_baseline and args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(report, baseline, args.tolerance)
+        report["baseline"] = {"path": os.path.abspath(args.baseline), "created": baseline.get("created"),
+                              "tolerance": args.tolerance, "regressions": regressions}
+
+    print_summary(report, regressions)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved baseline to {args.baseline}")
+
+    return 1 if regressions else 0
@@ -0,0 +1,334 @@
+"""
+Synthetic Data - medical_knowledge_base.json-compatible knowledge bases and labelled patient cases
+Symptom names are composed from small word lists so that, as in the real knowledge
+base, different symptoms share TF-IDF terms (e.g. "chest pain" and "sharp chest tightness").
+Symptom popularity follows a Zipf law, so a few symptoms appear in many diseases and
+most in only a few; patient cases report part of a disease's profile through synonyms,
+with optional unrelated symptoms, typos and negated symptoms
+
+Usage (from the Medical-XAI directory):
+    python -m benchmarks.synthetic --diseases 10000 --cases 100000 --kb-output kb.json --cases-output cases.jsonl
+    python -m benchmarks.synthetic --kb data/medical_knowledge_base.json --cases 5000 --cases-output cases.jsonl
+"""
+
+import argparse
+import json
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+_MODIFIERS = [
+    "sharp", "dull", "persistent", "intermittent", "severe", "mild", "chronic", "sudden",
+    "burning", "throbbing", "recurrent", "nocturnal", "localized", "diffuse", "progressive",
+]
+_SITES = [
+    "chest", "abdominal", "head", "back", "joint", "muscle", "throat", "ear", "eye", "skin",
+    "neck", "pelvic", "flank", "limb", "jaw", "sinus", "stomach", "bladder", "lung", "heart",
+]
+_FINDINGS = [
+    "pain", "swelling", "itching", "numbness", "tightness", "rash", "stiffness", "tenderness",
+    "weakness", "cramping", "discharge", "bleeding", "redness", "pressure", "tingling",
+]
+
+# Lay wording used for symptom_keywords synonyms ("abdominal pain" -> "belly ache", "ache in belly")
+_SITE_SYNONYMS = {
+    "abdominal": "belly", "head": "skull", "joint": "knuckle", "muscle": "muscular", "throat": "pharynx",
+    "skin": "dermal", "pelvic": "hip", "flank": "side", "limb": "arm", "stomach": "tummy",
+    "lung": "breathing", "heart": "cardiac",
+}
+_FINDING_SYNONYMS = {
+    "pain": "ache", "swelling": "puffiness", "itching": "itchiness", "numbness": "loss of feeling",
+    "tightness": "constriction", "rash": "spots", "stiffness": "rigidity", "tenderness": "soreness",
+    "weakness": "feebleness", "cramping": "cramps", "discharge": "oozing", "bleeding": "blood loss",
+    "redness": "flushing", "pressure": "heaviness", "tingling": "pins and needles",
+}
+
+# Default Zipf exponent of symptom popularity; 1.0 puts the most common symptom in about half
+# of all diseases and the next ones in a third to a fifth, like fatigue, cough and fever in the bundled knowledge base
+DEFAULT_ZIPF_EXPONENT = 1.0
+
+# Probabilities of the patient-case perturbations
+DEFAULT_NOISE_RATE = 0.3  # case mentions an unrelated symptom
+DEFAULT_TYPO_RATE = 0.1  # per reported symptom
+DEFAULT_NEGATION_RATE = 0.2  # case denies a symptom ("no chest pain")
+
+_NEGATIONS = ["no", "not", "without", "denies", "no sign of"]
+
+# Diseases whose Zipf-weighted profiles are drawn in one array operation
+_PROFILE_CHUNK = 1024
+
+
+def symptom_names(n_symptoms: int, seed: int = 0) -> List[str]:
+    """n distinct symptom names ("site finding", then "modifier site finding"), in a seeded order"""
+    rng = np.random.default_rng(seed)
+    names = [f"{site} {finding}" for site in _SITES for finding in _FINDINGS]
+    rng.shuffle(names)
+    if n_symptoms > len(names):
+        extra = [
+            f"{modifier} {site} {finding}"
+            for modifier in _MODIFIERS for site in _SITES for finding in _FINDINGS
+        ]
+        rng.shuffle(extra)
+        names += extra
+    if n_symptoms > len(names):
+        raise ValueError(f"at most {len(names)} distinct symptom names are available")
+    return names[:n_symptoms]
+
+
+def symptom_synonyms(symptom: str) -> List[str]:
+    """Keyword list for a synthetic symptom: the name itself, then lay rewordings"""
+    words = symptom.split()
+    finding, site, modifiers = words[-1], words[-2], words[:-2]
+    lay_site = _SITE_SYNONYMS.get(site, site)
+    lay_finding = _FINDING_SYNONYMS.get(finding, finding)
+
+    synonyms = [symptom, " ".join(modifiers + [lay_site, lay_finding]), f"{lay_finding} in {lay_site}"]
+    return list(dict.fromkeys(synonyms))
+
+
+def zipf_weights(n: int, exponent: float = DEFAULT_ZIPF_EXPONENT) -> np.ndarray:
+    """Normalized Zipf probabilities of ranks 1..n"""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _weighted_profiles(rng: np.random.Generator, n_rows: int, weights: np.ndarray, sizes: np.ndarray) -> List[np.ndarray]:
+    """
+    Row i: sizes[i] distinct indices drawn without replacement with probability ~ weights
+
+    Uses the Gumbel top-k trick: the k largest log(weight) + Gumbel keys are a weighted
+    sample without replacement, so every row is drawn in one vectorized pass.
+    """
+    k = int(sizes.max())
+    keys = np.log(weights)[None, :] + rng.gumbel(size=(n_rows, len(weights)))
+    top = np.argpartition(-keys, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(keys, top, axis=1), axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    return [row[:size] for row, size in zip(top, sizes)]
+
+
+def generate_knowledge_base(n_diseases: int, n_symptoms: int = None, seed: int = 0,
+                            min_symptoms: int = 4, max_symptoms: int = 10,
+                            zipf_exponent: float = DEFAULT_ZIPF_EXPONENT) -> Dict:
+    """
+    Build a knowledge base dict with n_diseases diseases
+
+    Args:
+        n_diseases: Number of diseases
+        n_symptoms: Size of the symptom vocabulary (default: grows with sqrt(n_diseases))
+        seed: Random seed; equal arguments always produce the same knowledge base
+        min_symptoms: Fewest symptoms per disease
+        max_symptoms: Most symptoms per disease
+        zipf_exponent: Exponent of symptom popularity (0: every symptom equally common)
+
+    Returns:
+        Dict with "diseases" and "symptom_keywords", loadable by MedicalXAIModel
+    """
+    rng = np.random.default_rng(seed)
+    if n_symptoms is None:
+        n_symptoms = int(min(4500, max(60, 30 * np.sqrt(n_diseases))))
+    max_symptoms = min(max_symptoms, n_symptoms)
+    min_symptoms = min(min_symptoms, max_symptoms)
+    symptoms = symptom_names(n_symptoms, seed)
+    weights = zipf_weights(n_symptoms, zipf_exponent)
+
+    sizes = rng.integers(min_symptoms, max_symptoms + 1, size=n_diseases)
+    profiles = []
+    for start in range(0, n_diseases, _PROFILE_CHUNK):
+        chunk = sizes[start:start + _PROFILE_CHUNK]
+        profiles.extend(_weighted_profiles(rng, len(chunk), weights, chunk))
+
+    duration_min = rng.integers(1, 15, size=n_diseases)
+    duration_span = rng.integers(2, 30, size=n_diseases)
+    is_chronic = rng.random(n_diseases) < 0.15
+
+    diseases = {}
+    for index, profile in enumerate(profiles):
+        names = [symptoms[i] for i in profile]
+        diseases[f"synthetic_{index:06d}"] = {
+            "name": f"Synthetic Disease {index}",
+            "symptoms": names,
+            "explanation": f"Synthetic disease {index}, characterized by {', '.join(names[:3])}.",
+            "typical_duration_min": int(duration_min[index]),
+            "typical_duration_max": 365 if is_chronic[index] else int(duration_min[index] + duration_span[index]),
+            "is_chronic": bool(is_chronic[index])
+        }
+
+    used = sorted({i for profile in profiles for i in profile.tolist()})
+    return {
+        "diseases": diseases,
+        "symptom_keywords": {symptoms[i]: symptom_synonyms(symptoms[i]) for i in used}
+    }
+
+
+def _typo(rng: np.random.Generator, text: str) -> str:
+    """One character-level edit (swap, drop, double or replace) in a word of four or more letters"""
+    words = text.split()
+    candidates = [i for i, word in enumerate(words) if len(word) >= 4 and word.isalpha()]
+    if not candidates:
+        return text
+    index = candidates[int(rng.integers(len(candidates)))]
+    word = words[index]
+    position = int(rng.integers(1, len(word) - 1))
+    edit = int(rng.integers(4))
+    if edit == 0:
+        word = word[:position] + word[position + 1] + word[position] + word[position + 2:]
+    elif edit == 1:
+        word = word[:position] + word[position + 1:]
+    elif edit == 2:
+        word = word[:position] + word[position] + word[position:]
+    else:
+        word = word[:position] + "abcdefghijklmnopqrstuvwxyz"[int(rng.integers(26))] + word[position + 1:]
+    words[index] = word
+    return " ".join(words)
+
+
+def generate_patient_cases(knowledge_base: Dict, n_cases: int, seed: int = 0,
+                           noise_rate: float = DEFAULT_NOISE_RATE,
+                           typo_rate: float = DEFAULT_TYPO_RATE,
+                           negation_rate: float = DEFAULT_NEGATION_RATE,
+                           min_reported: int = 2) -> List[Dict]:
+    """
+    Labelled patient cases for a knowledge base
+
+    Each case reports a random subset (at least min_reported symptoms) of one
+    disease's profile, each by the symptom name or one of its symptom_keywords, with
+    a duration inside the disease's typical range.
+
+    Args:
+        knowledge_base: Knowledge base dict ("diseases", "symptom_keywords")
+        n_cases: Number of cases
+        seed: Random seed
+        noise_rate: Probability that a case also reports a symptom outside the profile
+        typo_rate: Probability of a typo in each reported symptom
+        negation_rate: Probability that a case denies a symptom outside the profile
+
+    Returns:
+        List of {"case_id", "disease_id", "symptoms" (input text), "days",
+        "reported", "noise", "negated" (canonical symptoms), "typos"}
+    """
+    rng = np.random.default_rng(seed)
+    diseases = [(disease_id, info) for disease_id, info in knowledge_base.get("diseases", {}).items()
+                if info.get("symptoms")]
+    keywords = knowledge_base.get("symptom_keywords", {})
+    vocabulary = sorted({symptom for _, info in diseases for symptom in info["symptoms"]})
+
+    def phrase(symptom: str) -> str:
+        synonyms = keywords.get(symptom) or [symptom]
+        return synonyms[int(rng.integers(len(synonyms)))]
+
+    def outside(profile: Iterable[str]) -> Optional[str]:
+        profile = set(profile)
+        for _ in range(10):
+            symptom = vocabulary[int(rng.integers(len(vocabulary)))]
+            if symptom not in profile:
+                return symptom
+        return None
+
+    cases = []
+    labels = rng.integers(len(diseases), size=n_cases)
+    for case_index, label in enumerate(labels.tolist()):
+        disease_id, info = diseases[label]
+        profile = list(dict.fromkeys(info["symptoms"]))
+        count = int(rng.integers(min(min_reported, len(profile)), len(profile) + 1))
+        reported = [profile[i] for i in rng.choice(len(profile), size=count, replace=False)]
+
+        noise = []
+        if rng.random() < noise_rate:
+            symptom = outside(profile + reported)
+            if symptom is not None:
+                noise.append(symptom)
+
+        fragments, typos = [], 0
+        for symptom in reported + noise:
+            text = phrase(symptom)
+            if rng.random() < typo_rate:
+                typo = _typo(rng, text)
+                typos += typo != text
+                text = typo
+            fragments.append(text)
+        order = rng.permutation(len(fragments))
+        fragments = [fragments[i] for i in order]
+
+        negated = []
+        if rng.random() < negation_rate:
+            symptom = outside(profile + noise)
+            if symptom is not None:
+                negated.append(symptom)
+                fragments.insert(
+                    int(rng.integers(len(fragments) + 1)),
+                    f"{_NEGATIONS[int(rng.integers(len(_NEGATIONS)))]} {phrase(symptom)}"
+                )
+
+        low = int(info.get("typical_duration_min", 1))
+        high = int(info.get("typical_duration_max", 365))
+        cases.append({
+            "case_id": f"case_{case_index:07d}",
+            "disease_id": disease_id,
+            "symptoms": ", ".join(fragments),
+            "days": int(rng.integers(low, max(low, high) + 1)),
+            "reported": reported,
+            "noise": noise,
+            "negated": negated,
+            "typos": typos
+        })
+
+    return cases
+
+
+def write_knowledge_base(path: str, knowledge_base: Dict):
+    with open(path, "w") as f:
+        json.dump(knowledge_base, f)
+
+
+def write_patient_cases(path: str, cases: List[Dict]):
+    """One JSON object per line"""
+    with open(path, "w") as f:
+        for case in cases:
+            f.write(json.dumps(case) + "\n")
+
+
+def load_patient_cases(path: str) -> List[Dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic knowledge base and labelled patient cases")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--diseases", type=int, help="Generate a knowledge base with this many diseases")
+    source.add_argument("--kb", help="Generate cases for an existing knowledge base JSON file instead")
+    parser.add_argument("--symptoms", type=int, help="Symptom vocabulary size (default: grows with sqrt(diseases))")
+    parser.add_argument("--zipf", type=float, default=DEFAULT_ZIPF_EXPONENT, help="Zipf exponent of symptom popularity")
+    parser.add_argument("--cases", type=int, default=0, help="Number of patient cases")
+    parser.add_argument("--noise-rate", type=float, default=DEFAULT_NOISE_RATE)
+    parser.add_argument("--typo-rate", type=float, default=DEFAULT_TYPO_RATE)
+    parser.add_argument("--negation-rate", type=float, default=DEFAULT_NEGATION_RATE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--kb-output", help="Write the generated knowledge base here")
+    parser.add_argument("--cases-output", help="Write the cases here (JSON lines)")
+    args = parser.parse_args(argv)
+
+    if args.kb:
+        with open(args.kb) as f:
+            knowledge_base = json.load(f)
+    else:
+        knowledge_base = generate_knowledge_base(args.diseases, args.symptoms, args.seed, zipf_exponent=args.zipf)
+        if args.kb_output:
+            write_knowledge_base(args.kb_output, knowledge_base)
+            print(f"Wrote {len(knowledge_base['diseases'])} diseases, "
+                  f"{len(knowledge_base['symptom_keywords'])} symptoms to {args.kb_output}")
+
+    if args.cases:
+        if not args.cases_output:
+            parser.error("--cases-output is required with --cases")
+        cases = generate_patient_cases(
+            knowledge_base, args.cases, args.seed,
+            noise_rate=args.noise_rate, typo_rate=args.typo_rate, negation_rate=args.negation_rate
+        )
+        write_patient_cases(args.cases_output, cases)
+        print(f"Wrote {len(cases)} cases to {args.cases_output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,542 @@
+"""
+Scoring Parameter Tuning - Grid search over scoring weights and thresholds on labelled cases
+The parameter-independent score components of every case (TF-IDF similarity, share of the
+disease's symptoms mentioned, match ratio, duration penalty) are computed once; every grid
+point is then pure array arithmetic over them. The best configurations are replayed through
+the /diagnose route to measure their real latency and payload size, and the chosen
+parameters can be written to data/scoring_config.json, which the model reads at startup
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from itertools import product
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from benchmarks.evaluate import chunk_size_for
+from benchmarks.runner import BUNDLED_KB_PATH, summarize
+from benchmarks.synthetic import generate_patient_cases, load_patient_cases
+
+# Default grids; match_weight is always 1 - tfidf_weight so scores stay within 0-1
+TFIDF_WEIGHTS = (0.4, 0.5, 0.6, 0.7, 0.8)
+MATCH_BONUS_FACTORS = (0.0, 0.15, 0.3, 0.45, 0.6)
+MIN_COMBINED_SCORES = (0.05, 0.1, 0.15, 0.2, 0.25)
+CONFIDENCE_THRESHOLDS = (0.3, 0.4, 0.5, 0.6, 0.7)
+DIFFERENTIAL_THRESHOLDS = (0.02, 0.05, 0.1, 0.15)
+
+# The confidence threshold is the lowest one above which the top disease is right this often
+DEFAULT_TARGET_PRECISION = 0.95
+
+# Ranking configurations replayed through /diagnose, best first (the current one is always added)
+DEFAULT_SHORTLIST = 5
+
+# Cases replayed through /diagnose per shortlisted configuration
+DEFAULT_ROUTE_SAMPLE = 300
+
+
+def _prunable(tfidf: np.ndarray, bonus_share: np.ndarray, match_ratio: np.ndarray, penalty: np.ndarray,
+              grids: Dict[str, Sequence[float]], top_k: int) -> np.ndarray:
+    """
+    Score columns that cannot affect any grid point's top_k
+
+    The combined score grows with match_bonus_factor and is linear in tfidf_weight,
+    so its bounds over the grid come from the extreme grid values. A column is
+    prunable when it can never clear the lowest cutoff, or when even its best
+    confidence stays below the top_k-th confidence that top_k other columns are
+    guaranteed under every grid point.
+    """
+    weights = (min(grids["tfidf_weight"]), max(grids["tfidf_weight"]))
+    similarity_low = np.minimum(1.0, tfidf + min(grids["match_bonus_factor"]) * bonus_share)
+    similarity_high = np.minimum(1.0, tfidf + max(grids["match_bonus_factor"]) * bonus_share)
+    combined_low = np.minimum(*(w * similarity_low + (1 - w) * match_ratio for w in weights))
+    combined_high = np.maximum(*(w * similarity_high + (1 - w) * match_ratio for w in weights))
+
+    # Columns ranked under every grid point, at their lowest confidence
+    guaranteed = np.where(combined_low > max(grids["min_combined_score"]),
+                          np.maximum(0.0, combined_low - penalty), -np.inf)
+    if guaranteed.shape[1] >= top_k:
+        kth_guaranteed = np.partition(guaranteed, -top_k, axis=1)[:, -top_k][:, None]
+    else:
+        kth_guaranteed = np.full((len(guaranteed), 1), -np.inf)
+
+    return ((combined_high <= min(grids["min_combined_score"]))
+            | (np.maximum(0.0, combined_high - penalty) < kth_guaranteed))
+
+
+def score_components(model, cases: List[Dict], grids: Dict[str, Sequence[float]], top_k: int = 5,
+                     chunk_size: Optional[int] = None, use_days: bool = True) -> Dict[str, np.ndarray]:
+    """
+    Parameter-independent score components of every case against the diseases that can matter to it
+
+    Diseases that cannot reach any grid point's top_k (see _prunable) are dropped,
+    so accuracy, returned diseases and top scores computed from the components are
+    exact for every grid point while rows stay short on large knowledge bases.
+
+    Args:
+        model: MedicalXAIModel
+        cases: Labelled cases whose disease is in the knowledge base
+        grids: Grid values of "tfidf_weight", "match_bonus_factor" and "min_combined_score"
+        top_k: Diseases per response
+        chunk_size: Cases scored per batch (default: sized from the knowledge base)
+        use_days: Apply each case's symptom duration
+
+    Returns:
+        Dict of flat arrays with one entry per remaining (case, disease) pair, grouped
+        by case and in knowledge-base order within a case (so ties break as in
+        diagnose()): "rows" (case), "diseases" (disease index), "tfidf", "bonus_share",
+        "match_ratio" and "penalty"; plus "label_entry", the entry of each case's
+        labelled disease (-1 if it can never be ranked), and "n_cases"
+    """
+    snapshot = model.snapshot
+    positions = {disease_id: i for i, disease_id in enumerate(snapshot.disease_ids)}
+    labels = np.array([positions[case["disease_id"]] for case in cases], dtype=np.int64)
+
+    parts = {name: [] for name in ("rows", "diseases", "tfidf", "bonus_share", "match_ratio", "penalty")}
+    chunk_size = chunk_size or chunk_size_for(len(snapshot.disease_ids))
+    for start in range(0, len(cases), chunk_size):
+        chunk = cases[start:start + chunk_size]
+        processed = [snapshot.preprocess_symptoms(case["symptoms"]) for case in chunk]
+        valid = [i for i, symptoms in enumerate(processed) if symptoms]
+        if not valid:
+            continue
+
+        scores = snapshot._score_batch(
+            [chunk[i]["symptoms"] for i in valid],
+            [processed[i] for i in valid],
+            [chunk[i].get("days") for i in valid] if use_days else None
+        )
+        totals = snapshot.disease_symptom_totals[scores["candidates"]]
+        safe_totals = np.where(totals > 0, totals, 1)
+        bonus_share = np.where(totals > 0, scores["bonus_counts"] / safe_totals, 0.0)
+        match_ratio = np.where(totals > 0, scores["matched_counts"] / safe_totals, 0.0)
+
+        keep = ~_prunable(scores["tfidf_similarity"], bonus_share, match_ratio, scores["duration_penalty"],
+                          grids, top_k)
+        # The labelled disease is kept to tell "ranked too low" from "never ranked"
+        keep |= scores["candidates"][None, :] == labels[start + np.asarray(valid)][:, None]
+        rows, columns = np.nonzero(keep)
+        parts["rows"].append(start + np.asarray(valid)[rows])
+        parts["diseases"].append(scores["candidates"][columns])
+        parts["tfidf"].append(scores["tfidf_similarity"][rows, columns])
+        parts["bonus_share"].append(bonus_share[rows, columns])
+        parts["match_ratio"].append(match_ratio[rows, columns])
+        parts["penalty"].append(scores["duration_penalty"][rows, columns])
+
+    components = {name: np.concatenate(values) if values else np.zeros(0) for name, values in parts.items()}
+    components["rows"] = components["rows"].astype(np.int64)
+    components["diseases"] = components["diseases"].astype(np.int64)
+
+    label_entries = np.flatnonzero(components["diseases"] == labels[components["rows"]])
+    components["label_entry"] = np.full(len(cases), -1, dtype=np.int64)
+    components["label_entry"][components["rows"][label_entries]] = label_entries
+    components["n_cases"] = len(cases)
+    return components
+
+
+def _rescore(components: Dict[str, np.ndarray], tfidf_weight: float, match_bonus_factor: float):
+    """Combined and confidence scores of every component entry under one set of weights"""
+    similarity = np.minimum(1.0, components["tfidf"] + match_bonus_factor * components["bonus_share"])
+    combined = tfidf_weight * similarity + (1 - tfidf_weight) * components["match_ratio"]
+    return combined, np.maximum(0.0, combined - components["penalty"])
+
+
+def sweep_rankings(components: Dict[str, np.ndarray], tfidf_weights: Sequence[float],
+                   match_bonus_factors: Sequence[float], min_combined_scores: Sequence[float],
+                   top_k: int = 5) -> List[Dict]:
+    """
+    Accuracy and result size of every (tfidf_weight, match_bonus_factor, min_combined_score)
+
+    The labelled disease's rank is the number of ranked entries of its case that beat
+    it (higher confidence, or equal confidence and earlier in knowledge-base order),
+    counted for all cases with one bincount, so no grid point sorts anything.
+
+    Returns:
+        One dict per grid point with the parameters, "top1"/"top3"/"top5" accuracy,
+        "mean_returned" (diseases per response) and "no_prediction" (share of cases
+        with nothing ranked)
+    """
+    rows, n_cases = components["rows"], components["n_cases"]
+    label_entry = components["label_entry"]
+    has_label = label_entry >= 0
+    safe_label = np.maximum(label_entry, 0)
+    # Entries before the label's in the same case win ties against it
+    before_label = np.arange(len(rows)) < safe_label[rows]
+
+    results = []
+    for tfidf_weight, match_bonus_factor in product(tfidf_weights, match_bonus_factors):
+        combined, confidence = _rescore(components, tfidf_weight, match_bonus_factor)
+        label_combined = np.where(has_label, combined[safe_label] if len(rows) else 0.0, 0.0)
+        label_confidence = (confidence[safe_label] if len(rows) else np.zeros(n_cases))[rows]
+
+        for min_combined_score in min_combined_scores:
+            eligible = combined > min_combined_score
+            ahead = eligible & ((confidence > label_confidence) | ((confidence == label_confidence) & before_label))
+            label_ranked = has_label & (label_combined > min_combined_score)
+            ranks = np.where(label_ranked, np.bincount(rows, weights=ahead, minlength=n_cases), top_k)
+            returned = np.minimum(np.bincount(rows, weights=eligible, minlength=n_cases), top_k)
+
+            results.append({
+                "tfidf_weight": tfidf_weight,
+                "match_weight": round(1 - tfidf_weight, 10),
+                "match_bonus_factor": match_bonus_factor,
+                "min_combined_score": min_combined_score,
+                **{f"top{n}": float(np.mean(ranks < n)) for n in (1, 3, 5) if n <= top_k},
+                "mean_returned": float(returned.mean()) if n_cases else 0.0,
+                "no_prediction": float(np.mean(returned == 0)) if n_cases else 0.0
+            })
+    return results
+
+
+def ranked_scores(components: Dict[str, np.ndarray], ranking: Dict, top_k: int = 5):
+    """
+    Returned confidences of every case under one grid point, and whether its top-1 is right
+
+    Returns:
+        (n_cases, top_k) confidences, best first (NaN past the last ranked disease),
+        and a boolean array, True where the labelled disease ranks first
+    """
+    rows, n_cases = components["rows"], components["n_cases"]
+    combined, confidence = _rescore(components, ranking["tfidf_weight"], ranking["match_bonus_factor"])
+    ranked = np.where(combined > ranking["min_combined_score"], confidence, -np.inf)
+
+    # Entries by case, best first; ties stay in knowledge-base order
+    order = np.lexsort((-ranked, rows))
+    row_starts = np.searchsorted(rows[order], np.arange(n_cases))
+    positions = np.arange(len(order)) - row_starts[rows[order]]
+    shown = (positions < top_k) & np.isfinite(ranked[order])
+
+    top_scores = np.full((n_cases, top_k), np.nan)
+    top_scores[rows[order][shown], positions[shown]] = ranked[order][shown]
+
+    first = np.full(n_cases, -1, dtype=np.int64)
+    first[rows[order][shown & (positions == 0)]] = order[shown & (positions == 0)]
+    correct = (first >= 0) & (first == components["label_entry"])
+    return top_scores, correct
+
+
+def sweep_confidence_thresholds(top_scores: np.ndarray, correct: np.ndarray,
+                                thresholds: Sequence[float]) -> List[Dict]:
+    """Share of cases whose top confidence clears each threshold, and how often those are right"""
+    top_confidence = np.nan_to_num(top_scores[:, 0], nan=0.0)
+    results = []
+    for threshold in thresholds:
+        confident = top_confidence >= threshold
+        results.append({
+            "confidence_threshold": threshold,
+            "high_confidence_rate": float(confident.mean()),
+            "high_confidence_precision": float(correct[confident].mean()) if confident.any() else None
+        })
+    return results
+
+
+def sweep_differential_thresholds(top_scores: np.ndarray, correct: np.ndarray,
+                                  thresholds: Sequence[float]) -> List[Dict]:
+    """
+    How well each differential threshold singles out wrong top-1 diagnoses, and how many close pairs it reports
+
+    A case is flagged when ranks 1 and 2 are within the threshold (is_differential);
+    every pair of returned diseases within it is a close pair in the response.
+    """
+    k = top_scores.shape[1]
+    upper = np.triu(np.ones((k, k), dtype=bool), 1)
+    gaps = top_scores[:, :, None] - top_scores[:, None, :]
+    wrong = ~correct
+
+    results = []
+    for threshold in thresholds:
+        close = (gaps <= threshold) & upper  # NaN gaps (fewer than k diseases) compare False
+        flagged = close[:, 0, 1] if k > 1 else np.zeros(len(top_scores), dtype=bool)
+        true_positives = int(np.sum(flagged & wrong))
+        precision = true_positives / flagged.sum() if flagged.any() else 0.0
+        recall = true_positives / wrong.sum() if wrong.any() else 0.0
+        results.append({
+            "differential_threshold": threshold,
+            "differential_rate": float(flagged.mean()),
+            "wrong_flagged_precision": float(precision),
+            "wrong_flagged_recall": float(recall),
+            "f1": float(2 * precision * recall / (precision + recall)) if precision + recall else 0.0,
+            "mean_close_pairs": float(close.sum(axis=(1, 2)).mean())
+        })
+    return results
+
+
+def measure_route(model, config, cases: List[Dict], use_days: bool = True) -> Dict:
+    """Latency and response size of /diagnose under a scoring configuration (Flask test client)"""
+    import app as app_module
+
+    model.apply_scoring(config)
+    app_module.model = model
+    client = app_module.app.test_client()
+
+    samples_ns, sizes = [], []
+    for case in cases:
+        payload = {"symptoms": case["symptoms"]}
+        if use_days and case.get("days") is not None:
+            payload["days"] = case["days"]
+        started = time.perf_counter_ns()
+        response = client.post("/diagnose", json=payload)
+        samples_ns.append(time.perf_counter_ns() - started)
+        sizes.append(len(response.get_data()))
+
+    return {**summarize(samples_ns), "mean_payload_bytes": round(float(np.mean(sizes)), 1)}
+
+
+def _ranking_key(result: Dict):
+    """Best ranking first: top-1, then top-3 accuracy, then fewer diseases per response"""
+    return (-result.get("top1", 0.0), -result.get("top3", 0.0), result["mean_returned"])
+
+
+def tune(model, cases: List[Dict], grids: Dict[str, Sequence[float]], top_k: int = 5,
+         chunk_size: Optional[int] = None, target_precision: float = DEFAULT_TARGET_PRECISION,
+         shortlist: int = DEFAULT_SHORTLIST, route_sample: int = DEFAULT_ROUTE_SAMPLE,
+         max_p95_ms: Optional[float] = None, seed: int = 0, use_days: bool = True,
+         log=print) -> Dict:
+    """
+    Search the grids and choose scoring parameters
+
+    Ranking parameters (weights, bonus factor, cutoff) are chosen first: the shortlisted
+    grid points with the best accuracy are replayed through /diagnose and the most
+    accurate one within max_p95_ms wins. For it, the confidence threshold is the lowest
+    whose high-confidence diagnoses reach target_precision, and the differential threshold
+    is the one that best singles out wrong top-1 diagnoses (F1).
+
+    Args:
+        model: MedicalXAIModel over the knowledge base to tune for
+        cases: Labelled cases (cases whose disease is not in the knowledge base are skipped)
+        grids: Values to try for "tfidf_weight", "match_bonus_factor", "min_combined_score",
+            "confidence_threshold" and "differential_threshold"
+        top_k: Diseases per response
+        chunk_size: Cases scored per batch (default: sized from the knowledge base)
+        target_precision: Required top-1 precision above the confidence threshold
+        shortlist: Ranking configurations replayed through /diagnose (0 skips the replay)
+        route_sample: Cases per replay
+        max_p95_ms: Reject configurations whose replayed p95 latency exceeds this
+        seed: Seed for the replay sample
+        use_days: Apply each case's symptom duration
+        log: Progress output
+
+    Returns:
+        Report dict with "chosen" (ScoringConfig fields), "current" (the model's
+        parameters), and the "rankings", "shortlist", "confidence_thresholds" and
+        "differential_thresholds" tables
+    """
+    from scoring_config import ScoringConfig
+
+    current = model.scoring
+    disease_ids = set(model.snapshot.disease_ids)
+    known = [case for case in cases if case.get("disease_id") in disease_ids]
+
+    # The current parameters are always part of the grid, as the reference point
+    grids = {
+        **grids,
+        "tfidf_weight": sorted(set(grids["tfidf_weight"]) | {current.tfidf_weight}),
+        "match_bonus_factor": sorted(set(grids["match_bonus_factor"]) | {current.match_bonus_factor}),
+        "min_combined_score": sorted(set(grids["min_combined_score"]) | {current.min_combined_score})
+    }
+
+    started = time.perf_counter()
+    components = score_components(model, known, grids, top_k, chunk_size, use_days)
+    components_seconds = time.perf_counter() - started
+    log(f"Score components of {len(known)} cases in {components_seconds:.2f}s")
+
+    started = time.perf_counter()
+    rankings = sweep_rankings(components, grids["tfidf_weight"], grids["match_bonus_factor"],
+                              grids["min_combined_score"], top_k)
+    sweep_seconds = time.perf_counter() - started
+    log(f"Swept {len(rankings)} ranking configurations in {sweep_seconds:.2f}s")
+
+    def is_current(result: Dict) -> bool:
+        return (np.isclose(result["tfidf_weight"], current.tfidf_weight)
+                and np.isclose(result["match_weight"], current.match_weight)
+                and np.isclose(result["match_bonus_factor"], current.match_bonus_factor)
+                and np.isclose(result["min_combined_score"], current.min_combined_score))
+
+    ordered = sorted(rankings, key=_ranking_key)
+    candidates = ordered[:shortlist]
+    baseline = next((result for result in rankings if is_current(result)), None)
+    if baseline is not None and not any(result is baseline for result in candidates):
+        candidates.append(baseline)
+
+    def ranking_config(result: Dict) -> "ScoringConfig":
+        return current._replace(
+            tfidf_weight=result["tfidf_weight"], match_weight=result["match_weight"],
+            match_bonus_factor=result["match_bonus_factor"], min_combined_score=result["min_combined_score"]
+        )
+
+    # Replay the shortlist through the route for real latency and payload sizes
+    replayed = []
+    if shortlist > 0 and route_sample > 0 and known:
+        rng = np.random.default_rng(seed)
+        sample = [known[i] for i in rng.choice(len(known), size=min(route_sample, len(known)), replace=False)]
+        for result in candidates:
+            log(f"Replaying tfidf_weight={result['tfidf_weight']} match_bonus_factor={result['match_bonus_factor']} "
+                f"min_combined_score={result['min_combined_score']} through /diagnose...")
+            replayed.append((result, measure_route(model, ranking_config(result), sample, use_days)))
+        model.apply_scoring(current)
+
+    within_budget = [(result, route) for result, route in replayed
+                     if max_p95_ms is None or route["p95_ms"] <= max_p95_ms]
+    if within_budget:
+        chosen_ranking = min(within_budget, key=lambda item: _ranking_key(item[0]))[0]
+    else:
+        chosen_ranking = ordered[0] if max_p95_ms is None or not replayed else baseline or ordered[0]
+
+    top_scores, correct = ranked_scores(components, chosen_ranking, top_k)
+    confidence_table = sweep_confidence_thresholds(top_scores, correct, grids["confidence_threshold"])
+    precise = [row for row in confidence_table
+               if row["high_confidence_precision"] is not None and row["high_confidence_precision"] >= target_precision]
+    confidence_threshold = (min(precise, key=lambda row: row["confidence_threshold"]) if precise
+                            else max(confidence_table, key=lambda row: row["confidence_threshold"]))["confidence_threshold"]
+
+    differential_table = sweep_differential_thresholds(top_scores, correct, grids["differential_threshold"])
+    differential_threshold = max(
+        differential_table, key=lambda row: (row["f1"], -row["mean_close_pairs"])
+    )["differential_threshold"]
+
+    chosen = ranking_config(chosen_ranking)._replace(
+        confidence_threshold=confidence_threshold, differential_threshold=differential_threshold
+    )
+
+    return {
+        "cases": len(known),
+        "seconds": {"components": round(components_seconds, 3), "sweep": round(sweep_seconds, 3)},
+        "current": current._asdict(),
+        "current_accuracy": baseline if baseline is not None else None,
+        "chosen": chosen._asdict(),
+        "chosen_accuracy": chosen_ranking,
+        "rankings": ordered,
+        "shortlist": [{**result, "route": route} for result, route in replayed],
+        "confidence_thresholds": confidence_table,
+        "differential_thresholds": differential_table
+    }
+
+
+def print_report(report: Dict, rows: int = 10):
+    accuracy_columns = [name for name in ("top1", "top3", "top5") if name in report["chosen_accuracy"]]
+    header = (f"{'tfidf_w':>8}{'bonus':>7}{'cutoff':>8}" + "".join(f"{name:>7}" for name in accuracy_columns)
+              + f"{'returned':>10}")
+
+    print(f"\nBest ranking configurations ({len(report['rankings'])} swept):")
+    print(header)
+    for result in report["rankings"][:rows]:
+        print(f"{result['tfidf_weight']:>8}{result['match_bonus_factor']:>7}{result['min_combined_score']:>8}"
+              + "".join(f"{result[name]:>7.3f}" for name in accuracy_columns)
+              + f"{result['mean_returned']:>10.2f}")
+
+    if report["shortlist"]:
+        print("\nReplayed through /diagnose:")
+        print(header + f"{'p50 ms':>9}{'p95 ms':>9}{'bytes':>9}")
+        for result in report["shortlist"]:
+            route = result["route"]
+            print(f"{result['tfidf_weight']:>8}{result['match_bonus_factor']:>7}{result['min_combined_score']:>8}"
+                  + "".join(f"{result[name]:>7.3f}" for name in accuracy_columns)
+                  + f"{result['mean_returned']:>10.2f}{route['p50_ms']:>9.3f}{route['p95_ms']:>9.3f}"
+                  + f"{route['mean_payload_bytes']:>9.0f}")
+
+    print("\nConfidence thresholds:")
+    for row in report["confidence_thresholds"]:
+        precision = row["high_confidence_precision"]
+        print(f"  {row['confidence_threshold']:<6} high confidence {row['high_confidence_rate']:.3f} of cases, "
+              f"right {'-' if precision is None else f'{precision:.3f}'}")
+
+    print("\nDifferential thresholds:")
+    for row in report["differential_thresholds"]:
+        print(f"  {row['differential_threshold']:<6} flags {row['differential_rate']:.3f} of cases "
+              f"(precision {row['wrong_flagged_precision']:.3f}, recall {row['wrong_flagged_recall']:.3f} "
+              f"for wrong top-1), {row['mean_close_pairs']:.2f} close pairs per response")
+
+    current, chosen = report["current"], report["chosen"]
+    print("\nParameter                 current   chosen")
+    for name in chosen:
+        print(f"{name:<26}{current[name]:>7}{chosen[name]:>9}")
+    if report["current_accuracy"]:
+        print("Top-1 accuracy            "
+              f"{report['current_accuracy'].get('top1', 0):>7.3f}{report['chosen_accuracy'].get('top1', 0):>9.3f}")
+
+
+def _parse_grid(value: str) -> List[float]:
+    return [float(item) for item in value.split(",") if item.strip()]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Grid-search the diagnosis scoring weights and thresholds")
+    parser.add_argument("--kb", default=BUNDLED_KB_PATH, help="Knowledge base JSON (default: the bundled one)")
+    parser.add_argument("--cases", help="Labelled cases JSONL (default: generate --generate cases from --kb)")
+    parser.add_argument("--generate", type=int, default=100000, help="Synthetic cases to generate without --cases")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for generated cases and the replay sample")
+    parser.add_argument("--tfidf-weights", type=_parse_grid, default=TFIDF_WEIGHTS,
+                        help="Comma-separated tfidf_weight values (match_weight = 1 - tfidf_weight)")
+    parser.add_argument("--bonus-factors", type=_parse_grid, default=MATCH_BONUS_FACTORS,
+                        help="Comma-separated match_bonus_factor values")
+    parser.add_argument("--cutoffs", type=_parse_grid, default=MIN_COMBINED_SCORES,
+                        help="Comma-separated min_combined_score values")
+    parser.add_argument("--confidence-thresholds", type=_parse_grid, default=CONFIDENCE_THRESHOLDS,
+                        help="Comma-separated confidence_threshold values")
+    parser.add_argument("--differential-thresholds", type=_parse_grid, default=DIFFERENTIAL_THRESHOLDS,
+                        help="Comma-separated differential_threshold values")
+    parser.add_argument("--target-precision", type=float, default=DEFAULT_TARGET_PRECISION,
+                        help="Top-1 precision the confidence threshold must guarantee")
+    parser.add_argument("--shortlist", type=int, default=DEFAULT_SHORTLIST,
+                        help="Best ranking configurations replayed through /diagnose (0 to skip)")
+    parser.add_argument("--route-sample", type=int, default=DEFAULT_ROUTE_SAMPLE, help="Cases per replay")
+    parser.add_argument("--max-p95-ms", type=float, help="Reject configurations slower than this on the replay")
+    parser.add_argument("--chunk-size", type=int, help="Cases per batch (default: sized from the knowledge base)")
+    parser.add_argument("--no-days", action="store_true", help="Ignore case durations (no duration penalties)")
+    parser.add_argument("--scoring-config", help="Scoring parameters JSON (default: data/scoring_config.json if present)")
+    parser.add_argument("-o", "--output", help="Write the full report JSON here")
+    parser.add_argument("--write", nargs="?", const="", metavar="PATH",
+                        help="Write the chosen parameters to PATH (default: data/scoring_config.json)")
+    args = parser.parse_args(argv)
+
+    from model import MedicalXAIModel
+    from scoring_config import ScoringConfig, save_scoring_config
+
+    # Score components do not depend on the parameters; "current" is what the model loaded
+    model = MedicalXAIModel(args.kb, use_artifact=False, cache_size=0, scoring_config_path=args.scoring_config)
+    if not model.initialization_complete:
+        print(f"Could not load knowledge base {args.kb}", file=sys.stderr)
+        return 2
+
+    if args.cases:
+        cases = load_patient_cases(args.cases)
+        source = os.path.abspath(args.cases)
+    else:
+        cases = generate_patient_cases(model.knowledge_base, args.generate, seed=args.seed)
+        source = f"synthetic (seed {args.seed})"
+
+    grids = {
+        "tfidf_weight": args.tfidf_weights,
+        "match_bonus_factor": args.bonus_factors,
+        "min_combined_score": args.cutoffs,
+        "confidence_threshold": args.confidence_thresholds,
+        "differential_threshold": args.differential_thresholds
+    }
+    report = tune(model, cases, grids, chunk_size=args.chunk_size, target_precision=args.target_precision,
+                  shortlist=args.shortlist, route_sample=args.route_sample, max_p95_ms=args.max_p95_ms,
+                  seed=args.seed, use_days=not args.no_days)
+    report["cases_source"] = source
+    report["knowledge_base"] = {"path": os.path.abspath(args.kb), "kb_hash": model.kb_hash}
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.write is not None:
+        path = args.write or None
+        save_scoring_config(ScoringConfig(**report["chosen"]), path, tuning={
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "knowledge_base": report["knowledge_base"],
+            "cases": {"source": source, "count": report["cases"]},
+            "accuracy": {"current": report["current_accuracy"], "chosen": report["chosen_accuracy"]}
+        })
+        print(f"\nWrote scoring parameters to {path or 'data/scoring_config.json'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+"""
+Tests - Score consistency checks for the diagnosis pipeline
+
+Usage (from the Medical-XAI directory):
+    python -m unittest
+"""
+
+import logging
+import os
+import sys
+from functools import lru_cache
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Inputs whose fragments are synonyms, free text or expand to several canonical symptoms
+SYNONYM_INPUTS = (
+    "stomach ache, loose stools, puke",
+    "hot, tired, head pain",
+    "chest tightness, wheezing",
+    "stomach ache, loose stools, puke, belly pain",
+    "i feel hot and my head hurts, runny nose",
+)
+
+# Misspelled inputs, which no keyword matches and are scored as typed
+TYPO_INPUTS = (
+    "feverr, coughh, head ache",
+    "nausia, vomitting, diarhea",
+    "fever, soar throat, runy nose",
+)
+
+
+@lru_cache(maxsize=None)
+def bundled_model():
+    """MedicalXAIModel over the bundled knowledge base, shared by all tests"""
+    logging.disable(logging.INFO)
+    from model import initialize_model
+    return initialize_model(cache_size=0)
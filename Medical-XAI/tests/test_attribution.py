@@ -0,0 +1,51 @@
+import itertools
+import unittest
+
+import numpy as np
+
+from tests import SYNONYM_INPUTS, bundled_model
+
+
+class AttributionTest(unittest.TestCase):
+    def setUp(self):
+        self.model = bundled_model()
+        self.snapshot = self.model.snapshot
+
+    def test_attributions_sum_to_final_score(self):
+        for symptoms in SYNONYM_INPUTS:
+            diagnosis = self.model.attribute_symptoms(self.model.diagnose(symptoms))
+            for disease in diagnosis["possible_diseases"]:
+                attributions = disease["symptom_attributions"]
+                total = attributions["baseline_score"] + sum(
+                    entry["shapley_value"] for entry in attributions["values"]
+                )
+                self.assertAlmostEqual(
+                    total, disease["scoring_breakdown"]["final_score"], places=9,
+                    msg=f"{symptoms!r} / {disease['disease_id']}"
+                )
+
+    def test_sampled_attributions_sum_to_final_score(self):
+        symptoms = ", ".join(self.snapshot.symptom_vocabulary[:14])
+        diagnosis = self.model.attribute_symptoms(self.model.diagnose(symptoms))
+        for disease in diagnosis["possible_diseases"]:
+            attributions = disease["symptom_attributions"]
+            self.assertEqual(attributions["method"], "sampled")
+            total = attributions["baseline_score"] + sum(entry["shapley_value"] for entry in attributions["values"])
+            self.assertAlmostEqual(total, disease["scoring_breakdown"]["final_score"], places=9)
+
+    def test_coalitions_match_rescoring(self):
+        diseases = np.arange(len(self.snapshot.disease_ids))
+        for symptoms in SYNONYM_INPUTS:
+            fragments = self.snapshot.input_fragments(symptoms)
+            coalitions = np.array(list(itertools.product([False, True], repeat=len(fragments)))[1:])
+            values = self.snapshot.coalition_value_function(fragments, diseases)(coalitions)
+
+            inputs = [", ".join(f for f, member in zip(fragments, row) if member) for row in coalitions]
+            scores = self.snapshot._score_batch(inputs, [self.snapshot.preprocess_symptoms(i) for i in inputs])
+            expected = np.zeros_like(values)
+            expected[:, scores["candidates"]] = scores["combined_score"]
+            np.testing.assert_allclose(values, expected, atol=1e-12, err_msg=symptoms)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from tests import SYNONYM_INPUTS, bundled_model
+
+
+class WhatIfTest(unittest.TestCase):
+    def setUp(self):
+        self.model = bundled_model()
+
+    def rescore(self, fragments, days):
+        """Confidence of every disease /diagnose returns for an edited input"""
+        result = self.model.diagnose(", ".join(fragments), top_k=50, days=days)
+        return {d["disease_id"]: d["confidence_score"] for d in result.get("possible_diseases", [])}
+
+    def test_baseline_matches_displayed_scores(self):
+        for symptoms in SYNONYM_INPUTS:
+            for days in (None, 2, 400):
+                diagnosis = self.model.diagnose(symptoms, days=days)
+                what_if = self.model.what_if(diagnosis)
+                if what_if is None:
+                    continue
+                for disease in diagnosis["possible_diseases"]:
+                    self.assertAlmostEqual(
+                        what_if["baseline"][disease["disease_id"]], disease["confidence_score"], places=9,
+                        msg=f"{symptoms!r} days={days} / {disease['disease_id']}"
+                    )
+                    if days is None:
+                        self.assertAlmostEqual(
+                            what_if["baseline"][disease["disease_id"]],
+                            disease["scoring_breakdown"]["final_score"], places=9
+                        )
+
+    def test_edits_match_rescoring(self):
+        for symptoms in SYNONYM_INPUTS:
+            diagnosis = self.model.diagnose(symptoms, days=3)
+            what_if = self.model.what_if(diagnosis)
+            if what_if is None:
+                continue
+            fragments = diagnosis["input_fragments"]
+            for edit in what_if["edits"]:
+                if edit["action"] == "remove":
+                    edited = [f for f in fragments if f != edit["symptom"]]
+                else:
+                    edited = fragments + [edit["symptom"]]
+                rescored = self.rescore(edited, 3)
+                for disease_id, delta in edit["deltas"].items():
+                    # Diseases the edit pushes below the score cutoff are not ranked by /diagnose
+                    if disease_id in rescored:
+                        expected = rescored[disease_id] - what_if["baseline"][disease_id]
+                        self.assertAlmostEqual(delta, expected, places=9, msg=f"{symptoms!r} {edit}")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+import json
+import random
+import unittest
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+from tests import SYNONYM_INPUTS, TYPO_INPUTS, bundled_model
+from scoring_config import ScoringConfig
+
+
+class ReferenceModel:
+    """
+    The original per-disease scoring loop: a TF-IDF cosine and a match bonus per disease
+
+    Preprocessing follows the rules adopted since: every keyword found at a word
+    boundary counts unless a longer keyword occurrence covers it, and a repeated
+    unrecognised fragment is kept once.
+    """
+
+    def __init__(self, knowledge_base):
+        self.knowledge_base = knowledge_base
+        self.vectorizer = TfidfVectorizer(lowercase=True, stop_words='english')
+        self.vectorizer.fit([" ".join(d.get("symptoms", [])) for d in knowledge_base["diseases"].values()])
+
+    def keyword_symptoms(self, fragment):
+        """Canonical symptoms whose keywords occur in fragment, in order of first appearance"""
+        keyword_map = self.knowledge_base.get("symptom_keywords", {})
+        hits = []
+        for keyword in {kw.lower() for keywords in keyword_map.values() for kw in keywords if kw}:
+            start = fragment.find(keyword)
+            while start != -1:
+                if start == 0 or not fragment[start - 1].isalnum():
+                    hits.append((start, start + len(keyword), keyword))
+                start = fragment.find(keyword, start + 1)
+
+        labels = []
+        for start, end, keyword in sorted(hits):
+            if any(s <= start and end <= e and e - s > end - start for s, e, _ in hits):
+                continue
+            for label, keywords in keyword_map.items():
+                if keyword in [kw.lower() for kw in keywords] and label not in labels:
+                    labels.append(label)
+        return labels
+
+    def preprocess_symptoms(self, symptoms_input):
+        processed = []
+        for symptom in symptoms_input.lower().split(','):
+            symptom = symptom.strip()
+            if symptom:
+                matched = self.keyword_symptoms(symptom)
+                for key_symptom in matched:
+                    if key_symptom not in processed:
+                        processed.append(key_symptom)
+                if not matched and symptom not in processed:
+                    processed.append(symptom)
+        return processed
+
+    def diagnose(self, symptoms_input, top_k=None):
+        processed_symptoms = self.preprocess_symptoms(symptoms_input)
+        if not processed_symptoms:
+            return {"error": "No valid symptoms provided", "diseases": []}
+
+        input_str = symptoms_input.lower()
+        results = []
+        for disease_id, disease_info in self.knowledge_base["diseases"].items():
+            disease_symptoms = disease_info.get("symptoms", [])
+            vectors = self.vectorizer.transform([input_str, " ".join(disease_symptoms).lower()])
+            tfidf_similarity = cosine_similarity(vectors[0:1], vectors[1:2])[0][0]
+            matched_count = sum(1 for symptom in disease_symptoms if symptom.lower() in input_str)
+            match_bonus = (matched_count / len(disease_symptoms)) * 0.3 if disease_symptoms else 0.0
+            similarity = min(1.0, tfidf_similarity + match_bonus)
+
+            matched_symptoms = [s for s in processed_symptoms if s in disease_symptoms]
+            match_ratio = len(matched_symptoms) / len(disease_symptoms) if disease_symptoms else 0
+            combined_score = similarity * 0.6 + match_ratio * 0.4
+            if combined_score > 0.1:
+                results.append({
+                    "disease_id": disease_id,
+                    "confidence_score": float(combined_score),
+                    "matched_symptoms": matched_symptoms,
+                    "tfidf_similarity": float(tfidf_similarity),
+                    "matched_count": matched_count
+                })
+
+        results.sort(key=lambda x: x["confidence_score"], reverse=True)
+        return {"input_symptoms": processed_symptoms, "possible_diseases": results[:top_k]}
+
+
+class ScoringParityTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.model = bundled_model()
+        with open(cls.model.kb_path) as f:
+            cls.reference = ReferenceModel(json.load(f))
+        cls.inputs = cls.query_corpus(cls.reference.knowledge_base)
+        # Full reference rankings; a top_k ranking is their first top_k entries
+        cls.expected = {symptoms: cls.reference.diagnose(symptoms) for symptoms in cls.inputs}
+
+    @staticmethod
+    def query_corpus(knowledge_base):
+        """Hand-picked inputs plus seeded random mixes of known symptoms and their synonyms"""
+        keywords = knowledge_base.get("symptom_keywords", {})
+        pool = sorted({s for d in knowledge_base["diseases"].values() for s in d.get("symptoms", [])})
+        pool += [synonym for synonyms in keywords.values() for synonym in synonyms]
+        rng = random.Random(0)
+        inputs = list(SYNONYM_INPUTS) + list(TYPO_INPUTS) + [
+            "fever, cough, headache",
+            "fever",
+            "I have had a bad cough and a fever since monday",
+            "Fever , COUGH,, sore throat ,",
+            "rash, rash, zzz, zzz"
+        ]
+        inputs += [", ".join(d.get("symptoms", [])) for d in knowledge_base["diseases"].values()]
+        inputs += [", ".join(rng.sample(pool, rng.randint(1, 6))) for _ in range(300)]
+        return inputs
+
+    def assertMatchesReference(self, actual, symptoms, top_k, message):
+        expected = self.expected[symptoms]
+        expected_diseases = expected["possible_diseases"][:top_k]
+        self.assertEqual(actual["input_symptoms"], expected["input_symptoms"], message)
+        self.assertEqual(
+            [d["disease_id"] for d in actual["possible_diseases"]],
+            [d["disease_id"] for d in expected_diseases],
+            message
+        )
+        for got, want in zip(actual["possible_diseases"], expected_diseases):
+            self.assertAlmostEqual(got["confidence_score"], want["confidence_score"], places=9, msg=message)
+            self.assertEqual(got["matched_symptoms"], want["matched_symptoms"], message)
+            breakdown = got["scoring_breakdown"]
+            self.assertAlmostEqual(
+                breakdown["tfidf_details"]["tfidf_similarity"], want["tfidf_similarity"], places=9, msg=message
+            )
+            self.assertEqual(breakdown["tfidf_details"]["matched_symptoms_count"], want["matched_count"], message)
+
+    def test_default_scoring_config(self):
+        self.assertEqual(self.model.snapshot.scoring, ScoringConfig())
+
+    def test_diagnose_matches_reference(self):
+        for top_k in (1, 5, 16):
+            for symptoms in self.inputs:
+                self.assertMatchesReference(
+                    self.model.diagnose(symptoms, top_k=top_k), symptoms, top_k, f"{symptoms!r} top_k={top_k}"
+                )
+
+    def test_diagnose_batch_matches_reference(self):
+        for symptoms, actual in zip(self.inputs, self.model.diagnose_batch(self.inputs)):
+            self.assertMatchesReference(actual, symptoms, 5, repr(symptoms))
+
+    def test_rank_batch_matches_reference(self):
+        ranked = self.model.rank_batch(self.inputs, top_k=5)
+        disease_ids = self.model.snapshot.disease_ids
+        for row, symptoms in enumerate(self.inputs):
+            expected = self.expected[symptoms]["possible_diseases"][:5]
+            indices = ranked["disease_indices"][row]
+            scores = ranked["confidence_scores"][row]
+            self.assertEqual(
+                [disease_ids[i] for i in indices if i >= 0], [d["disease_id"] for d in expected], repr(symptoms)
+            )
+            np.testing.assert_allclose(
+                scores[~np.isnan(scores)], [d["confidence_score"] for d in expected], rtol=0, atol=1e-9,
+                err_msg=repr(symptoms)
+            )
+
+    def test_empty_candidate_set(self):
+        symptoms = "zzz, qqq"
+        self.assertEqual(self.reference.diagnose(symptoms)["possible_diseases"], [])
+        result = self.model.diagnose(symptoms)
+        self.assertEqual(result["input_symptoms"], ["zzz", "qqq"])
+        self.assertEqual(result["possible_diseases"], [])
+        self.assertEqual(result["total_matched"], 0)
+        ranked = self.model.rank_batch([symptoms])
+        self.assertTrue((ranked["disease_indices"] == -1).all())
+        self.assertTrue(np.isnan(ranked["confidence_scores"]).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
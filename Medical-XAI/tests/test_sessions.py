@@ -0,0 +1,74 @@
+import logging
+import random
+import unittest
+
+from tests import SYNONYM_INPUTS, bundled_model
+
+
+class SessionParityTest(unittest.TestCase):
+    def setUp(self):
+        self.model = bundled_model()
+
+    def assertMatchesDiagnose(self, session, message):
+        expected = self.model.diagnose(", ".join(session.fragments), top_k=session.top_k, days=session.days)
+        actual = session.diagnose()
+        self.assertEqual(actual["input_symptoms"], expected["input_symptoms"], message)
+        self.assertEqual(
+            [d["disease_id"] for d in actual["possible_diseases"]],
+            [d["disease_id"] for d in expected["possible_diseases"]],
+            message
+        )
+        for got, want in zip(actual["possible_diseases"], expected["possible_diseases"]):
+            self.assertAlmostEqual(got["confidence_score"], want["confidence_score"], places=9, msg=message)
+            self.assertAlmostEqual(
+                got["scoring_breakdown"]["final_score"], want["scoring_breakdown"]["final_score"], places=9,
+                msg=message
+            )
+
+    def test_new_session_matches_diagnose(self):
+        for symptoms in SYNONYM_INPUTS:
+            _, session = self.model.create_session(symptoms, days=3)
+            self.assertEqual(session.fragments, self.model.snapshot.input_fragments(symptoms))
+            self.assertMatchesDiagnose(session, symptoms)
+
+    def test_edited_session_matches_diagnose(self):
+        snapshot = self.model.snapshot
+        keywords = snapshot.knowledge_base.get("symptom_keywords", {})
+        pool = list(keywords) + [synonym for synonyms in keywords.values() for synonym in synonyms]
+        rng = random.Random(0)
+        for symptoms in SYNONYM_INPUTS:
+            _, session = self.model.create_session(symptoms, days=3)
+            for step in range(20):
+                add = ", ".join(rng.sample(pool, rng.randint(0, 2)))
+                remove = ", ".join(rng.sample(session.symptoms + pool, rng.randint(0, 1)))
+                self.model.update_session(session, add=add, remove=remove)
+                if session.fragments:
+                    self.assertMatchesDiagnose(session, f"{symptoms!r} step {step}: {session.fragments}")
+
+    def test_edits_report_canonical_changes(self):
+        _, session = self.model.create_session("hot, tired", days=3)
+        changes = self.model.update_session(session, add="head pain", remove="fever")
+        self.assertEqual(changes, {"added": ["headache"], "removed": ["fever"]})
+        self.assertEqual(session.fragments, ["tired", "head pain"])
+
+
+class SessionMemoryCapTest(unittest.TestCase):
+    def test_growing_session_evicts_over_max_bytes(self):
+        from model import initialize_model
+        logging.disable(logging.INFO)
+        model = initialize_model(cache_size=0, session_max_bytes=2000)
+        idle_id, _ = model.create_session("fever, cough")
+        session_id, session = model.create_session("headache")
+        self.assertEqual(model.sessions.evictions, 0)
+
+        for i in range(200):
+            model.update_session(session, add=f"symptom {i}")
+            self.assertLessEqual(model.sessions.stats()["bytes"], 2000)
+
+        self.assertGreater(model.sessions.evictions, 0)
+        self.assertIsNone(model.get_session(idle_id))
+        self.assertIsNone(model.get_session(session_id))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,7 +6,7 @@ import AssessmentHistory from './components/AssessmentHistory';
 import SuccessView from './components/SuccessView';
 import ResultsWithSpecialists from './components/ResultsWithSpecialists';
 import { AppView, Assessment } from './types';
-import { analyzeSymptoms } from './services/prediction';
+import { analyzeSymptoms, getFeatureImportance, INITIAL_XAI_SECTIONS } from './services/prediction';
 
 const App: React.FC = () => {
   const [currentView, setCurrentView] = useState<AppView>(AppView.DASHBOARD);
@@ -31,16 +31,37 @@ const App: React.FC = () => {
       
       console.log('Submitting patient information:', answers);
       
-      // The answers object now contains patient info fields directly
-      const response = await fetch('http://localhost:5000/diagnose', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          symptoms: originalSymptoms,
-          days: days,
-          patient_info: answers  // Send patient info as structured data
-        })
-      });
+      // Symptoms the patient confirmed among the suggested symptom questions
+      const questions = currentResult.apiResponse.confidence_check?.clarifying_questions || [];
+      const confirmedSymptoms = questions.flatMap((question: any, index: number) =>
+        question.type === 'symptom_confirmation' && answers[`question_${index}`] === 'yes'
+          ? question.symptoms || []
+          : []
+      );
+      
+      // Add confirmed symptoms to the session incrementally; fall back to a full
+      // /diagnose when there is no session or it has expired
+      const sessionId = currentResult.apiResponse.session_id;
+      let response = sessionId
+        ? await fetch(`http://localhost:5000/sessions/${sessionId}?expand=${INITIAL_XAI_SECTIONS}&expand_top=1`, {
+            method: 'PATCH',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ add: confirmedSymptoms })
+          })
+        : null;
+      
+      if (!response || response.status === 404) {
+        // The answers object now contains patient info fields directly
+        response = await fetch(`http://localhost:5000/diagnose?expand=${INITIAL_XAI_SECTIONS}&expand_top=1`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({
+            symptoms: [originalSymptoms, ...confirmedSymptoms].join(', '),
+            days: days,
+            patient_info: answers  // Send patient info as structured data
+          })
+        });
+      }
       
       if (!response.ok) {
         const errorData = await response.json().catch(() => ({}));
@@ -100,6 +121,8 @@ const App: React.FC = () => {
         analysis_type: rawResult.analysis_type,
         differential_diagnosis: rawResult.differential_diagnosis,
         confidence_check: rawResult.confidence_check,
+        result_id: rawResult.result_id,
+        session_id: rawResult.session_id || currentResult.apiResponse.session_id,
         patient_info: answers  // Store patient info in API response
       };
 
@@ -120,6 +143,36 @@ const App: React.FC = () => {
     }
   };
 
+  // Feature importance of the top disease is fetched once the result is on screen
+  const resultId = currentResult?.apiResponse?.result_id;
+  useEffect(() => {
+    const topDiseaseId = currentResult?.apiResponse?.all_diseases?.[0]?.disease_id;
+    if (!resultId || !topDiseaseId || currentResult?.apiResponse?.important_features?.length) return;
+    
+    let cancelled = false;
+    getFeatureImportance(resultId, topDiseaseId)
+      .then((features) => {
+        if (cancelled) return;
+        setCurrentResult((previous) => {
+          if (!previous?.apiResponse || previous.apiResponse.result_id !== resultId) return previous;
+          const xaiData = previous.apiResponse.xai_data;
+          return {
+            ...previous,
+            apiResponse: {
+              ...previous.apiResponse,
+              important_features: features,
+              xai_data: xaiData ? { ...xaiData, feature_importance: features } : xaiData
+            }
+          };
+        });
+      })
+      .catch((error) => console.error('Error loading feature importance:', error));
+    
+    return () => {
+      cancelled = true;
+    };
+  }, [resultId]);
+
   // Load history from localStorage on initial render
   useEffect(() => {
     const saved = localStorage.getItem('assessment_history');
@@ -81,7 +81,7 @@ interface XAIData {
   scoring_breakdown: XAIScoringBreakdown;
   explanation: XAIExplanation;
   symptom_analysis: SymptomAnalysis;
-  feature_importance: FeatureImportance[];
+  feature_importance?: FeatureImportance[];
 }
 
 interface PatientInfo {
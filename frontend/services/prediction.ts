@@ -67,6 +67,7 @@ type FeatureImportance = {
   symptom: string;
   importance: number;
   contribution: 'High' | 'Medium' | 'Low';
+  shapley_value?: number;
   explanation: string;
 };
 
@@ -74,19 +75,25 @@ type XAIData = {
   scoring_breakdown: XAIScoringBreakdown;
   explanation: XAIExplanation;
   symptom_analysis: SymptomAnalysis;
-  feature_importance: FeatureImportance[];
+  feature_importance?: FeatureImportance[]; // Fetched after the first render with getFeatureImportance
 };
 
+// XAI sections and response details requested with the diagnosis itself (the default
+// response only carries the ranking). feature_importance runs a Shapley attribution,
+// so it is fetched afterwards from /diagnose/<result_id>/xai instead.
+export const INITIAL_XAI_SECTIONS =
+  'scoring_breakdown,explanation,symptom_analysis,duration_impact,disease_details,differential_details,clarification';
+
 type Disease = {
   name: string;
   disease_id: string;
   confidence: number;
   confidence_level: string;
-  explanation: string;
+  explanation: string; // explanation, all_symptoms and duration_warning need ?expand=disease_details
   matched_symptoms: string[];
   all_symptoms: string[];
   duration_warning?: string;
-  xai: XAIData;
+  xai?: XAIData; // Only present for diseases covered by ?expand / ?expand_top
 };
 
 // New types for differential diagnosis and confidence checks
@@ -95,6 +102,19 @@ export type DistinguishingSymptoms = {
   for_alternative: string[];
 };
 
+export type DifferentialPair = {
+  ranks: number[];
+  diseases_compared: string[];
+  score_1: number;
+  score_2: number;
+  score_difference: number;
+  explanation: string;
+  shared_symptoms: string[];
+  distinguishing_for_top: string[];
+  distinguishing_for_alternative: string[];
+  clarification_symptoms: string[];
+};
+
 export type DifferentialDiagnosis = {
   is_differential: boolean;
   diseases_compared?: string[];
@@ -107,6 +127,7 @@ export type DifferentialDiagnosis = {
   distinguishing_for_alternative?: string[];
   clarification_symptoms?: string[];
   clarification_explanation?: string;
+  close_pairs?: DifferentialPair[]; // Every pair among the returned diseases scored within 5%; text and pairs need ?expand=differential_details
 };
 
 export type ClarifyingQuestion = {
@@ -116,6 +137,7 @@ export type ClarifyingQuestion = {
   explanation?: string;
   field_name?: string; // NEW: For text_input type
   required?: boolean; // NEW: For text_input type
+  information_gain?: number; // Expected entropy reduction (bits) of a symptom_confirmation question
 };
 
 export type ConfidenceCheck = {
@@ -131,7 +153,7 @@ export type ConfidenceCheck = {
     name: string;
     confidence: number;
   }>;
-  clarifying_questions?: ClarifyingQuestion[];
+  clarifying_questions?: ClarifyingQuestion[]; // reason, message, alternatives, questions and next_step need ?expand=clarification
   next_step?: string;
 };
 
@@ -143,6 +165,8 @@ type DiagnoseResponse = {
   analysis_type: 'standard' | 'clarification_needed';
   differential_diagnosis: DifferentialDiagnosis;
   confidence_check: ConfidenceCheck;
+  result_id?: string; // Fetch more XAI sections later from /diagnose/<result_id>/xai
+  session_id?: string; // PATCH /sessions/<id> to add or remove symptoms incrementally
 };
 
 type ApiPrediction = {
@@ -174,6 +198,8 @@ type ApiResponse = {
   confidence_check?: ConfidenceCheck;
   duration_warning?: string;
   patient_info?: Record<string, any>; // NEW: Patient information form data
+  result_id?: string;
+  session_id?: string;
 };
 
 const getRiskLevel = (confidence: number) => {
@@ -201,8 +227,8 @@ export const analyzeSymptoms = async (symptoms: string, days: number, region: st
   console.log('Sending payload:', payload);
 
   try {
-    // Call the /diagnose endpoint which returns XAI-formatted data
-    const response = await fetch(`${baseUrl}/diagnose`, {
+    // Start an assessment session (diagnosed like /diagnose); only the top card needs its XAI sections
+    const response = await fetch(`${baseUrl}/sessions?expand=${INITIAL_XAI_SECTIONS}&expand_top=1`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify(payload)
@@ -296,7 +322,11 @@ export const analyzeSymptoms = async (symptoms: string, days: number, region: st
         // NEW: Add differential diagnosis and confidence checks
         analysis_type: result.analysis_type,
         differential_diagnosis: result.differential_diagnosis,
-        confidence_check: result.confidence_check
+        confidence_check: result.confidence_check,
+        
+        // Lets follow-up calls reuse this ranking instead of re-scoring
+        result_id: result.result_id,
+        session_id: result.session_id
       }
     };
   } catch (error) {
@@ -305,6 +335,27 @@ export const analyzeSymptoms = async (symptoms: string, days: number, region: st
   }
 };
 
+/**
+ * Get the Shapley feature importance of one disease of a stored diagnosis
+ * Called after the results are shown, so the attribution stays off the first request
+ */
+export const getFeatureImportance = async (resultId: string, diseaseId: string): Promise<FeatureImportance[]> => {
+  const baseUrl = (import.meta.env as any).VITE_API_BASE_URL || 'http://localhost:5000';
+  
+  const params = new URLSearchParams({ disease_id: diseaseId, expand: 'feature_importance' });
+  const response = await fetch(`${baseUrl}/diagnose/${encodeURIComponent(resultId)}/xai?${params}`, {
+    method: 'GET',
+    headers: { 'Content-Type': 'application/json' }
+  });
+
+  if (!response.ok) {
+    throw new Error('Failed to get feature importance');
+  }
+
+  const result = await response.json();
+  return result.diseases?.[0]?.xai?.feature_importance || [];
+};
+
 /**
  * Get detailed XAI explanation for a specific disease
  */